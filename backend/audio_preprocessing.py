@@ -0,0 +1,246 @@
+"""
+Local audio clean-up before sending speech to Google Speech-to-Text.
+
+For LINEAR16 input (raw PCM or a WAV file) `preprocess_audio()`:
+
+1. decodes the samples with NumPy (8/16/32-bit PCM, any channel count),
+2. downmixes to mono,
+3. resamples to the target rate (16 kHz by default, plenty for speech),
+4. trims leading/trailing silence with a simple energy-based voice activity
+   detector,
+5. re-encodes as headerless LINEAR16, or as FLAC when `soundfile` is installed
+   and FLAC output is enabled.
+
+Compressed formats (WEBM_OPUS, OGG_OPUS, MP3, FLAC...) cannot be decoded here
+and are passed through unchanged. The returned `SpeechToTextConfig` always
+describes the bytes that are actually sent.
+"""
+from __future__ import annotations
+
+import io
+import wave
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from chat_to_voice_attachment import SpeechToTextConfig
+
+try:  # optional: FLAC output
+    import soundfile
+except ImportError:  # pragma: no cover - depends on the deployment
+    soundfile = None
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    target_sample_rate: int = 16000
+    trim_silence: bool = True
+    frame_ms: int = 20
+    # A frame is "voice" when its RMS is this many times the noise floor ...
+    vad_ratio: float = 3.0
+    # ... and above this absolute level (full scale = 1.0).
+    vad_min_rms: float = 0.01
+    # Audio kept around the detected speech so word edges are not clipped.
+    padding_ms: int = 200
+    flac: bool = False
+
+
+@dataclass
+class PreprocessResult:
+    audio: bytes
+    config: SpeechToTextConfig
+    bytes_in: int
+    bytes_out: int
+    duration_in: float = 0.0
+    duration_out: float = 0.0
+    steps: List[str] = field(default_factory=list)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def report(self) -> dict:
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_saved,
+            "duration_in": round(self.duration_in, 3),
+            "duration_out": round(self.duration_out, 3),
+            "steps": self.steps,
+        }
+
+
+AudioBytes = Union[bytes, bytearray, memoryview]
+_DECODED_WIDTHS = (1, 2, 4)  # bytes per sample
+
+
+def _pcm_to_float(raw: AudioBytes, sample_width: int, channels: int) -> Optional[np.ndarray]:
+    """Interleaved PCM -> float32 array of shape (frames, channels) in [-1, 1].
+
+    None for sample widths we don't decode (e.g. 24-bit); a trailing partial
+    frame is dropped.
+    """
+    if sample_width not in _DECODED_WIDTHS or channels < 1:
+        return None
+    frame_bytes = sample_width * channels
+    raw = memoryview(raw)[: len(raw) - len(raw) % frame_bytes]
+    if sample_width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    return data.reshape(-1, channels)
+
+
+def decode_pcm(audio: AudioBytes, encoding: str, sample_rate: int) -> Optional[Tuple[np.ndarray, int]]:
+    """Decode WAV or raw LINEAR16 to (samples[frames, channels], rate).
+
+    Returns None for anything we can't decode locally.
+    """
+    head = bytes(audio[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        try:
+            with wave.open(io.BytesIO(audio), "rb") as wav:
+                channels = wav.getnchannels()
+                width = wav.getsampwidth()
+                rate = wav.getframerate()
+                raw = wav.readframes(wav.getnframes())
+        except (wave.Error, EOFError):
+            return None
+        samples = _pcm_to_float(raw, width, channels)
+        return (samples, rate) if samples is not None else None
+    if (encoding or "").upper() == "LINEAR16":
+        return _pcm_to_float(audio, 2, 1), sample_rate
+    return None
+
+
+def pcm_duration(audio: AudioBytes, encoding: str, sample_rate: int) -> Optional[float]:
+    """Seconds of WAV or raw LINEAR16 audio that `decode_pcm` can decode, from the header alone.
+
+    None for other encodings and undecodable WAVs.
+    """
+    head = bytes(audio[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        try:
+            with wave.open(io.BytesIO(audio), "rb") as wav:
+                if wav.getsampwidth() not in _DECODED_WIDTHS or not wav.getframerate():
+                    return None
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            return None
+    if (encoding or "").upper() == "LINEAR16" and sample_rate:
+        return len(audio) // 2 / sample_rate
+    return None
+
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def resample(samples: np.ndarray, rate: int, target: int) -> np.ndarray:
+    """Linear-interpolation resampler with a box pre-filter when downsampling."""
+    if rate == target or len(samples) == 0:
+        return samples
+    if target < rate:
+        width = int(round(rate / target))
+        if width > 1:
+            kernel = np.ones(width, dtype=np.float32) / width
+            samples = np.convolve(samples, kernel, mode="same").astype(np.float32)
+    duration = len(samples) / rate
+    out_len = max(1, int(round(duration * target)))
+    src_t = np.arange(len(samples), dtype=np.float64) / rate
+    dst_t = np.arange(out_len, dtype=np.float64) / target
+    return np.interp(dst_t, src_t, samples).astype(np.float32)
+
+
+def frame_rms(samples: np.ndarray, rate: int, frame_ms: int) -> np.ndarray:
+    frame = max(1, int(rate * frame_ms / 1000))
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[: count * frame].reshape(count, frame)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def voiced_frames(samples: np.ndarray, rate: int, options: PreprocessOptions) -> np.ndarray:
+    """Boolean mask of frames the energy VAD considers speech."""
+    rms = frame_rms(samples, rate, options.frame_ms)
+    if len(rms) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor = float(np.percentile(rms, 10))
+    threshold = max(noise_floor * options.vad_ratio, options.vad_min_rms)
+    return rms > threshold
+
+
+def trim_silence(samples: np.ndarray, rate: int, options: PreprocessOptions) -> np.ndarray:
+    voiced = voiced_frames(samples, rate, options)
+    if not voiced.any():
+        return samples
+    frame = max(1, int(rate * options.frame_ms / 1000))
+    idx = np.flatnonzero(voiced)
+    pad = int(rate * options.padding_ms / 1000)
+    start = max(0, idx[0] * frame - pad)
+    end = min(len(samples), (idx[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def encode_linear16(samples: np.ndarray) -> bytes:
+    clipped = np.clip(samples, -1.0, 1.0)
+    return (clipped * 32767.0).astype("<i2").tobytes()
+
+
+def preprocess_audio(
+    audio: AudioBytes,
+    config: Optional[SpeechToTextConfig] = None,
+    options: Optional[PreprocessOptions] = None,
+) -> PreprocessResult:
+    """Clean up `audio` for recognition; see the module docstring for the steps."""
+    cfg = config or SpeechToTextConfig()
+    opts = options or PreprocessOptions()
+    bytes_in = len(audio)
+
+    decoded = decode_pcm(audio, cfg.encoding, cfg.sample_rate_hertz)
+    if decoded is None:
+        return PreprocessResult(audio=bytes(audio), config=cfg, bytes_in=bytes_in, bytes_out=bytes_in, steps=["passthrough"])
+
+    samples, rate = decoded
+    steps: List[str] = ["decode"]
+    duration_in = len(samples) / rate if rate else 0.0
+
+    if samples.shape[1] > 1:
+        steps.append(f"downmix:{samples.shape[1]}ch")
+    samples = downmix(samples)
+
+    target = opts.target_sample_rate or rate
+    if rate != target:
+        samples = resample(samples, rate, target)
+        steps.append(f"resample:{rate}->{target}")
+        rate = target
+
+    if opts.trim_silence:
+        before = len(samples)
+        samples = trim_silence(samples, rate, opts)
+        if len(samples) < before:
+            steps.append(f"trim:{(before - len(samples)) / rate:.2f}s")
+
+    if opts.flac and soundfile is not None:
+        buffer = io.BytesIO()
+        soundfile.write(buffer, samples, rate, format="FLAC", subtype="PCM_16")
+        out, encoding = buffer.getvalue(), "FLAC"
+        steps.append("flac")
+    else:
+        out, encoding = encode_linear16(samples), "LINEAR16"
+
+    return PreprocessResult(
+        audio=out,
+        config=replace(cfg, encoding=encoding, sample_rate_hertz=rate),
+        bytes_in=bytes_in,
+        bytes_out=len(out),
+        duration_in=duration_in,
+        duration_out=len(samples) / rate if rate else 0.0,
+        steps=steps,
+    )
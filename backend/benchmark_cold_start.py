@@ -0,0 +1,84 @@
+"""
+Cold-start benchmark: time from launching uvicorn to the first fast request.
+
+Starts `uvicorn main:app` in a subprocess, polls until the server answers
+(`/api/ready` when the app has it, `/` otherwise) and then times the first
+request to each endpoint below. Without a startup warm-up the first requests
+pay for the catalog snapshot, prerequisite graph and pathway parse.
+
+Run from backend/:  python benchmark_cold_start.py [port]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+FIRST_REQUESTS = [
+    ("POST", "/api/generate-path", {"major": "Computer Science", "campus": "manoa"}),
+    ("GET", "/api/prerequisites/manoa/ICS%20311", None),
+    ("GET", "/api/freshman-courses?program=Animation", None),
+    ("POST", "/api/map-insights", {"interests": ["art", "computers"], "skills": [], "why_uh": ""}),
+]
+
+
+def request(base, method, path, body=None, timeout=60.0):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as err:
+        return err.code, err.read()
+
+
+def wait_until_up(base, started, deadline_s=120.0):
+    """Seconds until the server answered, and until it reported ready."""
+    up_at = None
+    while time.perf_counter() - started < deadline_s:
+        try:
+            status, _ = request(base, "GET", "/api/ready", timeout=2.0)
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            time.sleep(0.05)
+            continue
+        up_at = up_at or time.perf_counter()
+        if status == 200:
+            return up_at - started, time.perf_counter() - started
+        if status != 503:  # no readiness endpoint: the server answering is all we know
+            return up_at - started, up_at - started
+        time.sleep(0.05)
+    raise RuntimeError("server did not become ready")
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "KEALA_REACTION_BACKEND": os.environ.get("KEALA_REACTION_BACKEND", "stub")}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        up_s, ready_s = wait_until_up(base, started)
+        print(f"server answering after {up_s:6.2f} s, ready after {ready_s:6.2f} s")
+        first_response_s = None
+        for method, path, body in FIRST_REQUESTS:
+            t = time.perf_counter()
+            status, _ = request(base, method, path, body)
+            first = time.perf_counter() - t
+            first_response_s = first_response_s or time.perf_counter() - started
+            t = time.perf_counter()
+            request(base, method, path, body)
+            second = time.perf_counter() - t
+            print(f"  {method:<4} {path:<45} {status}  first {first * 1000:8.1f} ms   second {second * 1000:7.1f} ms")
+        print(f"first response ({FIRST_REQUESTS[0][1]}) after {first_response_s:6.2f} s of cold start")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark for response serialization and compression (see response_encoding.py).
+
+Builds the `/api/generate-path` payload for every Manoa program and a
+`/api/map-insights` payload (default majors, no AI call), then compares:
+
+- FastAPI's default route (jsonable_encoder + json.dumps) vs `dumps()`
+  (orjson when installed),
+- bytes on the wire: raw, gzip, brotli (when installed), and the columnar
+  node encoding.
+
+Run from backend/:  python benchmark_responses.py
+"""
+import gzip
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from campus_selector import build_map_insights
+from pathways import build_path, columnar_nodes, load_pathways
+from response_encoding import GZIP_LEVEL, brotli, compress, dumps, orjson
+
+
+def fastapi_default(payload):
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, payloads, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def wire_sizes(bodies):
+    sizes = {"raw": sum(len(b) for b in bodies)}
+    sizes["gzip"] = sum(len(gzip.compress(b, compresslevel=GZIP_LEVEL, mtime=0)) for b in bodies)
+    if brotli is not None:
+        sizes["br"] = sum(len(compress(b, "br")) for b in bodies)
+    return sizes
+
+
+def report(label, payloads):
+    default_s = timed(fastapi_default, payloads)
+    fast_s = timed(dumps, payloads)
+    print(f"\n{label}: {len(payloads)} responses")
+    print(f"  serialize  FastAPI default {default_s * 1000:8.1f} ms   dumps() {fast_s * 1000:8.1f} ms"
+          f"   ({default_s / fast_s:.1f}x)")
+    for name, size in wire_sizes([dumps(p) for p in payloads]).items():
+        print(f"  bytes      {name:<5} {size:>10,}")
+
+
+def main():
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib json)'}   brotli: {'yes' if brotli is not None else 'no'}")
+
+    programs = [p.get("program_name", "") for p in (load_pathways("manoa") or [])]
+    paths = [build_path(name, "manoa") for name in programs]
+    report("generate-path (objects)", paths)
+
+    columnar = [{**path, "path": columnar_nodes(path["path"])} for path in paths]
+    report("generate-path (columnar)", columnar)
+
+    insights = build_map_insights({"majors": []}, why_uh="", interests=["art", "computers"], skills=[], top_n=5)
+    report("map-insights (default majors)", [insights] * 50)
+
+
+if __name__ == "__main__":
+    main()
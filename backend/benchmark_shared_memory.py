@@ -0,0 +1,78 @@
+"""
+Memory benchmark for shared catalog segments (see shared_segment.py).
+
+Starts N fresh processes that, like uvicorn workers, load the course catalog,
+the prerequisite graph and the pathway files and then serve every Manoa
+`generate-path` once. Each reports its private (USS) and proportional (PSS)
+resident memory from /proc/self/smaps_rollup, with and without
+`SHARED_SEGMENTS`.
+
+Run from backend/ on Linux:  python benchmark_shared_memory.py [workers]
+"""
+import multiprocessing
+import os
+import sys
+import time
+
+
+def _rollup_kb():
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def worker(shared, results, ready, go):
+    os.environ["SHARED_SEGMENTS"] = "1" if shared else "0"
+    baseline = _rollup_kb()
+    from course_catalog import load_course_catalog
+    from pathways import build_path, load_pathways, program_names
+    from prerequisite_graph import install_prerequisite_graph, load_prerequisite_graph
+
+    started = time.perf_counter()
+    load_course_catalog()
+    install_prerequisite_graph(load_prerequisite_graph())
+    load_pathways("manoa")
+    loaded_s = time.perf_counter() - started
+    for name in program_names("manoa"):
+        build_path(name, "manoa")
+    ready.put(None)
+    go.wait()  # measure while every worker is alive, so shared pages are split between them
+    rollup = _rollup_kb()
+    uss = rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0)
+    base_uss = baseline.get("Private_Clean", 0) + baseline.get("Private_Dirty", 0)
+    results.put((uss - base_uss, rollup.get("Pss", 0) - baseline.get("Pss", 0), loaded_s))
+
+
+def run(shared, workers):
+    ctx = multiprocessing.get_context("spawn")
+    results, ready, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+    processes = [ctx.Process(target=worker, args=(shared, results, ready, go)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+    go.set()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return samples
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    for shared in (False, True):
+        samples = run(shared, workers)
+        uss = sum(s[0] for s in samples) / 1024
+        pss = sum(s[1] for s in samples) / 1024
+        slowest = max(s[2] for s in samples)
+        print(f"shared segments {'on ' if shared else 'off'}: {workers} workers, "
+              f"private {uss:6.1f} MB total ({uss / workers:5.1f} MB/worker), "
+              f"PSS {pss:6.1f} MB total, slowest load {slowest:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
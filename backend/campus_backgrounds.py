@@ -0,0 +1,183 @@
+"""
+Campus background images for `/api/generate-campus-photo`, loaded once.
+
+Each campus maps to one image in `public/assets/`. At startup every background
+is decoded, downscaled to `BACKGROUND_MAX_SIDE`, re-encoded as JPEG and
+base64-encoded, so a generation request only has to encode the student's own
+photo. Entries remember the source file's (size, mtime); `get()` re-checks
+them at most every few seconds and reloads a background whose file changed.
+
+`uhwo.svg` (West Oʻahu) is a vector logo rather than a photo, so that campus
+is marked unavailable and falls back to `DEFAULT_CAMPUS`.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "public", "assets")
+
+CAMPUS_BACKGROUNDS: Dict[str, str] = {
+    "manoa": "uhmanoageneration.jpg",
+    "hilo": "uhh.jpg",
+    "west-oahu": "uhwo.svg",
+    "hawaii-community-college": "hawaiicc.jpg",
+    "honolulu": "hcc.png",
+    "kauai": "kauaicc.jpeg",
+    "kapiolani": "kcc.png",
+    "leeward": "lcc.png",
+    "maui": "mcc.jpg",
+    "windward": "wcc.png",
+}
+DEFAULT_CAMPUS = "manoa"
+_RASTER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+BACKGROUND_MAX_SIDE = int(os.environ.get("PHOTO_BACKGROUND_MAX_SIDE", "1024"))
+BACKGROUND_JPEG_QUALITY = int(os.environ.get("PHOTO_BACKGROUND_JPEG_QUALITY", "85"))
+_CHECK_INTERVAL = 5.0  # seconds between file-change checks
+
+
+@dataclass(frozen=True)
+class CampusBackground:
+    campus: str
+    filename: str
+    jpeg: bytes
+    b64: str
+    size: Tuple[int, int]
+    # Short content digest; part of cache keys so edited backgrounds miss.
+    version: str
+    source_stat: Tuple[int, int]
+
+
+def _source_stat(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_background(campus: str, filename: str, assets_dir: str = ASSETS_DIR) -> CampusBackground:
+    from PIL import Image, ImageOps
+
+    path = os.path.join(assets_dir, filename)
+    source_stat = _source_stat(path)
+    with open(path, "rb") as f:
+        source = f.read()
+    with Image.open(io.BytesIO(source)) as image:
+        source_format = image.format
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((BACKGROUND_MAX_SIDE, BACKGROUND_MAX_SIDE), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=BACKGROUND_JPEG_QUALITY, optimize=True)
+        size = image.size
+    jpeg = out.getvalue()
+    if source_format == "JPEG" and len(source) <= len(jpeg):
+        # Already a small JPEG; re-encoding would only add bytes and artifacts.
+        with Image.open(io.BytesIO(source)) as original:
+            size = original.size
+        jpeg = source
+    return CampusBackground(
+        campus=campus,
+        filename=filename,
+        jpeg=jpeg,
+        b64=base64.b64encode(jpeg).decode("ascii"),
+        size=size,
+        version=hashlib.sha1(jpeg).hexdigest()[:12],
+        source_stat=source_stat,
+    )
+
+
+class CampusBackgroundCache:
+    """Pre-encoded backgrounds keyed by campus id."""
+
+    def __init__(self, mapping: Optional[Dict[str, str]] = None, *, assets_dir: str = ASSETS_DIR) -> None:
+        self.mapping = dict(mapping or CAMPUS_BACKGROUNDS)
+        self.assets_dir = assets_dir
+        self._entries: Dict[str, CampusBackground] = {}
+        self._errors: Dict[str, str] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._reloads = 0
+
+    def is_raster(self, campus: str) -> bool:
+        filename = self.mapping.get(campus, "")
+        return filename.lower().endswith(_RASTER_EXTENSIONS)
+
+    def _load(self, campus: str) -> Optional[CampusBackground]:
+        filename = self.mapping[campus]
+        try:
+            entry = load_background(campus, filename, self.assets_dir)
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self._entries.pop(campus, None)
+                self._errors[campus] = str(e)
+            LOGGER.warning("Campus background for %s unavailable: %s", campus, e)
+            return None
+        with self._lock:
+            self._entries[campus] = entry
+            self._errors.pop(campus, None)
+            self._checked_at[campus] = time.monotonic()
+        return entry
+
+    def preload(self) -> Dict[str, bool]:
+        """Load every raster background; returns campus -> available."""
+        started = time.perf_counter()
+        for campus in self.mapping:
+            if self.is_raster(campus):
+                self._load(campus)
+            else:
+                with self._lock:
+                    self._errors[campus] = "not a raster image"
+        LOGGER.info("Loaded %d campus backgrounds in %.2fs", len(self._entries), time.perf_counter() - started)
+        return self.availability()
+
+    def _is_stale(self, entry: CampusBackground) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at.get(entry.campus, 0.0) < _CHECK_INTERVAL:
+            return False
+        self._checked_at[entry.campus] = now
+        try:
+            return _source_stat(os.path.join(self.assets_dir, entry.filename)) != entry.source_stat
+        except OSError:
+            return True
+
+    def get(self, campus: str) -> Optional[CampusBackground]:
+        """Background for `campus`, or None when it has no usable image."""
+        if campus not in self.mapping or not self.is_raster(campus):
+            return None
+        entry = self._entries.get(campus)
+        if entry is not None and not self._is_stale(entry):
+            return entry
+        if entry is not None:
+            self._reloads += 1
+        return self._load(campus)
+
+    def resolve(self, campus: Optional[str]) -> Optional[CampusBackground]:
+        """`get(campus)`, falling back to the default campus when unavailable."""
+        key = (campus or DEFAULT_CAMPUS).strip().lower()
+        return self.get(key) or self.get(DEFAULT_CAMPUS)
+
+    def availability(self) -> Dict[str, bool]:
+        return {campus: campus in self._entries for campus in self.mapping}
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "loaded": sorted(self._entries),
+                "unavailable": dict(self._errors),
+                "bytes": sum(len(e.jpeg) for e in self._entries.values()),
+                "reloads": self._reloads,
+            }
+
+
+BACKGROUNDS = CampusBackgroundCache()
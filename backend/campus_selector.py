@@ -22,10 +22,21 @@ from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tupl
 import csv
 import os
 import json
+import logging
 import re
 import difflib
+import hashlib
+import threading
+import time
 import requests
 
+from generation_profiles import generate_content
+from metrics import count_fallback
+from request_profiler import span
+from structured_logging import log_payload
+
+LOGGER = logging.getLogger(__name__)
+
 # ------------- Data structures -------------
 
 @dataclass(frozen=True)
@@ -67,14 +78,14 @@ def _coerce_json_dict(raw_text: str, *, label: str) -> Dict:
     try:
         parsed = json.loads(cleaned)
     except json.JSONDecodeError as err:
-        print(f"[{label}] primary JSON parse failed: {err}")
+        LOGGER.debug("[%s] primary JSON parse failed: %s", label, err)
         parsed = None
         if "{" in cleaned and "}" in cleaned:
             try:
                 snippet = cleaned[cleaned.index("{") : cleaned.rindex("}") + 1]
                 parsed = json.loads(snippet)
             except Exception as inner_err:
-                print(f"[{label}] fallback JSON parse failed: {inner_err}")
+                LOGGER.warning("[%s] fallback JSON parse failed: %s", label, inner_err)
     if isinstance(parsed, dict):
         return parsed
     if isinstance(parsed, list):
@@ -162,6 +173,8 @@ def _normalize_values(values: Sequence[str]) -> Set[str]:
 
 
 MAJOR_CANONICAL_NAMES: Dict[str, Set[str]] = defaultdict(set)
+# While a catalog snapshot is built, names go to the snapshot instead of MAJOR_CANONICAL_NAMES.
+_name_sink = threading.local()
 
 
 def _record_major_name(raw: str) -> str:
@@ -170,7 +183,8 @@ def _record_major_name(raw: str) -> str:
         return ""
     norm = normalize_major_name(name)
     if norm:
-        MAJOR_CANONICAL_NAMES[norm].add(name)
+        target = getattr(_name_sink, "names", None)
+        (MAJOR_CANONICAL_NAMES if target is None else target)[norm].add(name)
     return norm
 
 
@@ -259,8 +273,7 @@ def _augment_with_local_programs(
     if len(majors) >= desired:
         return majors[:desired]
 
-    if not MAJOR_CANONICAL_NAMES:
-        load_all_campus_catalogs()
+    get_catalog_snapshot()
 
     existing_norms: Set[str] = {
         normalize_major_name(entry["name"]) for entry in majors if entry.get("name")
@@ -271,7 +284,7 @@ def _augment_with_local_programs(
     why_tokens = _normalize_text_to_tokens(why_text)
 
     scored_candidates: List[Tuple[float, str, str, str]] = []
-    for norm, names in MAJOR_CANONICAL_NAMES.items():
+    for norm, names in list(MAJOR_CANONICAL_NAMES.items()):
         if not names or norm in existing_norms:
             continue
         major_words = _collect_word_tokens([norm])
@@ -635,6 +648,8 @@ def _prepare_extra_programs(raw: Dict[str, Sequence[str]]) -> Dict[str, Set[str]
 
 
 CAMPUS_EXTRA_PROGRAMS = _prepare_extra_programs(_CAMPUS_EXTRA_PROGRAMS_RAW)
+# Names from the personas and extra programs above; catalog snapshots add theirs to these.
+_BUILTIN_CANONICAL_NAMES = {norm: frozenset(names) for norm, names in MAJOR_CANONICAL_NAMES.items()}
 
 
 def _evaluate_persona_fit(
@@ -939,6 +954,116 @@ def load_all_campus_catalogs() -> List[CampusMajors]:
 
     return sorted(catalogs, key=lambda c: c.campus)
 
+# ------------- Catalog snapshot -------------
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Everything parsed from UH-courses, tagged with the source files' version.
+
+    Picklable, so it can be built in a worker process and installed here.
+    """
+
+    version: str
+    catalogs: List[CampusMajors]
+    canonical_names: Dict[str, Set[str]]
+    program_names: List[str]
+
+
+_CATALOG_SOURCE_PATTERNS = (
+    "**/*_majors.csv",
+    "**/*_majors.json",
+    "**/*_courses.csv",
+    "**/*_degree_pathways.json",
+)
+_CATALOG_CHECK_INTERVAL = 5.0  # seconds between source-file stat sweeps
+
+_catalog_snapshot: Optional[CatalogSnapshot] = None
+_catalog_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def catalog_source_version() -> str:
+    """Hash of (path, size, mtime) for every catalog source file."""
+    base = _repo_root(Path(__file__)) / "UH-courses"
+    digest = hashlib.sha1()
+    if base.exists():
+        files: Set[Path] = set()
+        for pattern in _CATALOG_SOURCE_PATTERNS:
+            files.update(base.glob(pattern))
+        for file in sorted(files):
+            stat = file.stat()
+            digest.update(f"{file.relative_to(base)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _load_program_names() -> List[str]:
+    pathway_file = _repo_root(Path(__file__)) / "UH-courses" / "manoa_degree_pathways.json"
+    if not pathway_file.exists():
+        return []
+    with pathway_file.open("r", encoding="utf-8") as f:
+        pathways_data = json.load(f)
+    return [p.get("program_name", "") for p in pathways_data if p.get("program_name")]
+
+
+def build_catalog_snapshot() -> CatalogSnapshot:
+    """Parse every catalog file. CPU heavy; meant for `HEAVY_POOL`."""
+    version = catalog_source_version()
+    canonical: Dict[str, Set[str]] = defaultdict(set)
+    for norm, names in _BUILTIN_CANONICAL_NAMES.items():
+        canonical[norm].update(names)
+    _name_sink.names = canonical
+    try:
+        catalogs = load_all_campus_catalogs()
+    finally:
+        _name_sink.names = None
+    try:
+        program_names = _load_program_names()
+    except Exception as e:  # noqa: BLE001
+        LOGGER.warning("Could not load programs: %s", e)
+        program_names = []
+    return CatalogSnapshot(version=version, catalogs=catalogs, canonical_names=dict(canonical), program_names=program_names)
+
+
+def install_catalog_snapshot(snapshot: CatalogSnapshot) -> None:
+    """Make `snapshot` the active catalog (e.g. one built in another process)."""
+    global _catalog_snapshot, _catalog_checked_at
+    with _catalog_lock:
+        # Replace rather than merge, so majors removed from the files stop matching.
+        # New sets go in before stale keys leave, so readers never see an empty mapping.
+        MAJOR_CANONICAL_NAMES.update({norm: set(names) for norm, names in snapshot.canonical_names.items()})
+        for norm in [norm for norm in MAJOR_CANONICAL_NAMES if norm not in snapshot.canonical_names]:
+            del MAJOR_CANONICAL_NAMES[norm]
+        _catalog_snapshot = snapshot
+        _catalog_checked_at = time.monotonic()
+
+
+def catalog_snapshot_is_stale() -> bool:
+    """True when no snapshot is loaded or the source files changed.
+
+    The file sweep runs at most every few seconds; in between the current
+    snapshot is trusted.
+    """
+    global _catalog_checked_at
+    with _catalog_lock:
+        snapshot = _catalog_snapshot
+        if snapshot is None:
+            return True
+        now = time.monotonic()
+        if now - _catalog_checked_at < _CATALOG_CHECK_INTERVAL:
+            return False
+        _catalog_checked_at = now
+    # The file sweep runs outside the lock; only the caller that claimed this interval does it.
+    return catalog_source_version() != snapshot.version
+
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """Return the active snapshot, rebuilding it in-process if it is stale."""
+    if catalog_snapshot_is_stale():
+        install_catalog_snapshot(build_catalog_snapshot())
+    assert _catalog_snapshot is not None
+    return _catalog_snapshot
+
+
 def _is_close_match(norm: str, campus_major: str) -> bool:
     """Heuristic match allowing minor name differences.
 
@@ -985,7 +1110,7 @@ def select_best_campus(
     choose the alphabetically first campus name.
     """
     originals, norms = _coerce_major_names(majors)
-    catalogs = catalogs if catalogs is not None else load_all_campus_catalogs()
+    catalogs = catalogs if catalogs is not None else get_catalog_snapshot().catalogs
     interest_tokens = _normalize_values(interests or [])
     skill_tokens = _normalize_values(skills or [])
 
@@ -1071,28 +1196,18 @@ def recommend_majors_via_ai(
     interest_norms = _normalize_values(interests)
     skill_norms = _normalize_values(skills)
 
-    if not MAJOR_CANONICAL_NAMES:
-        try:
-            load_all_campus_catalogs()
-        except Exception as preload_err:  # noqa: BLE001
-            print("Warning: unable to preload campus catalogs:", preload_err)
+    available_programs: List[str] = []
+    try:
+        with span("majors:catalog_snapshot"):
+            available_programs = list(get_catalog_snapshot().program_names)
+    except Exception as preload_err:  # noqa: BLE001
+        LOGGER.warning("Unable to preload campus catalogs: %s", preload_err)
 
     if not token_fetcher:
         fallback["warning"] = "Service account not configured; returning default suggestions."
+        count_fallback("default_majors", "no_credentials")
         return fallback
 
-    # Load available programs from manoa_degree_pathways.json
-    available_programs = []
-    try:
-        pathway_file = Path(__file__).parent.parent / "UH-courses" / "manoa_degree_pathways.json"
-        if pathway_file.exists():
-            with open(pathway_file, 'r', encoding='utf-8') as f:
-                pathways_data = json.load(f)
-                available_programs = [p.get('program_name', '') for p in pathways_data if p.get('program_name')]
-                print(f"[DEBUG] Loaded {len(available_programs)} programs from manoa_degree_pathways.json")
-    except Exception as e:
-        print(f"[WARNING] Could not load programs: {e}")
-
     # Truncate user inputs to avoid sending huge text blocks that consume input tokens
     why_uh_truncated = (why_uh or "").strip()[:500]  # max 500 chars
     interests_truncated = list(interests or [])[:10]  # max 10 items
@@ -1118,52 +1233,32 @@ def recommend_majors_via_ai(
         f"Use EXACT program names from the list above. No extra text."
     )
     
-    # Log prompt length for debugging
-    print(f"[DEBUG] Prompt length: {len(prompt)} chars, ~{len(prompt.split())} words")
+    LOGGER.debug("Major recommendation prompt: %d chars", len(prompt))
 
     try:
         token = token_fetcher()
-        project_id = os.environ.get("VERTEX_PROJECT_ID", "sigma-night-477219-g4")
-        location = os.environ.get("VERTEX_LOCATION", "global")
-        model_id = os.environ.get("VERTEX_MAJOR_MODEL", "gemini-3-pro-preview")
-
-
-        url = f"https://aiplatform.googleapis.com/v1/projects/{project_id}/locations/{location}/publishers/google/models/{model_id}:generateContent"
-
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        payload = {
-            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-            # compact output: enough tokens for 3-5 short majors but not excessive
-            "generation_config": {
-                "temperature": 0.0,
-                "maxOutputTokens": 16384,  # increased - 512 was too low for even minimal JSON
-                "topP": 1.0,
-                "topK": 1,
-            },
-        }
-
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        if not response.ok:
-            print("Vertex major request failed", response.status_code, response.text)
-            response.raise_for_status()
-
-        data = response.json()
+        # Model, budget and fallback routing come from the "recommend-majors" profile
+        # (VERTEX_MAJOR_MODEL / VERTEX_LOCATION still apply).
+        data = generate_content(
+            "recommend-majors",
+            token=token,
+            contents=[{"role": "user", "parts": [{"text": prompt}]}],
+        )
         candidate = data.get("candidates", [{}])[0]
         finish_reason = candidate.get("finishReason", "UNKNOWN")
         raw_text = candidate.get("content", {}).get("parts", [{}])[0].get("text", "")
 
-        print("=== MAJOR RAW AI RESPONSE ===")
-        print(f"Finish Reason: {finish_reason}")
-        print(raw_text)
-        print("================================")
+        log_payload(LOGGER, "Major recommendation raw response", raw_text, finish_reason=finish_reason)
 
         lowered = raw_text.lower()
         refusal_keywords = ["cannot fulfill", "cannot generate", "safety", "inappropriate", "violates"]
         if any(keyword in lowered for keyword in refusal_keywords):
             fallback["warning"] = "AI refused the request; returning default suggestions."
+            count_fallback("default_majors", "refusal")
             return fallback
 
-        parsed = _coerce_json_dict(raw_text, label="major-recommendations")
+        with span("majors:parse"):
+            parsed = _coerce_json_dict(raw_text, label="major-recommendations")
         majors_payload = parsed.get("majors") if isinstance(parsed, dict) else None
         if not isinstance(majors_payload, list):
             majors_payload = parsed.get("items") if isinstance(parsed, dict) else None
@@ -1200,13 +1295,13 @@ def recommend_majors_via_ai(
                     " Do not include any extra text or formatting. Limit each 'why' to 10 words."
                 )
                 try:
-                    payload_retry = {
-                        "contents": [{"role": "user", "parts": [{"text": retry_prompt}]}],
-                        "generation_config": {"temperature": 0.0, "maxOutputTokens": 512},
-                    }
-                    resp2 = requests.post(url, headers=headers, json=payload_retry, timeout=20)
-                    if resp2.ok:
-                        data2 = resp2.json()
+                    data2 = generate_content(
+                        "recommend-majors",
+                        token=token,
+                        contents=[{"role": "user", "parts": [{"text": retry_prompt}]}],
+                        config_overrides={"temperature": 0.0, "maxOutputTokens": 512},
+                    )
+                    if data2:
                         candidate2 = data2.get("candidates", [{}])[0]
                         raw2 = candidate2.get("content", {}).get("parts", [{}])[0].get("text", "")
                         parsed2 = _coerce_json_dict(raw2, label="major-recommendations-retry")
@@ -1234,15 +1329,16 @@ def recommend_majors_via_ai(
             else:
                 raise ValueError("No usable majors returned")
 
-        cleaned_list = _canonicalize_major_entries(cleaned_list)
-        before_local = len(cleaned_list)
-        cleaned_list = _augment_with_local_programs(
-            cleaned_list,
-            desired,
-            interest_norms=interest_norms,
-            skill_norms=skill_norms,
-            why_text=why_uh,
-        )
+        with span("majors:canonicalize"):
+            cleaned_list = _canonicalize_major_entries(cleaned_list)
+            before_local = len(cleaned_list)
+            cleaned_list = _augment_with_local_programs(
+                cleaned_list,
+                desired,
+                interest_norms=interest_norms,
+                skill_norms=skill_norms,
+                why_text=why_uh,
+            )
         if len(cleaned_list) > before_local:
             partial_warning = True
 
@@ -1259,15 +1355,17 @@ def recommend_majors_via_ai(
     except requests.HTTPError as http_err:  # noqa: BLE001
         detail = getattr(http_err.response, "text", "") if hasattr(http_err, "response") else ""
         snippet = detail.strip().replace("\n", " ")[:240]
-        print("Vertex AI HTTP error while generating majors:", snippet or http_err)
+        LOGGER.warning("Vertex AI HTTP error while generating majors: %s", snippet or http_err)
         fallback.setdefault(
             "warning",
             "Fell back to default majors due to a Vertex AI error." + (f" Details: {snippet}" if snippet else ""),
         )
+        count_fallback("default_majors", "http_error")
         return fallback
     except Exception as err:  # noqa: BLE001
-        print("Error generating majors:", err)
+        LOGGER.exception("Error generating majors")
         fallback.setdefault("warning", "Fell back to defaults due to an AI error.")
+        count_fallback("default_majors", "error")
         return fallback
 
 
@@ -1290,6 +1388,27 @@ def generate_map_insights(
         token_fetcher=token_fetcher,
     )
 
+    return build_map_insights(
+        majors_result,
+        why_uh=why_uh,
+        interests=interests,
+        skills=skills,
+        top_n=desired,
+    )
+
+
+def build_map_insights(
+    majors_result: Dict,
+    *,
+    why_uh: str,
+    interests: Sequence[str],
+    skills: Sequence[str],
+    top_n: int,
+) -> Dict[str, Union[str, List[Dict[str, Union[str, List[str]]]]]]:
+    """The local (CPU-only) half of `generate_map_insights`: campus matching for
+    already recommended majors."""
+
+    desired = max(1, min(top_n or 3, 5))
     majors = []
     if isinstance(majors_result, dict):
         majors = list(majors_result.get("majors", []))
@@ -1302,16 +1421,18 @@ def generate_map_insights(
 
     if not majors:
         majors = _DEFAULT_MAJOR_SUGGESTIONS[:desired]
+        count_fallback("default_majors", "empty")
         warnings.append("Unable to generate majors; using defaults.")
 
-    catalogs = load_all_campus_catalogs()
-    campus_selection = select_best_campus(
-        majors,
-        catalogs=catalogs,
-        why_uh=why_uh,
-        interests=interests,
-        skills=skills,
-    )
+    catalogs = get_catalog_snapshot().catalogs
+    with span("campus_matching"):
+        campus_selection = select_best_campus(
+            majors,
+            catalogs=catalogs,
+            why_uh=why_uh,
+            interests=interests,
+            skills=skills,
+        )
     campus_matches = campus_selection.get("matches", []) if isinstance(campus_selection, dict) else []
 
     response: Dict[str, Union[str, List[Dict[str, Union[str, List[str]]]]]] = {
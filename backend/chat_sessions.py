@@ -0,0 +1,302 @@
+"""
+Server-side chat sessions for the Keala career chatbot.
+
+The frontend used to resend the whole transcript plus the full map-insights
+payload on every `/api/ask-question` call. Sessions keep that state here
+instead:
+
+- a compact student profile (goal, interests, skills, selections),
+- the last few turns verbatim,
+- a rolling summary that older turns are folded into one at a time.
+
+The summary is capped in characters, so the prompt built from a session stays
+the same size no matter how long the chat runs. The store itself is bounded by
+session count (LRU), idle TTL and an approximate byte budget.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+
+# Per-field limits for the stored profile and turns (characters).
+_GOAL_LIMIT = 500
+_LIST_LIMIT = 10
+_TURN_TEXT_LIMIT = 2000
+_SUMMARY_LINE_LIMIT = 160
+
+
+@dataclass
+class ChatTurn:
+    role: str  # "user" or "assistant"
+    text: str
+
+
+@dataclass
+class ChatSession:
+    session_id: str
+    profile: Dict[str, object] = field(default_factory=dict)
+    turns: Deque[ChatTurn] = field(default_factory=deque)
+    summary: str = ""
+    folded_turns: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+
+    def approx_bytes(self) -> int:
+        """Rough size of the session's text payload, used for memory bounds."""
+        size = len(self.summary) + len(self.session_id)
+        size += sum(len(turn.text) for turn in self.turns)
+        for value in self.profile.values():
+            if isinstance(value, list):
+                size += sum(len(str(item)) for item in value)
+            else:
+                size += len(str(value))
+        return size
+
+
+def _clip(text: str, limit: int) -> str:
+    cleaned = re.sub(r"\s+", " ", str(text or "")).strip()
+    if len(cleaned) <= limit:
+        return cleaned
+    return cleaned[:limit].rstrip() + "…"
+
+
+def _first_sentence(text: str) -> str:
+    cleaned = re.sub(r"\s+", " ", str(text or "")).strip()
+    match = re.match(r"^(.*?[.!?])(\s|$)", cleaned)
+    return match.group(1).strip() if match else cleaned
+
+
+def _names(entries: object, limit: int = 3) -> List[str]:
+    names: List[str] = []
+    if not isinstance(entries, list):
+        return names
+    for entry in entries:
+        if isinstance(entry, dict):
+            name = str(entry.get("name") or entry.get("campus") or "").strip()
+        else:
+            name = str(entry or "").strip()
+        if name:
+            names.append(name)
+        if len(names) >= limit:
+            break
+    return names
+
+
+def compact_profile(context: Optional[dict]) -> Dict[str, object]:
+    """Reduce the frontend `context` dict to the fields the chat prompt uses.
+
+    `mapInsights` is collapsed to the top campus and major names; the rest of
+    that payload (scores, reasons, allCampuses) never reaches the prompt.
+    """
+    context = context or {}
+    map_insights = context.get("mapInsights") or {}
+    if not isinstance(map_insights, dict):
+        map_insights = {}
+    interests = context.get("interests") or []
+    skills = context.get("skills") or []
+    return {
+        "goal": _clip(context.get("goal") or "Not provided", _GOAL_LIMIT),
+        "interests": [_clip(item, 80) for item in list(interests)[:_LIST_LIMIT]],
+        "skills": [_clip(item, 80) for item in list(skills)[:_LIST_LIMIT]],
+        "selectedCampus": _clip(context.get("selectedCampus") or "Not yet selected", 120),
+        "selectedMajor": _clip(context.get("selectedMajor") or "Not yet selected", 120),
+        "recommendedCampuses": _names(map_insights.get("campuses")),
+        "recommendedMajors": _names(map_insights.get("majors")),
+    }
+
+
+def fold_turn_into_summary(summary: str, turn: ChatTurn, *, bot_name: str, limit: int) -> str:
+    """Default incremental summarizer.
+
+    Each folded turn contributes one short line (its first sentence). When the
+    summary grows past `limit`, the oldest lines are dropped so the size stays
+    bounded.
+    """
+    who = "Student" if turn.role == "user" else bot_name
+    line = f"- {who}: {_clip(_first_sentence(turn.text), _SUMMARY_LINE_LIMIT)}"
+    lines = [entry for entry in summary.splitlines() if entry.strip()]
+    lines.append(line)
+    while lines and len("\n".join(lines)) > limit:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+Summarizer = Callable[[str, ChatTurn], str]
+
+
+class ChatSessionStore:
+    """In-memory session store with LRU eviction, idle TTL and a byte budget."""
+
+    def __init__(
+        self,
+        *,
+        max_sessions: int = 500,
+        idle_ttl_seconds: float = 30 * 60,
+        max_total_bytes: int = 8 * 1024 * 1024,
+        recent_turns: int = 6,
+        summary_char_limit: int = 1200,
+        bot_name: str = "Keala",
+        summarizer: Optional[Summarizer] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_total_bytes = max_total_bytes
+        self.recent_turns = max(1, recent_turns)
+        self.summary_char_limit = summary_char_limit
+        self.bot_name = bot_name
+        self._summarizer = summarizer or (
+            lambda summary, turn: fold_turn_into_summary(
+                summary, turn, bot_name=self.bot_name, limit=self.summary_char_limit
+            )
+        )
+        self._clock = clock
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = {"lru": 0, "ttl": 0, "memory": 0}
+
+    # ----- lookup -----
+
+    def get_or_create(self, session_id: Optional[str]) -> ChatSession:
+        """Return the live session for `session_id`, creating it when unknown.
+
+        A missing or blank id gets a freshly generated one.
+        """
+        with self._lock:
+            now = self._clock()
+            self._expire_idle(now)
+            sid = (session_id or "").strip()[:64] or uuid.uuid4().hex
+            session = self._sessions.get(sid)
+            if session is None:
+                session = ChatSession(session_id=sid, created_at=now, last_seen=now)
+                self._sessions[sid] = session
+                self._total_bytes += session.approx_bytes()
+                self._enforce_bounds(keep=sid)
+            else:
+                session.last_seen = now
+                self._sessions.move_to_end(sid)
+            return session
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self._total_bytes -= session.approx_bytes()
+            return True
+
+    # ----- mutation -----
+
+    def update_profile(self, session: ChatSession, context: Optional[dict]) -> None:
+        with self._lock:
+            before = session.approx_bytes()
+            session.profile = compact_profile(context)
+            self._account(session, before)
+
+    def append_turn(self, session: ChatSession, role: str, text: str) -> None:
+        """Add a turn, folding the oldest recent turns into the summary."""
+        with self._lock:
+            before = session.approx_bytes()
+            session.turns.append(ChatTurn(role=role, text=_clip(text, _TURN_TEXT_LIMIT)))
+            while len(session.turns) > self.recent_turns:
+                oldest = session.turns.popleft()
+                session.summary = self._summarizer(session.summary, oldest)
+                session.folded_turns += 1
+            session.last_seen = self._clock()
+            self._account(session, before)
+
+    def _account(self, session: ChatSession, before: int) -> None:
+        # A session evicted while its request was in flight is no longer in
+        # `_total_bytes`; counting its growth would inflate the total for good.
+        if self._sessions.get(session.session_id) is not session:
+            return
+        self._total_bytes += session.approx_bytes() - before
+        self._enforce_bounds(keep=session.session_id)
+
+    # ----- bounds -----
+
+    def _expire_idle(self, now: float) -> None:
+        if self.idle_ttl_seconds <= 0:
+            return
+        cutoff = now - self.idle_ttl_seconds
+        # OrderedDict is in least-recently-used order, so stop at the first live one.
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if session.last_seen >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self._total_bytes -= session.approx_bytes()
+            self._evictions["ttl"] += 1
+
+    def _enforce_bounds(self, *, keep: str) -> None:
+        while len(self._sessions) > self.max_sessions:
+            if not self._evict_oldest(keep, reason="lru"):
+                break
+        while self._total_bytes > self.max_total_bytes and len(self._sessions) > 1:
+            if not self._evict_oldest(keep, reason="memory"):
+                break
+
+    def _evict_oldest(self, keep: str, *, reason: str) -> bool:
+        for sid in self._sessions:
+            if sid == keep:
+                continue
+            session = self._sessions.pop(sid)
+            self._total_bytes -= session.approx_bytes()
+            self._evictions[reason] += 1
+            return True
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "approx_bytes": self._total_bytes,
+                "max_sessions": self.max_sessions,
+                "max_total_bytes": self.max_total_bytes,
+                "evictions": dict(self._evictions),
+            }
+
+
+def build_session_prompt_lines(session: ChatSession, *, bot_name: str) -> List[str]:
+    """Render the profile, rolling summary and recent turns for the prompt.
+
+    The current question is expected to be appended by the caller and must
+    not be in `session.turns` yet.
+    """
+    profile = session.profile or compact_profile(None)
+    interests = profile.get("interests") or []
+    skills = profile.get("skills") or []
+    campuses = profile.get("recommendedCampuses") or []
+    majors = profile.get("recommendedMajors") or []
+
+    lines = [
+        f"Student on why they want to go to the UH system: {profile.get('goal')}",
+        f"Student Interests: {', '.join(interests) if interests else 'None yet'}",
+        f"Student Skills: {', '.join(skills) if skills else 'None yet'}",
+        f"Selected Campus: {profile.get('selectedCampus')}",
+        f"Selected Major: {profile.get('selectedMajor')}",
+    ]
+    if campuses:
+        lines.append(f"Recommended Campuses: {', '.join(campuses)}")
+    if majors:
+        lines.append(f"Recommended Majors: {', '.join(majors)}")
+    lines.append("")
+    if session.summary:
+        lines.append("Summary of earlier conversation:")
+        lines.append(session.summary)
+        lines.append("")
+    lines.append("Previous conversation:")
+    if session.turns:
+        for turn in session.turns:
+            who = "Student" if turn.role == "user" else bot_name
+            lines.append(f"{who}: {turn.text}")
+    else:
+        lines.append("(This is the first message)")
+    return lines
@@ -1,7 +1,8 @@
 import base64
+import json
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Union
 
 import requests
 
@@ -26,12 +27,35 @@ class SpeechToTextError(Exception):
     pass
 
 
-def transcribe_audio(token: str, audio_content: bytes, *, config: Optional[SpeechToTextConfig] = None) -> dict:
+def _recognize_body(cfg: SpeechToTextConfig, audio_content: Union[bytes, bytearray, memoryview]) -> bytes:
+    """Serialize the `speech:recognize` request body.
+
+    The audio is base64-encoded exactly once, straight into the outgoing bytes,
+    instead of going through a str and `json.dumps` (each a full copy).
+    """
+    config_json = json.dumps({
+        "encoding": cfg.encoding,
+        "sampleRateHertz": cfg.sample_rate_hertz,
+        "languageCode": cfg.language_code,
+        "enableAutomaticPunctuation": cfg.enable_automatic_punctuation,
+    }).encode("utf-8")
+    return b"".join((
+        b'{"config":', config_json,
+        b',"audio":{"content":"', base64.b64encode(audio_content), b'"}}',
+    ))
+
+
+def transcribe_audio(
+    token: str,
+    audio_content: Union[bytes, bytearray, memoryview],
+    *,
+    config: Optional[SpeechToTextConfig] = None,
+) -> dict:
     """Call Google Speech-to-Text API and return the transcription.
 
     Args:
         token: A fresh OAuth2 token (e.g. from `get_access_token()` in `main.py`).
-        audio_content: The raw audio bytes to transcribe.
+        audio_content: The raw audio bytes (or a bytearray / memoryview of them).
         config: Optional override for speech recognition settings.
 
     Returns:
@@ -45,24 +69,11 @@ def transcribe_audio(token: str, audio_content: bytes, *, config: Optional[Speec
         "Content-Type": "application/json",
     }
 
-    # Convert audio bytes to base64 for the API
-    audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-
     url = "https://speech.googleapis.com/v1/speech:recognize"
-    payload = {
-        "config": {
-            "encoding": cfg.encoding,
-            "sampleRateHertz": cfg.sample_rate_hertz,
-            "languageCode": cfg.language_code,
-            "enableAutomaticPunctuation": cfg.enable_automatic_punctuation,
-        },
-        "audio": {
-            "content": audio_base64
-        }
-    }
+    body = _recognize_body(cfg, audio_content)
 
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        response = requests.post(url, headers=headers, data=body, timeout=30)
         response.raise_for_status()
     except Exception as exc:
         LOGGER.exception("Failed to transcribe audio")
@@ -0,0 +1,174 @@
+"""
+Chunked, parallel transcription for long WAV / LINEAR16 clips.
+
+The synchronous `speech:recognize` API handles about a minute of audio and its
+latency grows with clip length. For long why-UH answers `transcribe_chunked()`:
+
+1. cuts the PCM at the quietest frame near each chunk boundary (so words are
+   rarely split), with a short overlap between neighbouring chunks,
+2. transcribes the chunks concurrently on a bounded thread pool,
+3. stitches the transcripts back together, dropping words repeated across the
+   overlap, and weights the confidence by chunk duration.
+
+The result has the same `{"transcript", "confidence", "all_results"}` shape as
+`transcribe_audio`.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from audio_preprocessing import PreprocessOptions, decode_pcm, downmix, encode_linear16, frame_rms
+from chat_to_voice_attachment import SpeechToTextConfig, transcribe_audio
+from transcript_cache import TokenSource
+
+
+MAX_CHUNK_SECONDS = float(os.environ.get("SPEECH_CHUNK_SECONDS", "25"))
+MIN_CHUNK_SECONDS = 8.0
+OVERLAP_SECONDS = 0.5
+# Longest run of words we try to match when de-duplicating an overlap.
+_MAX_OVERLAP_WORDS = 8
+
+CHUNK_WORKERS = int(os.environ.get("SPEECH_CHUNK_WORKERS", "4"))
+
+_CHUNK_POOL: Optional[ThreadPoolExecutor] = None
+_CHUNK_POOL_LOCK = threading.Lock()
+
+
+def _chunk_pool() -> ThreadPoolExecutor:
+    global _CHUNK_POOL
+    with _CHUNK_POOL_LOCK:
+        if _CHUNK_POOL is None:
+            _CHUNK_POOL = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="stt-chunk")
+        return _CHUNK_POOL
+
+
+def shutdown() -> None:
+    """Stop the chunk workers (app shutdown); the pool is recreated on next use."""
+    global _CHUNK_POOL
+    with _CHUNK_POOL_LOCK:
+        pool, _CHUNK_POOL = _CHUNK_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def split_at_silence(
+    samples: np.ndarray,
+    rate: int,
+    *,
+    max_chunk_s: float = MAX_CHUNK_SECONDS,
+    min_chunk_s: float = MIN_CHUNK_SECONDS,
+    overlap_s: float = OVERLAP_SECONDS,
+    frame_ms: int = PreprocessOptions.frame_ms,
+) -> List[Tuple[int, int]]:
+    """Return (start, end) sample ranges covering `samples`.
+
+    Each cut lands on the lowest-energy frame between `min_chunk_s` and
+    `max_chunk_s` into the chunk (the latest one on ties); the next chunk
+    starts `overlap_s` earlier.
+    """
+    total = len(samples)
+    max_len = int(max_chunk_s * rate)
+    if total <= max_len:
+        return [(0, total)]
+
+    frame = max(1, int(rate * frame_ms / 1000))
+    rms = frame_rms(samples, rate, frame_ms)
+    overlap = int(overlap_s * rate)
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    while start < total:
+        if total - start <= max_len:
+            ranges.append((start, total))
+            break
+        lo = (start + int(min_chunk_s * rate)) // frame
+        hi = min(len(rms), (start + max_len) // frame)
+        if hi > lo:
+            # Latest of the quietest frames, so chunks stay close to max length.
+            cut = (hi - 1 - int(np.argmin(rms[lo:hi][::-1]))) * frame
+        else:
+            cut = start + max_len
+        ranges.append((start, cut))
+        start = max(cut - overlap, start + 1)
+    return ranges
+
+
+def _word_key(word: str) -> str:
+    return re.sub(r"[^a-z0-9']+", "", word.lower())
+
+
+def stitch_transcripts(parts: List[str]) -> str:
+    """Join chunk transcripts, removing words duplicated by the overlap."""
+    words: List[str] = []
+    for part in parts:
+        incoming = part.split()
+        if not incoming:
+            continue
+        drop = 0
+        limit = min(_MAX_OVERLAP_WORDS, len(words), len(incoming))
+        for size in range(limit, 0, -1):
+            tail = [_word_key(w) for w in words[-size:]]
+            head = [_word_key(w) for w in incoming[:size]]
+            if tail == head:
+                drop = size
+                break
+        words.extend(incoming[drop:])
+    return " ".join(words)
+
+
+def transcribe_chunked(
+    token: TokenSource,
+    pcm: bytes,
+    config: SpeechToTextConfig,
+    *,
+    max_chunk_s: Optional[float] = None,
+    transcribe: Callable[..., dict] = transcribe_audio,
+) -> dict:
+    """Transcribe WAV or headerless mono LINEAR16 `pcm` chunk by chunk, in parallel.
+
+    `token` is a token or a zero-argument fetcher for one. It is passed to
+    `transcribe` as is, so a cached wrapper (see transcript_cache) can skip
+    the fetch on hits; plain `transcribe_audio` gets the fetched token.
+    """
+    decoded = decode_pcm(pcm, config.encoding, config.sample_rate_hertz)
+    if decoded is None:
+        raise ValueError("Chunked transcription needs WAV or LINEAR16 audio")
+    if callable(token) and transcribe is transcribe_audio:
+        token = token()
+    samples, rate = decoded
+    samples = downmix(samples)
+    ranges = split_at_silence(samples, rate, max_chunk_s=max_chunk_s or MAX_CHUNK_SECONDS)
+
+    chunk_config = replace(config, encoding="LINEAR16", sample_rate_hertz=rate)
+    futures = [
+        _chunk_pool().submit(transcribe, token, encode_linear16(samples[start:end]), config=chunk_config)
+        for start, end in ranges
+    ]
+    results = [future.result() for future in futures]
+
+    transcripts: List[str] = []
+    all_results: List[dict] = []
+    weighted = 0.0
+    weight_total = 0.0
+    for (start, end), result in zip(ranges, results):
+        text = (result.get("transcript") or "").strip()
+        all_results.extend(result.get("all_results", []))
+        if not text:
+            continue
+        transcripts.append(text)
+        duration = (end - start) / rate
+        weighted += float(result.get("confidence") or 0.0) * duration
+        weight_total += duration
+
+    return {
+        "transcript": stitch_transcripts(transcripts),
+        "confidence": round(weighted / weight_total, 4) if weight_total else 0.0,
+        "all_results": all_results,
+        "chunks": len(ranges),
+    }
@@ -0,0 +1,230 @@
+"""
+Course records from the campus catalogs (`UH-courses/<campus>_courses.csv`).
+
+Course names in the pathway files and prerequisite text come in many shapes
+("CINE 255 (DH)", "ics 111", "BIOL 171/171L"); `normalize_course_code()`
+reduces them to a `(prefix, number)` key so every lookup goes through one
+dictionary instead of a scan over the CSV rows.
+
+`load_course_catalog()` parses every campus file once; `courses_version()`
+hashes the files' (size, mtime) so callers can tell when to rebuild. The
+active catalog (`get_course_catalog()`) backs `/api/course-cards`, which
+serves the compact `CourseCard` records the frontend used to build from a
+bundled copy of the Manoa catalog.
+
+With shared segments enabled (the default), the records live in a segment
+that every worker process maps instead of parsing its own copy. Records are
+decoded on access; see shared_segment.py.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from shared_segment import attach_or_build, shared_segments_enabled
+
+
+UH_COURSES_DIR = Path(__file__).resolve().parents[1] / "UH-courses"
+
+CourseKey = Tuple[str, str]  # (PREFIX, NUMBER), e.g. ("CINE", "255")
+
+_CODE_RE = re.compile(r"^\s*([A-Za-z][A-Za-z&]{0,7})\s*[- ]?\s*(\d{1,4}[A-Za-z]{0,3})\b")
+
+
+def normalize_course_code(name: str) -> Optional[CourseKey]:
+    """`(PREFIX, NUMBER)` for a course name, ignoring suffixes like "(DH)".
+
+    >>> normalize_course_code("CINE 255 (DH)")
+    ('CINE', '255')
+    >>> normalize_course_code("ics 111 - Intro")
+    ('ICS', '111')
+    """
+    match = _CODE_RE.match(name or "")
+    if not match:
+        return None
+    return match.group(1).upper(), match.group(2).upper()
+
+
+def format_course_code(key: CourseKey) -> str:
+    return f"{key[0]} {key[1]}"
+
+
+@dataclass(frozen=True)
+class CourseRecord:
+    campus: str
+    prefix: str
+    number: str
+    title: str
+    description: str
+    credits: str
+    department: str
+    metadata: str
+
+    @property
+    def key(self) -> CourseKey:
+        return self.prefix, self.number
+
+    @property
+    def code(self) -> str:
+        return format_course_code(self.key)
+
+
+def card_id(key: CourseKey) -> str:
+    """Same key the frontend's `normalizeCourseCode` produces ("ics111")."""
+    return f"{key[0]}{key[1]}".lower()
+
+
+def course_card(record: CourseRecord) -> Dict[str, object]:
+    """`CourseCard` (src/utils/courseUtils.ts) for a catalog record."""
+    credits = re.match(r"\d+", record.credits or "")
+    return {
+        "id": card_id(record.key),
+        "code": record.code,
+        "name": record.title or record.code,
+        "credits": int(credits.group()) if credits else 3,
+        "location": record.department or "UH Mānoa",
+        "description": record.description or "Course details coming soon.",
+    }
+
+
+def course_files(base: Path = UH_COURSES_DIR) -> Dict[str, Path]:
+    """campus id (file stem without `_courses`) -> CSV path."""
+    if not base.exists():
+        return {}
+    return {path.name[: -len("_courses.csv")]: path for path in sorted(base.glob("*_courses.csv"))}
+
+
+def courses_version(base: Path = UH_COURSES_DIR) -> str:
+    digest = hashlib.sha1()
+    for campus, path in course_files(base).items():
+        stat = path.stat()
+        digest.update(f"{campus}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_campus_courses(campus: str, path: Path) -> List[CourseRecord]:
+    records: List[CourseRecord] = []
+    with path.open("r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            key = normalize_course_code(f"{row.get('course_prefix') or ''} {row.get('course_number') or ''}")
+            if key is None:
+                continue
+            records.append(CourseRecord(
+                campus=campus,
+                prefix=key[0],
+                number=key[1],
+                title=(row.get("course_title") or "").strip(),
+                description=(row.get("course_desc") or "").strip(),
+                credits=(row.get("num_units") or "").strip(),
+                department=(row.get("dept_name") or "").strip(),
+                metadata=row.get("metadata") or "",
+            ))
+    return records
+
+
+@dataclass
+class CourseCatalog:
+    """Every campus's courses, indexed by campus and `(prefix, number)`."""
+
+    version: str
+    by_campus: Dict[str, Mapping[CourseKey, CourseRecord]]
+
+    def get(self, campus: str, key: CourseKey) -> Optional[CourseRecord]:
+        return self.by_campus.get(campus, {}).get(key)
+
+    def find(self, campus: str, name: str) -> Optional[CourseRecord]:
+        key = normalize_course_code(name)
+        return self.get(campus, key) if key else None
+
+    def campuses(self) -> List[str]:
+        return list(self.by_campus)
+
+    def records(self) -> Iterable[CourseRecord]:
+        for courses in self.by_campus.values():
+            yield from courses.values()
+
+    def prefixes(self) -> set:
+        return {key[0] for courses in self.by_campus.values() for key in courses}
+
+    def cards(self, campus: str, names: Iterable[str]) -> Tuple[Dict[str, Dict[str, object]], List[str]]:
+        """(code -> CourseCard, names with no catalog entry) for a batch of course names.
+
+        Codes missing at `campus` fall back to the Manoa catalog.
+        """
+        cards: Dict[str, Dict[str, object]] = {}
+        missing: List[str] = []
+        for name in names:
+            key = normalize_course_code(name)
+            record = (self.get(campus, key) or self.get("manoa", key)) if key else None
+            if record is None:
+                missing.append(name)
+            else:
+                cards.setdefault(record.code, course_card(record))
+        return cards, missing
+
+
+def parse_course_files(base: Path = UH_COURSES_DIR) -> Dict[str, Dict[CourseKey, CourseRecord]]:
+    """campus -> courses for every campus file. The first row wins for duplicate codes."""
+    by_campus: Dict[str, Dict[CourseKey, CourseRecord]] = {}
+    for campus, path in course_files(base).items():
+        courses: Dict[CourseKey, CourseRecord] = {}
+        for record in load_campus_courses(campus, path):
+            courses.setdefault(record.key, record)
+        by_campus[campus] = courses
+    return by_campus
+
+
+def load_course_catalog(base: Path = UH_COURSES_DIR) -> CourseCatalog:
+    """The catalog for the current course files, from the shared segment when enabled."""
+    version = courses_version(base)
+    if not shared_segments_enabled():
+        return CourseCatalog(version=version, by_campus=parse_course_files(base))
+    segment = attach_or_build(
+        f"courses-{hashlib.sha1(str(base).encode('utf-8')).hexdigest()[:8]}",
+        version,
+        lambda: (parse_course_files(base), {}),
+        code_files=[__file__],
+    )
+    return CourseCatalog(version=version, by_campus={campus: segment.mapping(campus) for campus in segment.sections()})
+
+
+# ------------- Active catalog -------------
+
+_catalog: Optional[CourseCatalog] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_CHECK_INTERVAL = 5.0  # seconds between source-file stat sweeps
+
+
+def install_course_catalog(catalog: CourseCatalog) -> None:
+    global _catalog, _checked_at
+    with _lock:
+        _catalog = catalog
+        _checked_at = time.monotonic()
+
+
+def course_catalog_is_stale() -> bool:
+    global _checked_at
+    with _lock:
+        catalog = _catalog
+        if catalog is None:
+            return True
+        now = time.monotonic()
+        if now - _checked_at < _CHECK_INTERVAL:
+            return False
+        _checked_at = now
+    return courses_version() != catalog.version
+
+
+def get_course_catalog() -> CourseCatalog:
+    """Return the active catalog, reloading it in-process if the files changed."""
+    if course_catalog_is_stale():
+        install_course_catalog(load_course_catalog())
+    assert _catalog is not None
+    return _catalog
@@ -0,0 +1,147 @@
+"""
+Managed executors for CPU-bound work that must stay off the event loop.
+
+- `CPU_POOL`: bounded thread pool for short jobs (difflib campus matching,
+  pathway lookups, JSON decoding of cached files).
+- `HEAVY_POOL`: process pool for rebuilds that parse every catalog file, such as
+  the campus catalog snapshot.
+
+Both apply backpressure: once `max_pending` jobs are queued or running, new
+callers wait for a slot instead of piling more work onto the pool. `stats()`
+reports queue depth, wait and run times for `/api/metrics`.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from request_profiler import current_profile, span
+
+
+def _timed_call(fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[Any, float, float]:
+    # Module-level so process pools can pickle it. Wall-clock stamps are
+    # comparable across processes, monotonic ones are not.
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started, time.time()
+
+
+def _profiled_call(name: str, fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[Any, float, float]:
+    # Runs inside the submitting request's context, so the span (and the
+    # worker thread's samples) land in that request's profile.
+    with span(name):
+        return _timed_call(fn, args, kwargs)
+
+
+class ManagedExecutor:
+    def __init__(self, name: str, *, kind: str = "thread", max_workers: int = 4, max_pending: int = 64) -> None:
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "queue_wait_seconds_total": 0.0,
+            "run_seconds_total": 0.0,
+            "max_queue_wait_seconds": 0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing this module never forks or spawns threads.
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-pool")
+            return self._executor
+
+    def _bump(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+            if key == "in_flight":
+                self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run `fn(*args, **kwargs)` on the pool and await its result.
+
+        For the process pool `fn` and its arguments must be picklable.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        loop = asyncio.get_running_loop()
+        call = partial(_timed_call, fn, args, kwargs)
+        if self.kind == "thread":
+            if current_profile() is not None:
+                call = partial(_profiled_call, f"{self.name}:{getattr(fn, '__name__', 'call')}", fn, args, kwargs)
+            # Worker threads see the caller's context: request id for logs, active profile.
+            call = partial(contextvars.copy_context().run, call)
+        submitted = time.time()
+        async with self._slots:
+            self._bump("submitted")
+            self._bump("in_flight")
+            try:
+                result, started, finished = await loop.run_in_executor(self._get_executor(), call)
+            except Exception:
+                self._bump("failed")
+                raise
+            finally:
+                self._bump("in_flight", -1)
+        wait = max(0.0, started - submitted)
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["queue_wait_seconds_total"] += wait
+            self._stats["run_seconds_total"] += max(0.0, finished - started)
+            self._stats["max_queue_wait_seconds"] = max(self._stats["max_queue_wait_seconds"], wait)
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            snapshot = dict(self._stats)
+        completed = snapshot["completed"] or 1
+        snapshot["queued"] = max(0, snapshot["in_flight"] - self.max_workers)
+        snapshot["mean_queue_wait_seconds"] = round(snapshot["queue_wait_seconds_total"] / completed, 4)
+        snapshot["mean_run_seconds"] = round(snapshot["run_seconds_total"] / completed, 4)
+        snapshot.update({"kind": self.kind, "max_workers": self.max_workers, "max_pending": self.max_pending})
+        return snapshot
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._slots = None  # bound to the event loop that is going away
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+CPU_POOL = ManagedExecutor(
+    "cpu",
+    kind="thread",
+    max_workers=int(os.environ.get("CPU_POOL_WORKERS", str(min(8, (os.cpu_count() or 2) + 2)))),
+    max_pending=int(os.environ.get("CPU_POOL_MAX_PENDING", "64")),
+)
+
+HEAVY_POOL = ManagedExecutor(
+    "heavy",
+    kind="process",
+    max_workers=int(os.environ.get("HEAVY_POOL_WORKERS", "2")),
+    max_pending=int(os.environ.get("HEAVY_POOL_MAX_PENDING", "8")),
+)
+
+
+def executor_stats() -> Dict[str, Dict[str, float]]:
+    return {pool.name: pool.stats() for pool in (CPU_POOL, HEAVY_POOL)}
@@ -0,0 +1,173 @@
+"""
+Precomputed freshman-course picks for `/api/freshman-courses`.
+
+The selection logic lives in `freshman_courses_selector.py`. Here it runs
+once for every program in every `UH-courses/<campus>_degree_pathways.json`,
+preferring each program's own dominant course prefix, and the results are
+kept in a dict keyed by (campus, normalized program name) so a request is a
+single lookup.
+
+`build_campus_freshman_courses(campus)` is self-contained and picklable, so
+the API fans the campuses out over `executors.HEAVY_POOL` and installs the
+merged `FreshmanCourseIndex`; `freshman_sources_version()` tells when the
+pathway or course files changed and the index needs rebuilding.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from course_catalog import UH_COURSES_DIR, courses_version, normalize_course_code
+from freshman_courses_selector import (
+    CourseRepository,
+    get_freshman_courses,
+    load_courses_file,
+    select_top_freshman_courses,
+)
+
+
+FRESHMAN_COURSE_LIMIT = 3
+
+
+def _program_key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", (name or "").lower())
+
+
+def pathway_campuses() -> List[str]:
+    return sorted(path.name[: -len("_degree_pathways.json")] for path in UH_COURSES_DIR.glob("*_degree_pathways.json"))
+
+
+def freshman_sources_version() -> str:
+    digest = hashlib.sha1(courses_version().encode("utf-8"))
+    for path in sorted(UH_COURSES_DIR.glob("*_degree_pathways.json")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _course_entry(selected: Dict) -> Dict:
+    pathway = selected["pathway_info"]
+    details = selected["course_details"]
+    key = normalize_course_code(pathway.get("name", ""))
+    return {
+        "name": pathway.get("name"),
+        "code": f"{key[0]} {key[1]}" if key else pathway.get("name"),
+        "credits": pathway.get("credits"),
+        "semester": pathway.get("semester"),
+        "title": details.get("course_title", ""),
+        "description": details.get("course_desc", ""),
+        "department": details.get("dept_name", ""),
+    }
+
+
+def build_campus_freshman_courses(campus: str, limit: int = FRESHMAN_COURSE_LIMIT) -> Dict[str, Dict]:
+    """Top freshman courses for every program at `campus`, keyed by normalized program name."""
+    with (UH_COURSES_DIR / f"{campus}_degree_pathways.json").open("r", encoding="utf-8") as f:
+        pathways = json.load(f)
+    repository = CourseRepository(load_courses_file(str(UH_COURSES_DIR / f"{campus}_courses.csv")) or [])
+    programs: Dict[str, Dict] = {}
+    for program in get_freshman_courses(pathways):
+        prefix = program.get("dominant_prefix")
+        selected = select_top_freshman_courses(
+            program, repository, limit=limit, priority_prefixes=[prefix] if prefix else None
+        )
+        programs.setdefault(_program_key(program.get("program_name", "")), {
+            "campus": campus,
+            "program_name": program.get("program_name"),
+            "institution": program.get("institution"),
+            "total_credits": program.get("total_credits"),
+            "priority_prefix": prefix,
+            "courses": [_course_entry(course) for course in selected],
+        })
+    return programs
+
+
+@dataclass
+class FreshmanCourseIndex:
+    version: str
+    programs: Dict[Tuple[str, str], Dict]  # (campus, normalized program name) -> entry
+    build_seconds: float = 0.0
+
+    def get(self, campus: str, program: str) -> Optional[Dict]:
+        """Exact (normalized) program name first, then the longest substring match."""
+        campus = (campus or "manoa").lower()
+        key = _program_key(program)
+        entry = self.programs.get((campus, key))
+        if entry is not None or not key:
+            return entry
+        best, best_score = None, 0
+        for (entry_campus, name), candidate in self.programs.items():
+            if entry_campus != campus:
+                continue
+            score = len(key) if key in name else len(name) if name in key else 0
+            if score > best_score:
+                best, best_score = candidate, score
+        return best
+
+    def program_names(self, campus: str) -> List[str]:
+        return sorted(entry["program_name"] for (c, _), entry in self.programs.items() if c == campus.lower())
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "programs": len(self.programs),
+            "campuses": sorted({campus for campus, _ in self.programs}),
+            "build_seconds": round(self.build_seconds, 3),
+        }
+
+
+def merge_freshman_courses(version: str, per_campus: Dict[str, Dict[str, Dict]], build_seconds: float = 0.0) -> FreshmanCourseIndex:
+    programs = {
+        (campus, key): entry
+        for campus, entries in per_campus.items()
+        for key, entry in entries.items()
+    }
+    return FreshmanCourseIndex(version=version, programs=programs, build_seconds=build_seconds)
+
+
+def build_freshman_course_index() -> FreshmanCourseIndex:
+    """Build every campus in-process (the API parallelizes this; see main.py)."""
+    started = time.perf_counter()
+    version = freshman_sources_version()
+    per_campus = {campus: build_campus_freshman_courses(campus) for campus in pathway_campuses()}
+    return merge_freshman_courses(version, per_campus, time.perf_counter() - started)
+
+
+# ------------- Active index -------------
+
+_index: Optional[FreshmanCourseIndex] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_CHECK_INTERVAL = 5.0  # seconds between source-file stat sweeps
+
+
+def install_freshman_course_index(index: FreshmanCourseIndex) -> None:
+    global _index, _checked_at
+    with _lock:
+        _index = index
+        _checked_at = time.monotonic()
+
+
+def freshman_course_index_is_stale() -> bool:
+    global _checked_at
+    with _lock:
+        index = _index
+        if index is None:
+            return True
+        now = time.monotonic()
+        if now - _checked_at < _CHECK_INTERVAL:
+            return False
+        _checked_at = now
+    return freshman_sources_version() != index.version
+
+
+def get_freshman_course_index() -> FreshmanCourseIndex:
+    if freshman_course_index_is_stale():
+        install_freshman_course_index(build_freshman_course_index())
+    assert _index is not None
+    return _index
@@ -2,11 +2,21 @@
 Script to extract freshman-year courses from UH degree pathways and course data.
 This module demonstrates how to read the manoa_degree_pathways.json and corresponding
 course files to select ~3 courses a student would take in their freshman year.
+
+Course and schedule lookups go through `CourseRepository` / `ScheduleIndex`,
+which index the rows once by normalized course code, so processing every
+program costs O(programs × pathway courses) rather than a catalog scan per
+course.
 """
 
+import csv
 import json
 import os
-from typing import List, Dict, Any, Optional
+import sys
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from course_catalog import CourseKey, normalize_course_code
 
 
 def load_json_file(file_path: str) -> Any:
@@ -22,6 +32,18 @@ def load_json_file(file_path: str) -> Any:
         return None
 
 
+def load_courses_file(file_path: str) -> Optional[List[Dict]]:
+    """Load course rows from a catalog JSON file or its CSV original."""
+    if not file_path.lower().endswith('.csv'):
+        return load_json_file(file_path)
+    try:
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+    except FileNotFoundError:
+        print(f"Error: File not found at {file_path}")
+        return None
+
+
 def get_freshman_courses(pathways_data: List[Dict]) -> List[Dict]:
     """
     Extract all freshman year courses from degree pathways.
@@ -45,6 +67,7 @@ def get_freshman_courses(pathways_data: List[Dict]) -> List[Dict]:
                     'program_name': program.get('program_name'),
                     'institution': program.get('institution'),
                     'total_credits': program.get('total_credits'),
+                    'dominant_prefix': dominant_prefix(program),
                     'freshman_courses': []
                 }
                 
@@ -63,41 +86,75 @@ def get_freshman_courses(pathways_data: List[Dict]) -> List[Dict]:
     return freshman_courses_list
 
 
-def find_course_details(courses_data: List[Dict], course_name: str) -> Optional[Dict]:
+class CourseRepository:
+    """Course rows indexed by normalized `(prefix, number)`.
+
+    "CINE 255 (DH)", "cine 255" and "CINE 255" all map to the same key, so a
+    lookup is one dictionary read instead of a scan over the catalog.
+    """
+
+    def __init__(self, courses_data: Iterable[Dict]):
+        self._by_key: Dict[CourseKey, Dict] = {}
+        for course in courses_data:
+            key = normalize_course_code(f"{course.get('course_prefix') or ''} {course.get('course_number') or ''}")
+            if key is not None:
+                self._by_key.setdefault(key, course)  # first row wins, like the old linear scan
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def get(self, course_name: str) -> Optional[Dict]:
+        key = normalize_course_code(course_name)
+        return self._by_key.get(key) if key else None
+
+
+class ScheduleIndex:
+    """Schedule entries indexed by (normalized course, semester)."""
+
+    def __init__(self, schedule_data: Iterable[Dict]):
+        self._by_course: Dict[CourseKey, List[Dict]] = defaultdict(list)
+        self._by_semester: Dict[Tuple[CourseKey, str], List[Dict]] = defaultdict(list)
+        for entry in schedule_data:
+            key = normalize_course_code(entry.get('course_name', ''))
+            if key is None:
+                continue
+            self._by_course[key].append(entry)
+            self._by_semester[(key, entry.get('semester'))].append(entry)
+
+    def get(self, course_name: str, semester: Optional[str] = None) -> Optional[List[Dict]]:
+        key = normalize_course_code(course_name)
+        if key is None:
+            return None
+        entries = self._by_course.get(key) if semester is None else self._by_semester.get((key, semester))
+        return list(entries) if entries else None
+
+
+def _course_repository(courses: Union[CourseRepository, List[Dict]]) -> CourseRepository:
+    return courses if isinstance(courses, CourseRepository) else CourseRepository(courses)
+
+
+def find_course_details(courses_data: Union[CourseRepository, List[Dict]], course_name: str) -> Optional[Dict]:
     """
     Find detailed information about a specific course.
     
     Args:
-        courses_data: List of course dictionaries from manoa_courses.json
-        course_name: Name of the course (e.g., "CINE 255")
+        courses_data: CourseRepository (or a list of course dictionaries, which
+            is indexed first; pass a repository when looking up many courses)
+        course_name: Name of the course (e.g., "CINE 255" or "CINE 255 (DH)")
         
     Returns:
         Dictionary with course details or None if not found
     """
-    # Parse course prefix and number from course name
-    parts = course_name.split()
-    if len(parts) < 2:
-        return None
-    
-    prefix = parts[0]
-    number = parts[1].split('(')[0]  # Remove any suffix like "(DH)"
-    
-    # Search for matching course
-    for course in courses_data:
-        if (course.get('course_prefix') == prefix and 
-            course.get('course_number') == number):
-            return course
-    
-    return None
+    return _course_repository(courses_data).get(course_name)
 
 
-def find_course_schedule(schedule_data: List[Dict], course_name: str, 
+def find_course_schedule(schedule_data: Union[ScheduleIndex, List[Dict], None], course_name: str,
                         semester: str = None) -> Optional[List[Dict]]:
     """
     Find schedule information for a specific course.
     
     Args:
-        schedule_data: List of schedule dictionaries from course_schedule.json
+        schedule_data: ScheduleIndex (or a list of schedule dictionaries from course_schedule.json)
         course_name: Name of the course (e.g., "CINE 255" or "CINE 255 (DH)")
         semester: Filter by semester (e.g., "fall_semester", "spring_semester")
         
@@ -106,70 +163,81 @@ def find_course_schedule(schedule_data: List[Dict], course_name: str,
     """
     if not schedule_data:
         return None
-    
-    # Remove any suffixes from course name (e.g., " (DH)")
-    clean_course_name = course_name.split('(')[0].strip()
-    
-    matching_schedules = []
-    
-    for entry in schedule_data:
-        entry_course = entry.get('course_name', '')
-        if entry_course == clean_course_name:
-            if semester is None or entry.get('semester') == semester:
-                matching_schedules.append(entry)
-    
-    return matching_schedules if matching_schedules else None
+    index = schedule_data if isinstance(schedule_data, ScheduleIndex) else ScheduleIndex(schedule_data)
+    return index.get(course_name, semester)
 
 
-def select_top_freshman_courses(program_courses: Dict, courses_data: List[Dict], 
-                               limit: int = 3) -> List[Dict]:
+DEFAULT_PRIORITY_PREFIXES = ['CINE', 'ART', 'DNCE', 'THEA']  # Animation/Cinematic Arts
+
+
+def dominant_prefix(program: Dict) -> Optional[str]:
+    """Most common course prefix across a program's whole pathway (ties: first seen)."""
+    counts: Dict[str, int] = {}
+    for year in program.get('years', []):
+        for semester in year.get('semesters', []):
+            for course in semester.get('courses', []):
+                key = normalize_course_code(course.get('name', ''))
+                if key is not None:
+                    counts[key[0]] = counts.get(key[0], 0) + 1
+    if not counts:
+        return None
+    return max(counts, key=counts.get)  # dicts keep insertion order, so ties go to the first seen
+
+
+def select_top_freshman_courses(program_courses: Dict, courses_data: Union[CourseRepository, List[Dict]],
+                               limit: int = 3,
+                               priority_prefixes: Optional[List[str]] = None) -> List[Dict]:
     """
     Select top ~3 courses from freshman year, preferring major-specific courses.
     
     Args:
         program_courses: Dictionary containing program info and freshman courses
-        courses_data: List of detailed course information
+        courses_data: CourseRepository (or list) of detailed course information
         limit: Number of courses to select
+        priority_prefixes: Course prefixes to pick first (e.g. the program's
+            `dominant_prefix`); defaults to the Animation prefixes
         
     Returns:
         List of selected courses with full details
     """
+    repository = _course_repository(courses_data)
     selected_courses = []
-    priority_keywords = ['CINE', 'ART', 'DNCE', 'THEA']  # Program-specific courses
+    selected_names = set()
+    priority = {prefix.upper() for prefix in (priority_prefixes or DEFAULT_PRIORITY_PREFIXES)}
     
     freshman = program_courses.get('freshman_courses', [])
     
+    def take(course: Dict) -> None:
+        course_name = course.get('name', '')
+        if course_name in selected_names:
+            return
+        course_details = repository.get(course_name)
+        if course_details:
+            selected_courses.append({
+                'pathway_info': course,
+                'course_details': course_details
+            })
+            selected_names.add(course_name)
+    
     # First pass: get major-specific courses
     for course in freshman:
-        course_name = course.get('name', '')
-        for keyword in priority_keywords:
-            if keyword in course_name and len(selected_courses) < limit:
-                course_details = find_course_details(courses_data, course_name)
-                if course_details:
-                    selected_courses.append({
-                        'pathway_info': course,
-                        'course_details': course_details
-                    })
+        if len(selected_courses) >= limit:
+            break
+        key = normalize_course_code(course.get('name', ''))
+        if key is not None and key[0] in priority:
+            take(course)
     
     # Second pass: fill remaining slots with any courses
-    if len(selected_courses) < limit:
-        for course in freshman:
-            if len(selected_courses) >= limit:
-                break
-            course_name = course.get('name', '')
-            # Check if not already selected
-            if not any(sc['pathway_info']['name'] == course_name for sc in selected_courses):
-                course_details = find_course_details(courses_data, course_name)
-                if course_details:
-                    selected_courses.append({
-                        'pathway_info': course,
-                        'course_details': course_details
-                    })
+    for course in freshman:
+        if len(selected_courses) >= limit:
+            break
+        take(course)
     
     return selected_courses
 
 
-def print_course_info(selected_courses: List[Dict], schedule_data: Optional[List[Dict]] = None) -> None:
+def print_course_info(selected_courses: List[Dict],
+                      schedule_data: Union[ScheduleIndex, List[Dict], None] = None) -> None:
     """Pretty print the selected courses with optional schedule information."""
     print("\n" + "="*80)
     print("SELECTED FRESHMAN YEAR COURSES")
@@ -215,7 +283,7 @@ def main(pathways_file: str, courses_file: str,
     
     Args:
         pathways_file: Path to manoa_degree_pathways.json
-        courses_file: Path to manoa_courses.json
+        courses_file: Path to manoa_courses.json (or manoa_courses.csv)
         schedule_file: Optional path to course_schedule.json
         program_filter: Optional filter to select specific program (e.g., "Animation")
     """
@@ -225,14 +293,16 @@ def main(pathways_file: str, courses_file: str,
         return
     
     print("Loading course data...")
-    courses_data = load_json_file(courses_file)
+    courses_data = load_courses_file(courses_file)
     if not courses_data:
         return
+    repository = CourseRepository(courses_data)
     
     schedule_data = None
     if schedule_file and os.path.exists(schedule_file):
         print("Loading schedule data...")
-        schedule_data = load_json_file(schedule_file)
+        schedule_rows = load_json_file(schedule_file)
+        schedule_data = ScheduleIndex(schedule_rows) if schedule_rows else None
     
     print("Extracting freshman year courses...\n")
     
@@ -260,7 +330,9 @@ def main(pathways_file: str, courses_file: str,
         print(f"Freshman Courses: {len(program['freshman_courses'])}")
         
         # Select top 3 courses
-        selected = select_top_freshman_courses(program, courses_data, limit=3)
+        prefix = program.get('dominant_prefix')
+        selected = select_top_freshman_courses(program, repository, limit=3,
+                                               priority_prefixes=[prefix] if prefix else None)
         print_course_info(selected, schedule_data)
 
 
@@ -271,7 +343,10 @@ if __name__ == "__main__":
     
     pathways_file = os.path.join(parent_path, "UH-courses", "manoa_degree_pathways.json")
     courses_file = os.path.join(parent_path, "UH-courses", "json_format", "manoa_courses.json")
+    if not os.path.exists(courses_file):
+        courses_file = os.path.join(parent_path, "UH-courses", "manoa_courses.csv")
     schedule_file = os.path.join(base_path, "course_schedule.json")
     
-    # Run for Animation program specifically
-    main(pathways_file, courses_file, schedule_file, program_filter="Animation")
+    # Program filter from the command line; Animation by default
+    main(pathways_file, courses_file, schedule_file,
+         program_filter=sys.argv[1] if len(sys.argv) > 1 else "Animation")
@@ -0,0 +1,322 @@
+"""
+Declarative Gemini generation profiles and adaptive model routing.
+
+Each endpoint that calls Vertex AI has one `GenerationProfile` in `PROFILES`
+describing its model, output budget, sampling settings, stop sequences and
+timeout. `generate_content()` sends a request for a profile and records how the
+call went.
+
+`AdaptiveRouter` watches latency and errors per model. When the primary model
+of a profile gets slow (p95 over the threshold) or flaky (error rate over the
+threshold) it routes that profile to its `fallback_model`. While degraded it
+sends an occasional probe to the primary and switches back once the probes
+look healthy. `ROUTER.snapshot()` exposes the decisions as metrics.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from metrics import observe_upstream
+from request_profiler import span
+
+LOGGER = logging.getLogger(__name__)
+
+
+PROJECT_ID = os.environ.get("VERTEX_PROJECT_ID", "sigma-night-477219-g4")
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    name: str
+    model: str
+    max_output_tokens: int
+    temperature: float
+    top_p: float = 0.95
+    top_k: int = 40
+    stop_sequences: Tuple[str, ...] = ()
+    timeout: float = 30.0
+    location: str = "us-central1"
+    fallback_model: Optional[str] = None
+    response_mime_type: Optional[str] = None
+    # Cap on 2.5-series thinking tokens (0 turns thinking off); None leaves the model default.
+    thinking_budget: Optional[int] = None
+
+    def generation_config(self, **overrides) -> Dict[str, object]:
+        config: Dict[str, object] = {
+            "temperature": self.temperature,
+            "maxOutputTokens": self.max_output_tokens,
+            "topP": self.top_p,
+            "topK": self.top_k,
+        }
+        if self.stop_sequences:
+            config["stopSequences"] = list(self.stop_sequences)
+        if self.response_mime_type:
+            config["responseMimeType"] = self.response_mime_type
+        if self.thinking_budget is not None:
+            config["thinkingConfig"] = {"thinkingBudget": self.thinking_budget}
+        config.update(overrides)
+        return config
+
+    def url(self, model_id: str, project_id: str = PROJECT_ID) -> str:
+        host = "aiplatform.googleapis.com" if self.location == "global" else f"{self.location}-aiplatform.googleapis.com"
+        return (
+            f"https://{host}/v1/projects/{project_id}/locations/{self.location}"
+            f"/publishers/google/models/{model_id}:generateContent"
+        )
+
+
+PROFILES: Dict[str, GenerationProfile] = {
+    "generate-skills": GenerationProfile(
+        name="generate-skills",
+        model="gemini-2.5-flash-lite",
+        # ~25 short skill names as JSON
+        max_output_tokens=512,
+        temperature=0.5,
+        timeout=20.0,
+    ),
+    "nathan-reaction": GenerationProfile(
+        name="nathan-reaction",
+        model="gemini-2.5-flash-lite",
+        # Per batched item; the batch backend multiplies this by the batch size.
+        max_output_tokens=64,
+        temperature=0.8,
+        timeout=15.0,
+        response_mime_type="application/json",
+    ),
+    "ask-question": GenerationProfile(
+        name="ask-question",
+        model="gemini-2.5-flash",
+        fallback_model="gemini-2.5-flash-lite",
+        # 2-3 sentences. Thinking is off: its tokens count against
+        # maxOutputTokens and could leave a MAX_TOKENS candidate with no text.
+        max_output_tokens=1024,
+        temperature=0.8,
+        thinking_budget=0,
+        stop_sequences=("\nStudent:",),
+        timeout=30.0,
+    ),
+    "recommend-majors": GenerationProfile(
+        name="recommend-majors",
+        model=os.environ.get("VERTEX_MAJOR_MODEL", "gemini-3-pro-preview"),
+        fallback_model=os.environ.get("VERTEX_MAJOR_FALLBACK_MODEL", "gemini-2.5-flash"),
+        # Pro-preview spends most of its budget thinking; 512 was too low for even minimal JSON.
+        max_output_tokens=16384,
+        temperature=0.0,
+        top_p=1.0,
+        top_k=1,
+        timeout=30.0,
+        location=os.environ.get("VERTEX_LOCATION", "global"),
+    ),
+}
+
+
+def _p95(values: Sequence[float]) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+@dataclass
+class _RouteState:
+    degraded: bool = False
+    degraded_since: float = 0.0
+    recovered_at: float = 0.0
+    last_probe: float = 0.0
+    reason: str = ""
+    switches: int = 0
+    recoveries: int = 0
+
+
+@dataclass
+class _ModelWindow:
+    samples: Deque[Tuple[float, float, bool]] = field(default_factory=deque)  # (ts, latency, ok)
+
+
+class AdaptiveRouter:
+    """Pick the primary or fallback model per profile based on recent health."""
+
+    def __init__(
+        self,
+        *,
+        p95_threshold_s: float = 8.0,
+        error_rate_threshold: float = 0.3,
+        window_seconds: float = 120.0,
+        window_size: int = 100,
+        min_samples: int = 8,
+        probe_interval_s: float = 15.0,
+        recovery_samples: int = 3,
+    ) -> None:
+        self.p95_threshold_s = p95_threshold_s
+        self.error_rate_threshold = error_rate_threshold
+        self.window_seconds = window_seconds
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.probe_interval_s = probe_interval_s
+        self.recovery_samples = recovery_samples
+        self._lock = threading.Lock()
+        self._windows: Dict[str, _ModelWindow] = defaultdict(_ModelWindow)
+        self._states: Dict[str, _RouteState] = defaultdict(_RouteState)
+        self._routed: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveRouter":
+        return cls(
+            p95_threshold_s=float(os.environ.get("ROUTER_P95_THRESHOLD_S", "8")),
+            error_rate_threshold=float(os.environ.get("ROUTER_ERROR_RATE_THRESHOLD", "0.3")),
+            window_seconds=float(os.environ.get("ROUTER_WINDOW_SECONDS", "120")),
+            probe_interval_s=float(os.environ.get("ROUTER_PROBE_INTERVAL_S", "15")),
+        )
+
+    def _recent(self, model: str, now: float, since: float = 0.0) -> List[Tuple[float, float, bool]]:
+        window = self._windows[model].samples
+        cutoff = now - self.window_seconds
+        while window and window[0][0] < cutoff:
+            window.popleft()
+        return [sample for sample in window if sample[0] >= since]
+
+    def _health(self, samples: Sequence[Tuple[float, float, bool]]) -> Tuple[float, float]:
+        latencies = [latency for _, latency, _ in samples]
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return _p95(latencies), errors / len(samples) if samples else 0.0
+
+    def choose(self, profile: GenerationProfile) -> str:
+        """Return the model to use for this call."""
+        if not profile.fallback_model:
+            with self._lock:
+                self._routed[(profile.name, profile.model)] += 1
+            return profile.model
+        now = time.monotonic()
+        with self._lock:
+            state = self._states[profile.name]
+            model = profile.model
+            if state.degraded:
+                model = profile.fallback_model
+                if now - state.last_probe >= self.probe_interval_s:
+                    # Let one request through to the primary so it can prove recovery.
+                    state.last_probe = now
+                    model = profile.model
+            self._routed[(profile.name, model)] += 1
+            return model
+
+    def record(self, profile: GenerationProfile, model: str, latency_s: float, ok: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows[model].samples
+            window.append((now, latency_s, ok))
+            while len(window) > self.window_size:
+                window.popleft()
+            if not profile.fallback_model or model != profile.model:
+                return
+
+            state = self._states[profile.name]
+            if not state.degraded:
+                # Ignore samples from before the last recovery so we don't flap.
+                samples = self._recent(model, now, since=state.recovered_at)
+                if len(samples) < self.min_samples:
+                    return
+                p95, error_rate = self._health(samples)
+                if p95 > self.p95_threshold_s or error_rate > self.error_rate_threshold:
+                    state.degraded = True
+                    state.degraded_since = now
+                    state.last_probe = now
+                    state.switches += 1
+                    state.reason = f"p95={p95:.2f}s error_rate={error_rate:.2f}"
+                    LOGGER.warning("[router] %s: %s -> %s (%s)", profile.name, profile.model, profile.fallback_model, state.reason)
+                return
+
+            probes = self._recent(model, now, since=state.degraded_since)
+            if len(probes) < self.recovery_samples:
+                return
+            p95, error_rate = self._health(probes[-self.recovery_samples:])
+            if p95 <= self.p95_threshold_s and error_rate <= self.error_rate_threshold / 2:
+                state.degraded = False
+                state.recovered_at = now
+                state.recoveries += 1
+                state.reason = f"recovered p95={p95:.2f}s error_rate={error_rate:.2f}"
+                LOGGER.info("[router] %s: back on %s (%s)", profile.name, profile.model, state.reason)
+
+    def snapshot(self) -> Dict[str, object]:
+        now = time.monotonic()
+        with self._lock:
+            models: Dict[str, Dict[str, float]] = {}
+            for model in list(self._windows):
+                samples = self._recent(model, now)
+                p95, error_rate = self._health(samples)
+                models[model] = {
+                    "samples": len(samples),
+                    "p95_seconds": round(p95, 3),
+                    "error_rate": round(error_rate, 3),
+                }
+            profiles: Dict[str, Dict[str, object]] = {}
+            for name, profile in PROFILES.items():
+                state = self._states.get(name, _RouteState())
+                profiles[name] = {
+                    "primary": profile.model,
+                    "fallback": profile.fallback_model,
+                    "active": profile.fallback_model if state.degraded else profile.model,
+                    "degraded": state.degraded,
+                    "switches": state.switches,
+                    "recoveries": state.recoveries,
+                    "reason": state.reason,
+                    "routed": {
+                        model: count for (pname, model), count in self._routed.items() if pname == name
+                    },
+                }
+            return {"models": models, "profiles": profiles}
+
+
+ROUTER = AdaptiveRouter.from_env()
+
+
+def generate_content(
+    profile_name: str,
+    *,
+    token: str,
+    contents: List[Dict[str, object]],
+    safety_settings: Optional[List[Dict[str, str]]] = None,
+    config_overrides: Optional[Dict[str, object]] = None,
+    router: Optional[AdaptiveRouter] = None,
+) -> Dict:
+    """POST a generateContent request for `profile_name` and return the JSON body.
+
+    The model is picked by the router; latency and success are recorded for it.
+    HTTP errors are raised as `requests.HTTPError` like `raise_for_status()`.
+    """
+    profile = PROFILES[profile_name]
+    router = router or ROUTER
+    model_id = router.choose(profile)
+    payload: Dict[str, object] = {
+        "contents": contents,
+        "generation_config": profile.generation_config(**(config_overrides or {})),
+    }
+    if safety_settings:
+        payload["safetySettings"] = safety_settings
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    started = time.perf_counter()
+    ok = False
+    status, data = "error", None
+    try:
+        with span(f"vertex:{profile_name}"):
+            response = requests.post(profile.url(model_id), headers=headers, json=payload, timeout=profile.timeout)
+        status = str(response.status_code)
+        if not response.ok:
+            LOGGER.warning("Vertex %s request failed %s: %s", profile_name, response.status_code, response.text[:240])
+        response.raise_for_status()
+        data = response.json()
+        ok = True
+        return data
+    finally:
+        elapsed = time.perf_counter() - started
+        router.record(profile, model_id, elapsed, ok)
+        observe_upstream(model_id, elapsed, status, data)
@@ -2,13 +2,61 @@ import os
 import base64
 import requests
 import json
-from PIL import Image
 import io
+import hashlib
+import logging
+import time
+from typing import Tuple
+
+from metrics import observe_upstream
+from structured_logging import log_payload
+
+LOGGER = logging.getLogger(__name__)
+
+# Longest side of the person photo sent to the model. Phone photos are often
+# 4000px+; the model gains nothing from that and the base64 payload balloons.
+PERSON_MAX_SIDE = int(os.environ.get("PHOTO_PERSON_MAX_SIDE", "1024"))
+PERSON_JPEG_QUALITY = int(os.environ.get("PHOTO_PERSON_JPEG_QUALITY", "85"))
+# Upper bound on the Vertex call; without it a stalled connection pins a worker forever.
+GENERATION_TIMEOUT = float(os.environ.get("PHOTO_GENERATION_TIMEOUT", "90"))
+
+
+# Using gemini-3-pro-image-preview as requested
+MODEL_ID = "gemini-2.5-flash-image"
+
+# Simplified prompt for speed and clarity
+PROMPT = (
+    "Generate a high-quality, photorealistic image. "
+    "Task: Composite the person from the first image into the environment of the second image. "
+    "The person should be standing naturally in the campus scene shown in the second image. "
+    "Match the lighting, shadows, and color tone of the person to the background. "
+    "Output ONLY the generated image."
+)
+
+# Changes whenever the model or prompt does, so cached generations from an
+# older prompt are not served (see photo_cache.py).
+PROMPT_VERSION = hashlib.sha1(f"{MODEL_ID}\n{PROMPT}".encode("utf-8")).hexdigest()[:8]
+
 
 def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
+
+def prepare_person_image(data: bytes, max_side: int = PERSON_MAX_SIDE, quality: int = PERSON_JPEG_QUALITY) -> bytes:
+    """Decode an uploaded photo, fix EXIF rotation, bound its size and re-encode as JPEG."""
+    from PIL import Image, ImageOps  # imported on first use; the API starts without Pillow
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
 def image_generation_function(
     person_image_path: str,
     campus_background_path: str,
@@ -18,22 +66,45 @@ def image_generation_function(
     location: str = "us-central1"
 ) -> None:
     """
-    Uses Vertex AI (Gemini) to generate a realistic image of the person at the campus.
-    Takes the person's photo and the campus background as inputs.
+    File-based wrapper around `generate_campus_image` kept for scripts:
+    reads both images from disk and writes the generated image to `output_image_path`.
     """
-    
-    print(f"Starting image generation. Project: {project_id}, Location: {location}")
-    
-    # Encode images to base64
     try:
-        person_b64 = encode_image(person_image_path)
-        campus_b64 = encode_image(campus_background_path)
+        with open(person_image_path, "rb") as f:
+            person_bytes = f.read()
+        with open(campus_background_path, "rb") as f:
+            campus_bytes = f.read()
     except Exception as e:
         raise Exception(f"Failed to read input images: {e}")
 
+    campus_b64 = base64.b64encode(campus_bytes).decode('ascii')
+    image_bytes, _ = generate_campus_image(person_bytes, campus_b64, access_token, project_id, location)
+    with open(output_image_path, "wb") as f:
+        f.write(image_bytes)
+    LOGGER.info("Image saved to %s", output_image_path)
+
+
+def generate_campus_image(
+    person_jpeg: bytes,
+    campus_b64: str,
+    access_token: str,
+    project_id: str = "sigma-night-477219-g4",
+    location: str = "us-central1",
+    timeout: float = GENERATION_TIMEOUT,
+) -> Tuple[bytes, str]:
+    """
+    Uses Vertex AI (Gemini) to generate a realistic image of the person at the campus.
+    Takes the person's photo as JPEG bytes and the campus background already
+    base64-encoded (see campus_backgrounds.py) and returns (image bytes, mime
+    type) exactly as the model produced them.
+    """
+    
+    LOGGER.debug("Starting image generation", extra={"project_id": project_id, "location": location})
+    
+    person_b64 = base64.b64encode(person_jpeg).decode('ascii')
+
     # Vertex AI Endpoint
-    # Using gemini-3-pro-image-preview as requested
-    model_id = "gemini-2.5-flash-image"
+    model_id = MODEL_ID
     
     # Handle global vs regional endpoints correctly
     if location == "global":
@@ -48,14 +119,7 @@ def image_generation_function(
         "Content-Type": "application/json"
     }
 
-    # Simplified prompt for speed and clarity
-    prompt = (
-        "Generate a high-quality, photorealistic image. "
-        "Task: Composite the person from the first image into the environment of the second image. "
-        "The person should be standing naturally in the campus scene shown in the second image. "
-        "Match the lighting, shadows, and color tone of the person to the background. "
-        "Output ONLY the generated image."
-    )
+    prompt = PROMPT
 
     payload = {
         "contents": [{
@@ -85,15 +149,23 @@ def image_generation_function(
         }
     }
 
-    print(f"Sending request to {url}")
-    response = requests.post(url, headers=headers, json=payload)
+    LOGGER.debug("Sending image generation request", extra={"model": model_id})
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, headers=headers, json=payload, timeout=timeout)
+    except requests.RequestException:
+        observe_upstream(model_id, time.perf_counter() - started, "error")
+        raise
+    elapsed = time.perf_counter() - started
     
     if not response.ok:
-        print(f"API Error: {response.status_code} - {response.text}")
+        observe_upstream(model_id, elapsed, str(response.status_code))
+        LOGGER.error("Vertex image API error %s: %s", response.status_code, response.text[:500])
         raise Exception(f"Vertex AI API Error {response.status_code}: {response.text}")
 
     try:
         result = response.json()
+        observe_upstream(model_id, elapsed, str(response.status_code), result)
         
         # Check for safety blocking or refusal
         candidates = result.get("candidates", [])
@@ -108,40 +180,38 @@ def image_generation_function(
         finish_reason = candidate.get("finishReason")
         
         if finish_reason != "STOP":
-            print(f"Warning: Finish reason is {finish_reason}")
             safety_ratings = candidate.get("safetyRatings", [])
-            print(f"Safety Ratings: {json.dumps(safety_ratings)}")
+            LOGGER.warning("Image generation finish reason is %s", finish_reason, extra={"safety_ratings": safety_ratings})
             
             if finish_reason in ["SAFETY", "BLOCKLIST", "PROHIBITED_CONTENT"]:
                 raise Exception(f"Generation blocked due to safety: {finish_reason}. Ratings: {json.dumps(safety_ratings)}")
 
         parts = candidate.get("content", {}).get("parts", [])
         image_data = None
+        mime_type = "image/png"
         text_output = []
         
         for part in parts:
             # Check for inline_data (snake_case) or inlineData (camelCase)
-            if "inline_data" in part:
-                image_data = part["inline_data"]["data"]
-            elif "inlineData" in part:
-                image_data = part["inlineData"]["data"]
+            inline = part.get("inline_data") or part.get("inlineData")
+            if inline:
+                image_data = inline["data"]
+                mime_type = inline.get("mime_type") or inline.get("mimeType") or mime_type
             
             if "text" in part:
                 text_output.append(part["text"])
         
         if image_data:
-            img_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(img_bytes))
-            image.save(output_image_path)
-            print(f"Success! Image saved to {output_image_path}")
+            # Returned as-is: no PIL decode/re-encode round trip.
+            return base64.b64decode(image_data), mime_type
         else:
             error_msg = "No image data found in response."
             if text_output:
                 error_msg += f" Model returned text instead: {' '.join(text_output)}"
-            print(error_msg)
-            print(f"Full Response: {json.dumps(result)}")
+            LOGGER.warning(error_msg)
+            log_payload(LOGGER, "Image generation response without image", result)
             raise Exception(error_msg)
             
     except Exception as e:
-        print(f"Error processing response: {e}")
+        LOGGER.error("Error processing image generation response: %s", e)
         raise
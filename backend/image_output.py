@@ -0,0 +1,81 @@
+"""
+Output encoding for generated campus photos.
+
+The image model returns a full-size PNG, which is heavy for students on
+phones. `negotiate_format()` picks the smallest format the client's `Accept`
+header allows: AVIF, then WebP (when this Pillow build can write them), and
+otherwise progressive JPEG, which every browser can show while it loads.
+
+`encode_variant()` produces either the full image or a small `preview`
+(`PREVIEW_MAX_SIDE` px) that can be shown right away while the full image is
+fetched. Encoding is CPU-bound; callers run it on `executors.CPU_POOL`.
+"""
+from __future__ import annotations
+
+import io
+import os
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from response_encoding import parse_q_values
+
+
+PREVIEW_MAX_SIDE = int(os.environ.get("PHOTO_PREVIEW_MAX_SIDE", "320"))
+FULL_MAX_SIDE = int(os.environ.get("PHOTO_FULL_MAX_SIDE", "0"))  # 0 = keep model resolution
+
+# format -> (mime type, Pillow save options) for the full image
+_FORMATS: Dict[str, Tuple[str, dict]] = {
+    "avif": ("image/avif", {"format": "AVIF", "quality": 55, "speed": 8}),
+    "webp": ("image/webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "jpeg": ("image/jpeg", {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}),
+}
+# Lower quality is fine for a thumbnail-sized preview.
+_PREVIEW_QUALITY = {"avif": 40, "webp": 60, "jpeg": 60}
+# Most-compact first.
+_PREFERENCE = ("avif", "webp", "jpeg")
+VARIANTS = ("full", "preview")
+
+
+def _supported(fmt: str) -> bool:
+    if fmt == "jpeg":
+        return True
+    from PIL import features
+
+    try:
+        return bool(features.check(fmt))
+    except ValueError:  # unknown feature name in older Pillow
+        return False
+
+
+@lru_cache(maxsize=None)
+def supported_formats() -> Tuple[str, ...]:
+    # Probed on first use so importing this module does not load Pillow.
+    return tuple(fmt for fmt in _PREFERENCE if _supported(fmt))
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Most compact supported format the client explicitly accepts; JPEG otherwise."""
+    accepted = parse_q_values(accept)
+    for fmt in supported_formats():
+        mime = _FORMATS[fmt][0]
+        if accepted.get(mime, 0.0) > 0:
+            return fmt
+    return "jpeg"
+
+
+def encode_variant(image_bytes: bytes, fmt: str, variant: str = "full") -> Tuple[bytes, str]:
+    """Re-encode the generated image as `fmt`; `variant="preview"` also downsizes it."""
+    from PIL import Image
+
+    mime, options = _FORMATS[fmt]
+    options = dict(options)
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = image.convert("RGB")
+        if variant == "preview":
+            image.thumbnail((PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE), Image.LANCZOS)
+            options["quality"] = _PREVIEW_QUALITY[fmt]
+        elif FULL_MAX_SIDE:
+            image.thumbnail((FULL_MAX_SIDE, FULL_MAX_SIDE), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, **options)
+    return out.getvalue(), mime
@@ -1,24 +1,90 @@
 import os
+import asyncio
+import base64
+import binascii
+import hashlib
 import json
+import logging
 import re
-import requests
-from typing import Optional, Any
-from fastapi import FastAPI, HTTPException, Response, File, UploadFile
-from fastapi.responses import FileResponse
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from functools import partial
+from typing import Optional, Any, AsyncIterator, List
+from warmup import Warmup  # before the heavy imports: starts the cold-start clock
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, File, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.formparsers import MultiPartException, MultiPartParser
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request as GoogleRequest
 from google.oauth2 import service_account
-import shutil
-from image_generation import image_generation_function
-
-from campus_selector import generate_map_insights, recommend_majors_via_ai
-from chat_to_voice_attachment import transcribe_audio, SpeechToTextError
+from image_generation import PROMPT_VERSION, generate_campus_image, prepare_person_image
+from image_output import VARIANTS, encode_variant, negotiate_format
+
+from campus_backgrounds import BACKGROUNDS, CAMPUS_BACKGROUNDS, DEFAULT_CAMPUS
+from campus_selector import (
+    build_catalog_snapshot,
+    build_map_insights,
+    catalog_snapshot_is_stale,
+    get_catalog_snapshot,
+    install_catalog_snapshot,
+    recommend_majors_via_ai,
+)
+from audio_preprocessing import PreprocessOptions, pcm_duration, preprocess_audio
+from chat_to_voice_attachment import SpeechToTextConfig, SpeechToTextError, transcribe_audio
+from chunked_transcription import shutdown as shutdown_chunk_pool, transcribe_chunked
+from chat_sessions import ChatSessionStore, build_session_prompt_lines
+from executors import CPU_POOL, HEAVY_POOL, executor_stats
+from generation_profiles import PROFILES, ROUTER, generate_content
+from metrics import REGISTRY, MetricsMiddleware, count_fallback, family
+from request_profiler import PROFILE_HEADER, PROFILER, ProfilingMiddleware, profiling_enabled, token_matches
+from course_catalog import course_catalog_is_stale, get_course_catalog, install_course_catalog, load_course_catalog
+from freshman_courses import (
+    build_campus_freshman_courses,
+    freshman_course_index_is_stale,
+    freshman_sources_version,
+    get_freshman_course_index,
+    install_freshman_course_index,
+    merge_freshman_courses,
+    pathway_campuses,
+)
+from pathways import EDGE_MODES, build_path, columnar_nodes, load_pathways
+from prerequisite_graph import (
+    expression_to_json,
+    get_prerequisite_graph,
+    install_prerequisite_graph,
+    load_prerequisite_graph,
+    prerequisite_graph_is_stale,
+)
+from photo_cache import photo_cache_from_env
+from photo_jobs import DONE, FAILED, JobRejected, PhotoJob, PhotoJobQueue
+from streaming_speech import FakeStreamingRecognizer, RestIncrementalRecognizer
+from transcript_cache import TranscriptCache
+from response_cache import ResponseCache, not_modified, validator_headers
+from response_encoding import FastJSONResponse, fast_json
+from shared_segment import segment_stats
+from structured_logging import (
+    RequestIdMiddleware,
+    configure_logging,
+    log_payload,
+    logging_stats,
+    shutdown_logging,
+)
+from reaction_batcher import (
+    ReactionBatcher,
+    ReactionItem,
+    StubReactionBackend,
+    build_batch_prompt,
+    parse_batch_answers,
+)
 
 # --- 1. SETUP & CONFIGURATION ---
 
 load_dotenv()
+configure_logging()
+LOGGER = logging.getLogger(__name__)
 
 # Safety settings for Gemini API
 PERMISSIVE_SAFETY = [
@@ -44,17 +110,87 @@ try:
         scopes=['https://www.googleapis.com/auth/cloud-platform']
     )
 except Exception as e:
-    print(f"Error loading service account: {e}")
+    LOGGER.error("Error loading service account: %s", e)
+
+# Server-side chat sessions for /api/ask-question
+CHAT_SESSIONS = ChatSessionStore(
+    max_sessions=int(os.environ.get("CHAT_SESSION_MAX", "500")),
+    idle_ttl_seconds=float(os.environ.get("CHAT_SESSION_TTL_SECONDS", "1800")),
+    max_total_bytes=int(os.environ.get("CHAT_SESSION_MAX_BYTES", str(8 * 1024 * 1024))),
+    recent_turns=int(os.environ.get("CHAT_SESSION_RECENT_TURNS", "6")),
+    summary_char_limit=int(os.environ.get("CHAT_SESSION_SUMMARY_CHARS", "1200")),
+)
+
+_token_lock = threading.Lock()
+
 
 def get_access_token():
-    """Get a fresh OAuth2 access token from service account"""
+    """OAuth2 access token from the service account, refreshed only when it is about to expire"""
     if not credentials:
         raise HTTPException(status_code=500, detail="Service account not configured")
-    credentials.refresh(GoogleRequest())
-    return credentials.token
+    with _token_lock:
+        if not credentials.valid:
+            from google.auth.transport.requests import Request as GoogleRequest
+
+            credentials.refresh(GoogleRequest())
+        return credentials.token
+
+
+# --- Startup warm-up ---
+# The catalog snapshot, indexes, pathway files and access token are built
+# before the app reports ready (GET /api/ready), so the first request after a
+# deploy is as fast as any other. WARMUP_ON_STARTUP=0 skips this; everything
+# is then built lazily on first use.
+WARMUP = Warmup()
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") != "0"
+
+
+def _load_all_pathways() -> int:
+    return sum(len(load_pathways(campus) or []) for campus in pathway_campuses())
+
+
+def _warmup_steps() -> dict:
+    steps = {
+        "catalog_snapshot": ensure_catalog_snapshot(),
+        "prerequisite_graph": ensure_prerequisite_graph(),
+        "course_catalog": ensure_course_catalog(),
+        "freshman_courses": ensure_freshman_courses(),
+        "pathways": CPU_POOL.run(_load_all_pathways),
+    }
+    if credentials:
+        steps["access_token"] = CPU_POOL.run(get_access_token)
+    return steps
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()  # no-op unless a previous lifespan stopped the listener
+    background = []
+    if WARMUP_ON_STARTUP:
+        steps = _warmup_steps()
+        WARMUP.begin(list(steps), optional=["campus_backgrounds"])
+        await asyncio.gather(*(WARMUP.step(name, work) for name, work in steps.items()))
+        # Only the photo endpoints need these (and Pillow), so they finish after ready.
+        background.append(asyncio.create_task(
+            WARMUP.step("campus_backgrounds", CPU_POOL.run(BACKGROUNDS.preload))
+        ))
+    else:
+        WARMUP.begin([])
+    WARMUP.mark_ready()
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        PHOTO_JOBS.shutdown()
+        shutdown_chunk_pool()
+        CPU_POOL.shutdown()
+        HEAVY_POOL.shutdown()
+        shutdown_logging()
+
 
 # Initialize the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- 2. CORS MIDDLEWARE ---
 # This is CRITICAL. It allows your React frontend (on a different "origin")
@@ -83,6 +219,11 @@ app.add_middleware(
     allow_methods=["*"], # Allows all methods (GET, POST, etc.)
     allow_headers=["*"], # Allows all headers
 )
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+# Added last, so it is outermost and also times CORS preflights.
+app.add_middleware(MetricsMiddleware)
 
 
 @app.options("/{full_path:path}")
@@ -103,8 +244,11 @@ class PathRequest(BaseModel):
 
 class QuestionRequest(BaseModel):
     question: str
-    context: dict  # AI COMMENT: Contains goal, interests, skills from student
+    context: Optional[dict] = None  # AI COMMENT: Contains goal, interests, skills from student
     conversation_history: Optional[list] = []  # AI COMMENT: Previous chat messages
+    # When set, history and profile live server-side (see chat_sessions.py) and
+    # the client only needs to send `context` when it changes.
+    session_id: Optional[str] = None
 
 class SkillRequest(BaseModel):
     interests: list[str]
@@ -206,6 +350,98 @@ def read_root():
     """A simple 'hello world' endpoint to check if the server is running."""
     return {"message": "AI Backend is running!"}
 
+
+@app.get("/api/ready")
+def readiness():
+    """Warm-up state; 503 until the startup builds have finished."""
+    return JSONResponse(WARMUP.stats(), status_code=200 if WARMUP.ready else 503)
+
+
+@app.get("/api/metrics")
+def runtime_metrics():
+    """Snapshot of model routing decisions and in-process caches/batchers."""
+    return {
+        "routing": ROUTER.snapshot(),
+        "reactionBatching": REACTION_BATCHER.stats(),
+        "chatSessions": CHAT_SESSIONS.stats(),
+        "executors": executor_stats(),
+        "transcriptCache": TRANSCRIPT_CACHE.stats(),
+        "photoCache": PHOTO_CACHE.stats() if PHOTO_CACHE is not None else None,
+        "campusBackgrounds": BACKGROUNDS.stats(),
+        "photoJobs": PHOTO_JOBS.stats(),
+        "prerequisiteGraph": get_prerequisite_graph().stats() if not prerequisite_graph_is_stale() else None,
+        "responseCache": RESPONSE_CACHE.stats(),
+        "freshmanCourses": get_freshman_course_index().stats() if not freshman_course_index_is_stale() else None,
+        "warmup": WARMUP.stats(),
+        "sharedSegments": segment_stats(),
+        "profiler": PROFILER.stats(),
+        "logging": logging_stats(),
+    }
+
+
+# Cache outcome counters each cache already keeps, read only on scrape.
+_CACHE_RESULTS = {
+    "response": ("hits", "not_modified", "misses"),
+    "transcript": ("hits", "coalesced", "misses"),
+    "photo": ("hits", "near_hits", "misses"),
+}
+
+
+def _cache_metrics():
+    caches = {"response": RESPONSE_CACHE.stats(), "transcript": TRANSCRIPT_CACHE.stats()}
+    if PHOTO_CACHE is not None:
+        caches["photo"] = PHOTO_CACHE.stats()
+    lookups = [
+        ({"cache": name, "result": result}, stats[result])
+        for name, stats in caches.items()
+        for result in _CACHE_RESULTS[name]
+    ]
+    ratios = [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()]
+    return [
+        family("cache_lookups_total", "counter", "Cache lookups by outcome.", lookups),
+        family("cache_hit_ratio", "gauge", "Share of cache lookups answered without recomputing.", ratios),
+    ]
+
+
+REGISTRY.register_collector(_cache_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Request, upstream, fallback and cache metrics in Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def _profile_admin(request: Request, profile_id: Optional[str] = None):
+    # 404 rather than 401/403: without the token the endpoints do not exist.
+    if not token_matches(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if profile_id is None:
+        return None
+    profile = PROFILER.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (only the most recent ones are kept)")
+    return profile
+
+
+@app.get("/api/admin/profiles", include_in_schema=False)
+def list_request_profiles(request: Request):
+    """Most recent request profiles, newest first."""
+    _profile_admin(request)
+    return {"profiler": PROFILER.stats(), "profiles": [profile.summary() for profile in PROFILER.recent()]}
+
+
+@app.get("/api/admin/profiles/{profile_id}", include_in_schema=False)
+def get_request_profile(profile_id: str, request: Request):
+    """Span breakdown of one profiled request."""
+    return _profile_admin(request, profile_id).to_dict()
+
+
+@app.get("/api/admin/profiles/{profile_id}/folded", include_in_schema=False)
+def get_request_profile_folded(profile_id: str, request: Request):
+    """Sampled stacks in folded format, for flamegraph.pl / speedscope / inferno."""
+    return PlainTextResponse(_profile_admin(request, profile_id).folded())
+
 # Generate skills
 @app.post("/api/generate-skills")
 async def generate_skills(request: SkillRequest):
@@ -230,42 +466,23 @@ Example valid output:
         token = get_access_token()
         
         # Call Vertex AI Gemini API
-        project_id = "sigma-night-477219-g4"
-        location = "us-central1"
-        model_id = "gemini-2.5-flash-lite"
-        
-        url = f"https://{location}-aiplatform.googleapis.com/v1/projects/{project_id}/locations/{location}/publishers/google/models/{model_id}:generateContent"
-        
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "contents": [{
+        data = generate_content(
+            "generate-skills",
+            token=token,
+            contents=[{
                 "role": "user",
                 "parts": [{"text": prompt}]
             }],
-            "generation_config": {
-                "temperature": 0.5,
-                "maxOutputTokens": 8192,
-                "candidateCount": 1,
-                "topP": 0.95,
-                "topK": 40,
-            },
-            "safetySettings": STANDARD_SAFETY,
-        }
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
+            safety_settings=STANDARD_SAFETY,
+            config_overrides={"candidateCount": 1},
+        )
         candidate = data["candidates"][0]
         raw_text = candidate["content"]["parts"][0]["text"]
         
         # Check if AI refused the request due to safety concerns
         refusal_keywords = ["cannot fulfill", "cannot generate", "cannot create", "violates", "safety principles", "inappropriate", "harmful content", "hate speech"]
         if any(keyword in raw_text.lower() for keyword in refusal_keywords):
+            count_fallback("default_skills", "refusal")
             return {
                 "skills": ["Problem Solving", "Critical Thinking", "Communication", "Teamwork", "Adaptability", "Time Management", "Leadership", "Organization"][:limit],
                 "warning": "⚠️ Unable to generate skills - please choose appropriate interests that don't contain offensive or harmful content."
@@ -278,6 +495,7 @@ Example valid output:
             parsed = json.loads(cleaned)
         except json.JSONDecodeError:
             # If parsing fails, return default skills
+            count_fallback("default_skills", "unparseable")
             return {"skills": ["Problem Solving", "Critical Thinking", "Communication", "Teamwork", "Adaptability"][:limit]}
         
         # Extract skills from the parsed JSON
@@ -286,27 +504,39 @@ Example valid output:
         elif isinstance(parsed, dict) and "skills" in parsed:
             skills = parsed["skills"]  # AI returned {"skills": [...]}
         else:
+            count_fallback("default_skills", "bad_shape")
             return {"skills": ["Problem Solving", "Critical Thinking", "Communication"][:limit]}
 
         # Clean up the skills and return
         skills = [skill.strip() for skill in skills if isinstance(skill, str) and skill.strip()]
         if not skills:
+            count_fallback("default_skills", "empty")
             return {"skills": ["Problem Solving", "Critical Thinking", "Communication"][:limit]}
         return {"skills": skills[:limit]}
 
     except HTTPException:
         raise
     except Exception as err:
-        print(f"Skills generation error: {err}")
+        LOGGER.warning("Skills generation error: %s", err)
+        count_fallback("default_skills", "error")
         return {"skills": ["Problem Solving", "Critical Thinking", "Communication", "Teamwork", "Adaptability"][:limit]}
 
 
+async def ensure_catalog_snapshot() -> None:
+    """Rebuild the campus catalog snapshot in the process pool when sources changed."""
+    if await CPU_POOL.run(catalog_snapshot_is_stale):
+        install_catalog_snapshot(await HEAVY_POOL.run(build_catalog_snapshot))
+
+
 @app.post("/api/recommend-majors")
 async def recommend_majors(request: MajorSuggestionRequest):
     """Use Vertex AI to suggest majors based on why-uh answer, interests, and skills."""
 
+    await ensure_catalog_snapshot()
     token_fetcher = get_access_token if credentials else None
-    return recommend_majors_via_ai(
+    # Mostly waiting on Vertex, so this goes to the default I/O thread pool.
+    return await asyncio.to_thread(
+        recommend_majors_via_ai,
         why_uh=request.why_uh,
         interests=request.interests,
         skills=request.skills,
@@ -315,12 +545,27 @@ async def recommend_majors(request: MajorSuggestionRequest):
     )
 
 
+# Deterministic responses (see response_cache.py): generate-path, and the
+# campus-matching half of map-insights once the majors are known.
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX", "512")),
+    max_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
+PATH_CACHE_CONTROL = os.environ.get("PATH_CACHE_CONTROL", "public, max-age=300")
+
+
+def _strip_all(values) -> list:
+    return [value.strip() if isinstance(value, str) else value for value in (values or [])]
+
+
 @app.post("/api/map-insights")
-async def map_insights(request: MapInsightsRequest):
+async def map_insights(request: MapInsightsRequest, http_request: Request):
     """Generate majors and campus matches for the map panel."""
 
+    await ensure_catalog_snapshot()
     token_fetcher = get_access_token if credentials else None
-    return generate_map_insights(
+    majors_result = await asyncio.to_thread(
+        recommend_majors_via_ai,
         why_uh=request.why_uh,
         interests=request.interests,
         skills=request.skills,
@@ -328,104 +573,260 @@ async def map_insights(request: MapInsightsRequest):
         token_fetcher=token_fetcher,
     )
 
+    async def produce():
+        # Campus matching (difflib over every catalog) is CPU-bound.
+        return await CPU_POOL.run(
+            build_map_insights,
+            majors_result,
+            why_uh=request.why_uh,
+            interests=request.interests,
+            skills=request.skills,
+            top_n=request.top_n,
+        )
+
+    return await RESPONSE_CACHE.respond(
+        http_request,
+        route="map-insights",
+        payload={
+            "majors": majors_result,
+            "why_uh": (request.why_uh or "").strip(),
+            "interests": _strip_all(request.interests),
+            "skills": _strip_all(request.skills),
+            "top_n": request.top_n,
+        },
+        version=get_catalog_snapshot().version,
+        produce=produce,
+        # Built from the student's own answers: never in shared caches.
+        cache_control="private, no-cache",
+    )
+
 
 class PathGenerationRequest(BaseModel):
     major: str
     campus: Optional[str] = "manoa"
+    # "prerequisites" (real prerequisite edges) or "sequential" (semester order)
+    edge_mode: Optional[str] = "prerequisites"
+    # Add a "cards" map (code -> CourseCard) for the path's courses.
+    include_cards: Optional[bool] = False
+    # "objects" (a list of node dicts) or "columnar" (one array per field)
+    node_format: Optional[str] = "objects"
+
+async def _generate_path(request: PathGenerationRequest, http_request: Request) -> Response:
+    edge_mode = request.edge_mode if request.edge_mode in EDGE_MODES else "prerequisites"
+    campus = (request.campus or "manoa").strip().lower()
+    node_format = "columnar" if request.node_format == "columnar" else "objects"
+
+    async def produce():
+        try:
+            if edge_mode == "prerequisites":
+                await ensure_prerequisite_graph()
+            result = await CPU_POOL.run(build_path, request.major, campus, edge_mode)
+            if request.include_cards and result.get("path"):
+                await ensure_course_catalog()
+                names = [node["name"] for node in result["path"]]
+                result["cards"], _ = get_course_catalog().cards(campus, names)
+            if node_format == "columnar":
+                result["path"] = columnar_nodes(result["path"])
+            return result
+        except Exception as e:
+            LOGGER.exception("Error generating path")
+            return {"path": [], "edges": [], "error": str(e)}
+
+    # The snapshot version covers the pathway and course files the path is built from.
+    await ensure_catalog_snapshot()
+    return await RESPONSE_CACHE.respond(
+        http_request,
+        route="generate-path",
+        payload={
+            "major": " ".join(request.major.lower().split()),
+            "campus": campus,
+            "edge_mode": edge_mode,
+            "include_cards": bool(request.include_cards),
+            "node_format": node_format,
+        },
+        version=get_catalog_snapshot().version,
+        produce=produce,
+        cache_control=PATH_CACHE_CONTROL,
+    )
+
+
+@app.get("/api/generate-path")
+async def generate_path_get(http_request: Request, request: PathGenerationRequest = Depends()):
+    """Same as POST /api/generate-path with query parameters, so browsers can cache and revalidate it."""
+    return await _generate_path(request, http_request)
+
 
 @app.post("/api/generate-path")
-async def generate_path(request: PathGenerationRequest):
+async def generate_path(request: PathGenerationRequest, http_request: Request):
     """Generate a degree pathway from JSON files based on major and campus."""
-    
+    return await _generate_path(request, http_request)
+
+
+async def ensure_prerequisite_graph() -> None:
+    """Rebuild the prerequisite graph in the process pool when the course files changed."""
+    if await CPU_POOL.run(prerequisite_graph_is_stale):
+        install_prerequisite_graph(await HEAVY_POOL.run(load_prerequisite_graph))
+
+
+def _course_ref(graph, node) -> dict:
+    campus, code = node
+    return {"campus": campus or None, "code": code, "title": graph.titles.get(node, ""), "level": graph.level.get(node, 0)}
+
+
+async def _prerequisite_node(campus: str, code: str):
+    await ensure_prerequisite_graph()
+    graph = get_prerequisite_graph()
+    node = graph.resolve(campus.lower(), code)
+    if node is None:
+        raise HTTPException(status_code=404, detail=f"Unknown course: {code}")
+    return graph, node
+
+
+@app.get("/api/prerequisites/{campus}/{code}")
+async def course_prerequisites(request: Request, campus: str, code: str):
+    """What a course requires and what it unlocks, directly and transitively."""
+    graph, node = await _prerequisite_node(campus, code)
+    # unlocks_all of an intro course lists hundreds of courses: encode and compress.
+    return fast_json(request, {
+        "course": _course_ref(graph, node),
+        "expression": expression_to_json(graph.expressions.get(node)),
+        "waivable": node in graph.waivable,
+        "requires": [_course_ref(graph, n) for n in graph.sort_nodes(graph.requires.get(node, ()))],
+        "requires_all": [_course_ref(graph, n) for n in graph.sort_nodes(graph.requires_all.get(node, ()))],
+        "unlocks": [_course_ref(graph, n) for n in graph.sort_nodes(graph.unlocks.get(node, ()))],
+        "unlocks_all": [_course_ref(graph, n) for n in graph.sort_nodes(graph.unlocks_all.get(node, ()))],
+    })
+
+
+@app.get("/api/prerequisites/{campus}/{code}/chain", response_class=FastJSONResponse)
+async def course_prerequisite_chain(campus: str, code: str):
+    """Shortest chain of courses to take before `code`, in a valid order."""
+    graph, node = await _prerequisite_node(campus, code)
+    chain = graph.chain(node)
+    return {
+        "course": _course_ref(graph, node),
+        "chain": [_course_ref(graph, n) for n in chain],
+        "length": len(chain),
+    }
+
+
+async def ensure_course_catalog() -> None:
+    """Reload the course catalog in the process pool when the course files changed."""
+    if await CPU_POOL.run(course_catalog_is_stale):
+        install_course_catalog(await HEAVY_POOL.run(load_course_catalog))
+
+
+MAX_COURSE_CARDS = 300
+
+
+class CourseCardsRequest(BaseModel):
+    codes: List[str]
+    campus: Optional[str] = "manoa"
+
+
+async def _course_cards(request: Request, codes: List[str], campus: Optional[str]) -> Response:
+    if len(codes) > MAX_COURSE_CARDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_COURSE_CARDS} course codes per request")
+    await ensure_course_catalog()
+    catalog = get_course_catalog()
+    campus_key = (campus or "manoa").strip().lower()
+    # The answer depends only on the catalog version and the set of codes.
+    requested = sorted({code.strip() for code in codes if code.strip()})
+    digest = hashlib.sha1(f"{campus_key}|{'|'.join(requested)}".encode("utf-8")).hexdigest()[:16]
+    etag = f'"{catalog.version}-{digest}"'
+    headers = validator_headers(request, etag, "public, max-age=300")
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    cards, missing = catalog.cards(campus_key, requested)
+    return fast_json(request, {"version": catalog.version, "cards": cards, "missing": missing}, headers=headers)
+
+
+@app.get("/api/course-cards")
+async def course_cards(request: Request, codes: str = "", campus: Optional[str] = "manoa"):
+    """CourseCard records for comma-separated course codes (e.g. "ICS 111,CINE 255 (DH)")."""
+    return await _course_cards(request, codes.split(","), campus)
+
+
+@app.post("/api/course-cards")
+async def course_cards_batch(request: Request, body: CourseCardsRequest):
+    """Same as GET /api/course-cards, for batches too long for a URL."""
+    return await _course_cards(request, body.codes, body.campus)
+
+
+async def ensure_freshman_courses() -> None:
+    """Recompute freshman picks, one process-pool task per pathway file, when sources changed."""
+    if not await CPU_POOL.run(freshman_course_index_is_stale):
+        return
+    started = time.perf_counter()
+    version = await CPU_POOL.run(freshman_sources_version)
+    campuses = await CPU_POOL.run(pathway_campuses)
+    results = await asyncio.gather(*(HEAVY_POOL.run(build_campus_freshman_courses, campus) for campus in campuses))
+    install_freshman_course_index(
+        merge_freshman_courses(version, dict(zip(campuses, results)), time.perf_counter() - started)
+    )
+
+
+@app.get("/api/freshman-courses", response_class=FastJSONResponse)
+async def freshman_courses(program: Optional[str] = None, campus: str = "manoa"):
+    """Top freshman-year courses for a program, or the program list when none is given."""
+    await ensure_freshman_courses()
+    index = get_freshman_course_index()
+    if not program:
+        return {"campus": campus.lower(), "programs": index.program_names(campus)}
+    entry = index.get(campus, program)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No pathway found for program: {program}")
+    return entry
+
+
+# Keala reactions are tiny (one sentence), so they are micro-batched: requests
+# that arrive within a few ms share one Vertex call (see reaction_batcher.py).
+def _vertex_reaction_backend(items: list[ReactionItem]) -> dict[int, str]:
+    """Answer a batch of reaction items with one Vertex call (profile "nathan-reaction")."""
+    token = get_access_token()
+    per_item = PROFILES["nathan-reaction"].max_output_tokens
+    data = generate_content(
+        "nathan-reaction",
+        token=token,
+        contents=[{"role": "user", "parts": [{"text": build_batch_prompt(items)}]}],
+        safety_settings=PERMISSIVE_SAFETY,
+        # Tight budget: one sentence per item plus JSON overhead.
+        config_overrides={"maxOutputTokens": per_item * len(items) + 32},
+    )
+
+    candidate = data.get("candidates", [{}])[0]
+    finish_reason = candidate.get("finishReason", "UNKNOWN")
+    raw_text = candidate.get("content", {}).get("parts", [{}])[0].get("text", "").strip()
+    LOGGER.debug(
+        "Keala reaction batch answered",
+        extra={"batch_size": len(items), "finish_reason": finish_reason, "text_length": len(raw_text)},
+    )
+    log_payload(LOGGER, "Keala reaction batch raw response", raw_text, finish_reason=finish_reason)
+    if finish_reason in ["SAFETY", "RECITATION", "OTHER"] or not raw_text:
+        return {}
+
     try:
-        campus_lower = (request.campus or "manoa").lower()
-        major_normalized = re.sub(r'[^a-z0-9]+', '', request.major.lower())
-        
-        pathway_file = os.path.join(os.path.dirname(__file__), "..", "UH-courses", f"{campus_lower}_degree_pathways.json")
-        
-        if not os.path.exists(pathway_file):
-            return {"path": [], "edges": [], "error": f"Pathway file not found for campus: {campus_lower}"}
-        
-        with open(pathway_file, 'r', encoding='utf-8') as f:
-            pathways = json.load(f)
-        
-        matching_program = None
-        best_match_score = 0
-        
-        for program in pathways:
-            program_name = program.get("program_name", "")
-            program_name_normalized = re.sub(r'[^a-z0-9]+', '', program_name.lower())
-            
-            if major_normalized in program_name_normalized:
-                match_score = len(major_normalized)
-                if match_score > best_match_score:
-                    best_match_score = match_score
-                    matching_program = program
-            elif program_name_normalized in major_normalized:
-                match_score = len(program_name_normalized)
-                if match_score > best_match_score:
-                    best_match_score = match_score
-                    matching_program = program
-        
-        if not matching_program:
-            return {"path": [], "edges": [], "error": f"No pathway found for major: {request.major}"}
-        
-        nodes = []
-        edges = []
-        node_id_counter = 0
-        previous_node_id = None
-        
-        years = matching_program.get("years", [])
-        for year_idx, year in enumerate(years):
-            semesters = year.get("semesters", [])
-            for sem_idx, semester in enumerate(semesters):
-                courses = semester.get("courses", [])
-                for course_idx, course in enumerate(courses):
-                    course_name = course.get("name", f"Course {node_id_counter}")
-                    course_credits = course.get("credits", 3)
-                    
-                    node_id = f"node-{node_id_counter}"
-                    node_id_counter += 1
-                    
-                    nodes.append({
-                        "id": node_id,
-                        "name": course_name,
-                        "credits": course_credits,
-                        "semester": semester.get("semester_name", "Semester"),
-                        "year": year.get("year_number", year_idx + 1),
-                        "position": {
-                            "x": sem_idx * 260,
-                            "y": year_idx * 280 + course_idx * 110
-                        }
-                    })
-                    
-                    if previous_node_id:
-                        edges.append({
-                            "id": f"{previous_node_id}-{node_id}",
-                            "source": previous_node_id,
-                            "target": node_id
-                        })
-                    
-                    previous_node_id = node_id
-        
-        return {
-            "path": nodes,
-            "edges": edges,
-            "program_name": matching_program.get("program_name", ""),
-            "total_credits": matching_program.get("total_credits", 0)
-        }
-        
-    except Exception as e:
-        print(f"Error generating path: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"path": [], "edges": [], "error": str(e)}
+        parsed = json.loads(_strip_code_fences(raw_text))
+    except json.JSONDecodeError:
+        return {}
+    answers = parse_batch_answers(parsed, len(items))
+    return {idx: _normalize_quotes(text) for idx, text in answers.items()}
+
+
+# KEALA_REACTION_BACKEND=stub answers locally (tests / offline demos).
+REACTION_BACKEND_MODE = os.environ.get("KEALA_REACTION_BACKEND", "vertex").strip().lower()
+REACTION_BATCHER = ReactionBatcher(
+    StubReactionBackend() if REACTION_BACKEND_MODE == "stub" else _vertex_reaction_backend,
+    window_ms=float(os.environ.get("KEALA_BATCH_WINDOW_MS", "10")),
+    max_wait_ms=float(os.environ.get("KEALA_BATCH_MAX_WAIT_MS", "40")),
+    max_batch=int(os.environ.get("KEALA_BATCH_MAX", "16")),
+)
 
 
 # Nathan-specific reaction endpoint
 @app.post("/api/nathan-reaction")
 async def nathan_reaction(request: ReactionRequest):
-    if not credentials:
+    if not credentials and REACTION_BACKEND_MODE != "stub":
         raise HTTPException(status_code=500, detail="Service account not configured")
 
     latest_section = request.latestSection or "latest response"
@@ -435,96 +836,44 @@ async def nathan_reaction(request: ReactionRequest):
         answers_snapshot = f"{answers_snapshot[:600]}..."
 
     next_section = request.nextSectionLabel or request.nextSection
-    guidance = (
-        f" Close with a quick nudge toward the {next_section} section."
-        if next_section else ""
-    )
 
     fallback_reaction = _contextual_fallback(request.latestSection, request.latestAnswer, next_section)
 
-    prompt_parts = [
-        "You are Keala, a friendly University of Hawaii guide.",
-        f"The student just updated the {latest_section} section with: {latest_answer}",
-        f"Other responses so far: {answers_snapshot}",
-        "Respond with ONE crisp sentence between 12 and 20 words (no emojis).",
-        "Cite up to two concrete ideas from the latest answer (summarize lists instead of copying them) and keep it encouraging, specific, and conversational.",
-    ]
-    if guidance:
-        prompt_parts.append(guidance.strip())
-    prompt = " ".join(prompt_parts)
-
-    try:
-        token = get_access_token()
-        project_id = "sigma-night-477219-g4"
-        location = "us-central1"
-        model_id = "gemini-2.5-flash-lite"
-        url = f"https://{location}-aiplatform.googleapis.com/v1/projects/{project_id}/locations/{location}/publishers/google/models/{model_id}:generateContent"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-            "generation_config": {
-                "temperature": 0.8,
-                "maxOutputTokens": 8192,
-                "topP": 0.95,
-                "topK": 40,
-            },
-            "safetySettings": PERMISSIVE_SAFETY,
-        }
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        
-        candidate = data.get("candidates", [{}])[0]
-        finish_reason = candidate.get("finishReason", "UNKNOWN")
-        raw_text = candidate.get("content", {}).get("parts", [{}])[0].get("text", "").strip()
-        
-        # Temporary debug to find the issue
-        print(f"DEBUG Keala - finish_reason: {finish_reason}, text_length: {len(raw_text)}, text: '{raw_text}'")
-        
-        if finish_reason in ["SAFETY", "RECITATION", "OTHER"] or not raw_text or len(raw_text) < 5:
-            return {"reaction": fallback_reaction or NATHAN_REACTION_FALLBACK}
-        
-        return {"reaction": _normalize_quotes(raw_text.strip())}
-    except Exception as err:
-        print(f"Keala reaction error: {err}")
+    reaction = await REACTION_BATCHER.submit(
+        ReactionItem(
+            latest_section=latest_section,
+            latest_answer=latest_answer,
+            answers_snapshot=answers_snapshot,
+            next_section=next_section,
+        )
+    )
+    if not reaction:
+        count_fallback("contextual_reaction", "contextual" if fallback_reaction else "generic")
         return {"reaction": fallback_reaction or NATHAN_REACTION_FALLBACK}
+    return {"reaction": reaction}
 
 
-# Simple chatbot endpoint - answers questions about career path
-@app.post("/api/ask-question")
-async def ask_question(request: QuestionRequest):
-    """Simple chatbot that answers career-related questions using student context."""
-    
-    BOT_NAME = "Keala"
+def _legacy_context_lines(request: QuestionRequest, bot_name: str) -> list[str]:
+    """Prompt context for clients that still send the full transcript each turn."""
+    context = request.context or {}
 
     # Get student info
-    goal = request.context.get('goal', 'Not provided')
-    interests = request.context.get('interests', [])
-    skills = request.context.get('skills', [])
+    goal = context.get('goal', 'Not provided')
+    interests = context.get('interests', [])
+    skills = context.get('skills', [])
     
     # Get selected campus and major from context
-    selected_campus = request.context.get('selectedCampus', 'Not yet selected')
-    selected_major = request.context.get('selectedMajor', 'Not yet selected')
-    
-    # Get map insights if available
-    map_insights = request.context.get('mapInsights', {})
-    recommended_campuses = map_insights.get('campuses', [])
-    recommended_majors = map_insights.get('majors', [])
+    selected_campus = context.get('selectedCampus', 'Not yet selected')
+    selected_major = context.get('selectedMajor', 'Not yet selected')
 
     # Build conversation history text (if there are previous messages)
     history_text = ""
     if request.conversation_history:
         for msg in request.conversation_history[:-1]:  # Don't include current question
-            who = "Student" if msg['role'] == 'user' else BOT_NAME
+            who = "Student" if msg['role'] == 'user' else bot_name
             history_text += f"{who}: {msg['text']}\n"
 
-    # Build the prompt with student info and conversation history
-    prompt_lines = [
-        f"You are {BOT_NAME}, a friendly and personal career advisor for University of Hawaii students. Be warm, supportive, and personal in your responses. Do not introduce yourself as '{BOT_NAME}' in every message.",
-        "",
+    return [
         f"Student on why they want to go to the UH system: {goal}",
         f"Student Interests: {', '.join(interests) if interests else 'None yet'}",
         f"Student Skills: {', '.join(skills) if skills else 'None yet'}",
@@ -533,6 +882,32 @@ async def ask_question(request: QuestionRequest):
         "",
         "Previous conversation:",
         history_text if history_text else "(This is the first message)",
+    ]
+
+
+# Simple chatbot endpoint - answers questions about career path
+@app.post("/api/ask-question")
+async def ask_question(request: QuestionRequest):
+    """Simple chatbot that answers career-related questions using student context."""
+    
+    BOT_NAME = "Keala"
+
+    session = None
+    if request.session_id is not None:
+        # Session mode: profile and history are kept server-side, so the prompt
+        # stays the same size however long the chat runs.
+        session = CHAT_SESSIONS.get_or_create(request.session_id)
+        if request.context is not None:
+            CHAT_SESSIONS.update_profile(session, request.context)
+        context_lines = build_session_prompt_lines(session, bot_name=BOT_NAME)
+    else:
+        context_lines = _legacy_context_lines(request, BOT_NAME)
+
+    # Build the prompt with student info and conversation history
+    prompt_lines = [
+        f"You are {BOT_NAME}, a friendly and personal career advisor for University of Hawaii students. Be warm, supportive, and personal in your responses. Do not introduce yourself as '{BOT_NAME}' in every message.",
+        "",
+        *context_lines,
         "",
         f"Student Question: {request.question}",
         "",
@@ -546,133 +921,511 @@ async def ask_question(request: QuestionRequest):
     try:
         # Get token and call Gemini
         token = get_access_token()
-        project_id = "sigma-night-477219-g4"
-        location = "us-central1"
-        model_id = "gemini-2.5-flash"  
-        
-        url = f"https://{location}-aiplatform.googleapis.com/v1/projects/{project_id}/locations/{location}/publishers/google/models/{model_id}:generateContent"
-        
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-            "generation_config": {
-                "temperature": 0.8,
-                "maxOutputTokens": 8192,
-                "topP": 0.95,
-                "topK": 40,
-            },
-            "safetySettings": STANDARD_SAFETY,
-        }
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        answer_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
-        
-        return {"answer": answer_text}
+        data = generate_content(
+            "ask-question",
+            token=token,
+            contents=[{"role": "user", "parts": [{"text": prompt}]}],
+            safety_settings=STANDARD_SAFETY,
+        )
+        # A blocked or truncated candidate can come back without any parts.
+        candidate = (data.get("candidates") or [{}])[0]
+        finish_reason = candidate.get("finishReason", "UNKNOWN")
+        parts = candidate.get("content", {}).get("parts") or []
+        answer_text = "".join(part.get("text", "") for part in parts if not part.get("thought")).strip()
+        if not answer_text:
+            LOGGER.warning("Empty answer from AI (finishReason %s)", finish_reason)
+            return _ask_question_fallback(session, "empty")
+
+        if session is None:
+            return {"answer": answer_text}
+        CHAT_SESSIONS.append_turn(session, "user", request.question)
+        CHAT_SESSIONS.append_turn(session, "assistant", answer_text)
+        return {"answer": answer_text, "session_id": session.session_id, "profile": bool(session.profile)}
         
     except Exception as e:
-        print(f"Error calling AI: {e}")
-        return {"answer": "Sorry, I couldn't process your question right now. Please try again!"}
+        LOGGER.warning("Error calling AI: %s", e)
+        return _ask_question_fallback(session, "error")
 
 
-# endpoint for major:
-@app.post("/api/speech-to-text")
-async def speech_to_text(request: AudioTranscriptionRequest):
-    """Convert audio (speech) to text using Google Speech-to-Text.
+def _ask_question_fallback(session, reason: str) -> dict:
+    count_fallback("ask_question", reason)
+    fallback = {"answer": "Sorry, I couldn't process your question right now. Please try again!"}
+    if session is not None:
+        fallback.update({"session_id": session.session_id, "profile": bool(session.profile)})
+    return fallback
+
+
+# Google's synchronous recognize API rejects inline audio above ~10 MB.
+MAX_AUDIO_UPLOAD_BYTES = int(os.environ.get("MAX_AUDIO_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+_AUDIO_READ_CHUNK = 64 * 1024
+# Boundaries, part headers and the small form fields around the audio.
+_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+# Local clean-up (mono, resample, silence trim) before upload; see audio_preprocessing.py.
+SPEECH_PREPROCESS = os.environ.get("SPEECH_PREPROCESS", "1") != "0"
+SPEECH_PREPROCESS_OPTIONS = PreprocessOptions(
+    target_sample_rate=int(os.environ.get("SPEECH_TARGET_SAMPLE_RATE", "16000")),
+    flac=os.environ.get("SPEECH_FLAC", "0") == "1",
+)
+# Clips longer than this (after trimming) use chunked parallel recognition.
+SPEECH_CHUNK_THRESHOLD_S = float(os.environ.get("SPEECH_CHUNK_THRESHOLD_S", "45"))
+
+# Byte-identical retries are answered from memory; see transcript_cache.py.
+TRANSCRIPT_CACHE = TranscriptCache(
+    max_entries=int(os.environ.get("TRANSCRIPT_CACHE_MAX", "256")),
+    max_bytes=int(os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", str(2 * 1024 * 1024))),
+    ttl_seconds=float(os.environ.get("TRANSCRIPT_CACHE_TTL_SECONDS", "3600")),
+)
+cached_transcribe_audio = TRANSCRIPT_CACHE.wrap(transcribe_audio)
 
-    Request JSON: { "audio_base64": "<base64 audio>", "encoding": "LINEAR16", "sample_rate": 16000 }
-    Response: { "transcript": "...", "confidence": 0.95 }
-    """
-    audio_base64 = request.audio_base64
-    if not audio_base64:
-        raise HTTPException(status_code=400, detail="Missing 'audio_base64' field")
 
+def _lazy_access_token():
+    """Token getter that refreshes at most once, and only if a cache miss needs it."""
+    token = None
+
+    def fetch() -> str:
+        nonlocal token
+        if token is None:
+            token = get_access_token()
+        return token
+
+    return fetch
+
+
+async def _transcribe_bytes(audio_bytes: bytes | bytearray, encoding: Optional[str], sample_rate: Optional[int]) -> dict:
+    """Shared tail of the JSON and upload speech endpoints."""
     if not credentials:
         raise HTTPException(status_code=500, detail="Service account not configured")
 
     try:
-        # Decode base64 audio
-        import base64
-        audio_bytes = base64.b64decode(audio_base64)
-        
-        token = get_access_token()
-        
-        # Import config class
-        from chat_to_voice_attachment import SpeechToTextConfig
+        token = _lazy_access_token()
         config = SpeechToTextConfig(
-            encoding=request.encoding,
-            sample_rate_hertz=request.sample_rate
+            encoding=encoding or "LINEAR16",
+            sample_rate_hertz=sample_rate or 16000,
         )
-        
-        result = transcribe_audio(token, audio_bytes, config=config)
+        preprocessing = None
+        # WAV and LINEAR16 uploads can be chunked; browser WEBM_OPUS recordings cannot.
+        duration = pcm_duration(audio_bytes, config.encoding, config.sample_rate_hertz) or 0.0
+        if SPEECH_PREPROCESS:
+            options = SPEECH_PREPROCESS_OPTIONS
+            if duration > SPEECH_CHUNK_THRESHOLD_S:
+                options = replace(options, flac=False)  # chunks are cut from LINEAR16
+            prepared = await CPU_POOL.run(preprocess_audio, audio_bytes, config, options)
+            audio_bytes, config = prepared.audio, prepared.config
+            preprocessing = prepared.report()
+            if prepared.steps[0] != "passthrough":
+                duration = prepared.duration_out  # after silence trimming
+            LOGGER.debug(
+                "Speech preprocessing: %d -> %d bytes",
+                prepared.bytes_in,
+                prepared.bytes_out,
+                extra={"bytes_saved": prepared.bytes_saved, "steps": prepared.steps},
+            )
+
+        if duration > SPEECH_CHUNK_THRESHOLD_S:
+            # Long clip: split at silences and recognize the chunks in parallel.
+            result = await asyncio.to_thread(
+                transcribe_chunked, token, audio_bytes, config, transcribe=cached_transcribe_audio
+            )
+        else:
+            result = await asyncio.to_thread(cached_transcribe_audio, token, audio_bytes, config=config)
 
-        return {
+        response = {
             "transcript": result.get("transcript"),
             "confidence": result.get("confidence"),
             "all_results": result.get("all_results", [])
         }
+        if preprocessing:
+            response["preprocessing"] = preprocessing
+        if result.get("chunks"):
+            response["chunks"] = result["chunks"]
+        return response
     except SpeechToTextError as e:
         raise HTTPException(status_code=502, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error transcribing audio: {e}")
-        import traceback
-        traceback.print_exc()
+        LOGGER.exception("Error transcribing audio")
         raise HTTPException(status_code=500, detail="Internal server error while transcribing audio")
 
 
-@app.post("/api/generate-campus-photo")
-async def generate_campus_photo(file: UploadFile = File(...)):
+def _audio_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Audio exceeds {MAX_AUDIO_UPLOAD_BYTES} bytes")
+
+
+async def _bounded_body(request: Request, limit: int) -> AsyncIterator[bytes]:
+    """The request body, failing with 413 once more than `limit` bytes arrive.
+
+    Chunked uploads have no Content-Length, so the limit has to hold on the stream itself.
+    """
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _audio_too_large()
+        yield chunk
+
+
+# endpoint for major:
+@app.post("/api/speech-to-text")
+async def speech_to_text(request: AudioTranscriptionRequest):
+    """Convert audio (speech) to text using Google Speech-to-Text.
+
+    Request JSON: { "audio_base64": "<base64 audio>", "encoding": "LINEAR16", "sample_rate": 16000 }
+    Response: { "transcript": "...", "confidence": 0.95 }
+
+    Kept for older clients; `/api/speech-to-text/upload` avoids the base64 round trip.
+    """
+    audio_base64 = request.audio_base64
+    if not audio_base64:
+        raise HTTPException(status_code=400, detail="Missing 'audio_base64' field")
+
     try:
-        # Save uploaded file
-        user_image_path = f"temp_{file.filename}"
-        with open(user_image_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Path to campus background
-        # Assuming the backend is running from the backend directory or root, we need to find the asset
-        # The file structure is:
-        # rainbowroad/
-        #   backend/
-        #   public/assets/uhmanoageneration.jpg
-        
-        # Try to locate the file relative to this script
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        campus_bg_path = os.path.join(base_dir, "..", "public", "assets", "uhmanoageneration.jpg")
-        
-        if not os.path.exists(campus_bg_path):
-             # Fallback if running from root
-             campus_bg_path = os.path.join("public", "assets", "uhmanoageneration.jpg")
-        
-        if not os.path.exists(campus_bg_path):
-            raise HTTPException(status_code=500, detail="Campus background image not found")
-        
-        output_path = f"generated_{file.filename}"
-        
-        # Get access token for Vertex AI
-        token = get_access_token()
+        audio_bytes = base64.b64decode(audio_base64)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid base64 audio")
+    return await _transcribe_bytes(audio_bytes, request.encoding, request.sample_rate)
+
+
+def _form_sample_rate(value, default: int) -> int:
+    if value is None or value == "":
+        return default
+    if isinstance(value, str) and value.strip().isdigit() and int(value) > 0:
+        return int(value)
+    raise HTTPException(status_code=400, detail="'sample_rate' must be a positive integer")
+
+
+@app.post("/api/speech-to-text/upload")
+async def speech_to_text_upload(
+    request: Request,
+    encoding: str = "WEBM_OPUS",
+    sample_rate: int = 48000,
+):
+    """Transcribe audio sent as the raw request body or as a multipart `file` field.
+
+    Query params: ?encoding=WEBM_OPUS&sample_rate=48000 (multipart form fields
+    with the same names win). The body is read in chunks into one bounded
+    buffer and base64-encoded once, directly into the Google request.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_AUDIO_UPLOAD_BYTES + _MULTIPART_OVERHEAD_BYTES:
+        raise _audio_too_large()
+
+    audio = bytearray()
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # Parsed from the bounded stream, so the file is never spooled past the limit.
+        parser = MultiPartParser(
+            request.headers,
+            _bounded_body(request, MAX_AUDIO_UPLOAD_BYTES + _MULTIPART_OVERHEAD_BYTES),
+            max_files=1,
+            max_fields=4,
+            max_part_size=1024,
+        )
+        try:
+            form = await parser.parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        try:
+            upload = form.get("file") or form.get("audio")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Missing 'file' upload field")
+            encoding = str(form.get("encoding") or encoding)
+            sample_rate = _form_sample_rate(form.get("sample_rate"), sample_rate)
+            while chunk := await upload.read(_AUDIO_READ_CHUNK):
+                if len(audio) + len(chunk) > MAX_AUDIO_UPLOAD_BYTES:
+                    raise _audio_too_large()
+                audio += chunk
+        finally:
+            await form.close()
+    else:
+        async for chunk in _bounded_body(request, MAX_AUDIO_UPLOAD_BYTES):
+            audio += chunk
 
-        # Call the generation function
-        # We run this in a thread pool to avoid blocking the event loop
-        import asyncio
-        from functools import partial
-        
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None, 
-            partial(image_generation_function, user_image_path, campus_bg_path, output_path, token)
+    if not audio:
+        raise HTTPException(status_code=400, detail="Empty audio upload")
+    return await _transcribe_bytes(audio, encoding, sample_rate)
+
+
+# "rest" re-recognizes the buffered audio for interim results; "fake" needs no credentials.
+# "off" (default), "rest" or "fake". Each "rest" interim result is a billed
+# recognize call over the whole buffer, so streaming is opt-in.
+SPEECH_STREAMING_BACKEND = os.environ.get("SPEECH_STREAMING_BACKEND", "off").lower()
+SPEECH_STREAMING_INTERIM_BYTES = int(os.environ.get("SPEECH_STREAMING_INTERIM_BYTES", str(24 * 1024)))
+
+
+@app.websocket("/ws/speech-to-text")
+async def speech_to_text_stream(websocket: WebSocket, encoding: str = "WEBM_OPUS", sample_rate: int = 48000):
+    """Stream audio frames in, get interim and final transcripts back.
+
+    Client sends binary audio frames, then the text message "stop" (or
+    {"type": "stop"}). Server sends {"type": "ready"}, any number of
+    {"type": "interim", ...} events, then one {"type": "final", ...} or
+    {"type": "error", "detail": ...} and closes.
+    """
+    await websocket.accept()
+    config = SpeechToTextConfig(encoding=encoding, sample_rate_hertz=sample_rate)
+
+    async def emit(event: dict) -> None:
+        await websocket.send_json(event)
+
+    if SPEECH_STREAMING_BACKEND == "fake":
+        recognizer = FakeStreamingRecognizer(config, emit, max_bytes=MAX_AUDIO_UPLOAD_BYTES)
+    elif SPEECH_STREAMING_BACKEND != "rest":
+        # Clients fall back to /api/speech-to-text/upload.
+        await websocket.send_json({"type": "error", "detail": "Streaming speech recognition is disabled"})
+        await websocket.close(code=1008)
+        return
+    elif credentials:
+        recognizer = RestIncrementalRecognizer(
+            config,
+            emit,
+            token_fetcher=get_access_token,
+            interim_every_bytes=SPEECH_STREAMING_INTERIM_BYTES,
+            max_bytes=MAX_AUDIO_UPLOAD_BYTES,
+            # Same preprocessing, chunking and transcript cache as the upload endpoint.
+            final_transcribe=partial(_transcribe_bytes, encoding=encoding, sample_rate=sample_rate),
         )
-        
-        if not os.path.exists(output_path):
-            raise HTTPException(status_code=500, detail="Failed to generate output image")
+    else:
+        await websocket.send_json({"type": "error", "detail": "Service account not configured"})
+        await websocket.close(code=1011)
+        return
 
-        # Return the generated image
-        return FileResponse(output_path)
-        
+    await websocket.send_json({"type": "ready"})
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                await recognizer.push(message["bytes"])
+                continue
+            text = (message.get("text") or "").strip()
+            if text == "stop" or (text.startswith("{") and json.loads(text).get("type") == "stop"):
+                break
+        await recognizer.finish()
+    except WebSocketDisconnect:
+        return
+    except (SpeechToTextError, ValueError) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+    except HTTPException as e:  # from the final pass through _transcribe_bytes
+        await websocket.send_json({"type": "error", "detail": e.detail})
     except Exception as e:
-        print(f"Image generation error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        LOGGER.exception("Error in speech stream")
+        await websocket.send_json({"type": "error", "detail": "Internal server error while transcribing audio"})
+    finally:
+        await recognizer.close()
+    await websocket.close()
+
+
+# Uploaded person photos are read into memory up to this size (413 above it).
+MAX_PHOTO_UPLOAD_BYTES = int(os.environ.get("MAX_PHOTO_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+# Opt-in, quota-bounded disk cache of generated photos (PHOTO_CACHE_DIR).
+PHOTO_CACHE = photo_cache_from_env()
+
+
+@app.get("/api/campus-backgrounds")
+async def campus_backgrounds():
+    """Which campuses have a background for /api/generate-campus-photo."""
+    return {"default": DEFAULT_CAMPUS, "campuses": BACKGROUNDS.availability()}
+
+
+# Generation runs as background jobs; see photo_jobs.py.
+PHOTO_JOBS = PhotoJobQueue(
+    max_workers=int(os.environ.get("PHOTO_JOB_WORKERS", "2")),
+    max_queued=int(os.environ.get("PHOTO_JOB_MAX_QUEUED", "16")),
+    deadline_s=float(os.environ.get("PHOTO_JOB_DEADLINE_S", "90")),
+    max_per_client=int(os.environ.get("PHOTO_JOB_MAX_PER_CLIENT", "2")),
+    retention_s=float(os.environ.get("PHOTO_JOB_RETENTION_S", "600")),
+    max_finished=int(os.environ.get("PHOTO_JOB_MAX_FINISHED", "64")),
+)
+# Longest a status request may wait for a change with ?wait=.
+PHOTO_JOB_MAX_WAIT_S = 25.0
+
+
+def _photo_client_id(request: Request) -> str:
+    # Browsers behind one NAT share an IP, so let the frontend send its own id.
+    client_id = (request.headers.get("x-client-id") or "").strip()[:64]
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "anonymous"
+
+
+def _render_campus_photo(person_jpeg: bytes, background_b64: str, cache_key: Optional[tuple]):
+    """Job body: runs on a PHOTO_JOBS worker thread."""
+    token = get_access_token()
+    image_bytes, mime_type = generate_campus_image(
+        person_jpeg, background_b64, token, timeout=PHOTO_JOBS.deadline_s
+    )
+    if PHOTO_CACHE is not None and cache_key is not None:
+        PHOTO_CACHE.put(*cache_key, image_bytes, mime_type)
+    return image_bytes, mime_type
+
+
+def _preview_variants(fmt: str, image_bytes: bytes):
+    """Pre-encode the preview on the job worker so it is ready the moment the job is done."""
+    return {("preview", fmt): encode_variant(image_bytes, fmt, "preview")}
+
+
+async def _photo_variant(job: PhotoJob, variant: str, fmt: str):
+    """(bytes, mime) of `job`'s image as `variant` in `fmt`, encoded once per job."""
+    key = (variant, fmt)
+    if key not in job.variants:
+        job.variants[key] = await CPU_POOL.run(encode_variant, job.result, fmt, variant)
+    return job.variants[key]
+
+
+def _photo_response(job: PhotoJob, body: bytes, mime_type: str) -> Response:
+    headers = dict(job.headers)
+    headers["Vary"] = "Accept"
+    headers["Cache-Control"] = "private, max-age=600"
+    return Response(content=body, media_type=mime_type, headers=headers)
+
+
+def _photo_cache_lookup(person_jpeg: bytes, background):
+    """(cache key, cached (bytes, mime) or None) for the prepared photo."""
+    namespace = PHOTO_CACHE.namespace(background.campus, background.version, PROMPT_VERSION)
+    phash = PHOTO_CACHE.hash_photo(person_jpeg)
+    return (namespace, phash), PHOTO_CACHE.get(namespace, phash)
+
+
+async def _submit_photo_job(request: Request, file: UploadFile, campus: str) -> PhotoJob:
+    """Validate and prepare the upload, then queue (or answer from cache) its job."""
+    upload = bytearray()
+    while chunk := await file.read(_AUDIO_READ_CHUNK):
+        if len(upload) + len(chunk) > MAX_PHOTO_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Photo exceeds {MAX_PHOTO_UPLOAD_BYTES} bytes")
+        upload += chunk
+    await file.close()
+    if not upload:
+        raise HTTPException(status_code=400, detail="Empty photo upload")
+
+    campus = campus.strip().lower()
+    if campus not in CAMPUS_BACKGROUNDS:
+        raise HTTPException(status_code=400, detail=f"Unknown campus '{campus}'")
+    # Usually a dict lookup; runs in the pool because a changed file is reloaded inline.
+    background = await CPU_POOL.run(BACKGROUNDS.resolve, campus)
+    if background is None:
+        raise HTTPException(status_code=500, detail="Campus background image not found")
+    headers = {"X-Campus-Background": background.campus}
+
+    try:
+        person_jpeg = await CPU_POOL.run(prepare_person_image, bytes(upload))
+    except (OSError, ValueError) as e:  # PIL.UnidentifiedImageError is an OSError
+        raise HTTPException(status_code=400, detail=f"Unsupported image: {e}")
+
+    client_id = _photo_client_id(request)
+    cache_key = None
+    try:
+        if PHOTO_CACHE is not None:
+            cache_key, cached = await CPU_POOL.run(_photo_cache_lookup, person_jpeg, background)
+            if cached is not None:
+                return PHOTO_JOBS.submit_done(client_id, cached[0], cached[1], headers=headers)
+        if not credentials:
+            raise HTTPException(status_code=500, detail="Service account not configured")
+        return PHOTO_JOBS.submit(
+            client_id,
+            partial(_render_campus_photo, person_jpeg, background.b64, cache_key),
+            headers=headers,
+            make_variants=partial(_preview_variants, negotiate_format(request.headers.get("accept"))),
+        )
+    except JobRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+def _photo_job_or_404(job_id: str) -> PhotoJob:
+    job = PHOTO_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired photo job")
+    return job
+
+
+def _photo_job_status(job: PhotoJob) -> dict:
+    info = job.public()
+    info["status_url"] = f"/api/campus-photo-jobs/{job.job_id}"
+    info["events_url"] = f"/api/campus-photo-jobs/{job.job_id}/events"
+    info["result_url"] = f"/api/campus-photo-jobs/{job.job_id}/result"
+    info["preview_url"] = f"/api/campus-photo-jobs/{job.job_id}/result?variant=preview"
+    return info
+
+
+@app.post("/api/campus-photo-jobs", status_code=202)
+async def submit_campus_photo_job(request: Request, file: UploadFile = File(...), campus: str = DEFAULT_CAMPUS):
+    """Queue a campus photo generation and return its job id right away.
+
+    Follow up with GET /api/campus-photo-jobs/{id} (add ?wait=20 to long-poll),
+    or the SSE stream at /events, then fetch /result once the status is "done".
+    """
+    job = await _submit_photo_job(request, file, campus)
+    return _photo_job_status(job)
+
+
+@app.get("/api/campus-photo-jobs/{job_id}")
+async def campus_photo_job_status(job_id: str, wait: float = 0.0):
+    job = _photo_job_or_404(job_id)
+    if wait > 0:
+        await PHOTO_JOBS.wait(job, min(wait, PHOTO_JOB_MAX_WAIT_S))
+    return _photo_job_status(job)
+
+
+@app.get("/api/campus-photo-jobs/{job_id}/events")
+async def campus_photo_job_events(job_id: str):
+    """Server-sent events: one `status` event per state change until the job finishes."""
+    job = _photo_job_or_404(job_id)
+
+    async def stream():
+        while True:
+            yield f"event: status\ndata: {json.dumps(_photo_job_status(job))}\n\n"
+            if job.status in (DONE, FAILED):
+                return
+            before = job.status
+            await PHOTO_JOBS.wait(job, 15.0)
+            if job.status == before:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/api/campus-photo-jobs/{job_id}/result")
+async def campus_photo_job_result(request: Request, job_id: str, variant: str = "full"):
+    """The generated image, as AVIF/WebP when the Accept header allows, else progressive JPEG.
+
+    `?variant=preview` returns a small, quickly loaded version to show while
+    the full image downloads.
+    """
+    if variant not in VARIANTS:
+        raise HTTPException(status_code=400, detail=f"variant must be one of {', '.join(VARIANTS)}")
+    job = _photo_job_or_404(job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=502, detail=job.error or "Photo generation failed")
+    if job.status != DONE or job.result is None:
+        return JSONResponse(status_code=202, content=_photo_job_status(job))
+    body, mime_type = await _photo_variant(job, variant, negotiate_format(request.headers.get("accept")))
+    return _photo_response(job, body, mime_type)
+
+
+@app.post("/api/generate-campus-photo")
+async def generate_campus_photo(request: Request, file: UploadFile = File(...), campus: str = DEFAULT_CAMPUS):
+    """Composite the uploaded person photo onto a campus background.
+
+    `?campus=` picks the background (see campus_backgrounds.py); campuses
+    without a usable image fall back to the default, and the
+    `X-Campus-Background` response header names the one actually used.
+
+    Everything stays in memory: the upload is read into a bounded buffer, the
+    photo is downscaled and re-encoded, and the generated bytes are returned
+    directly. Only the optional PHOTO_CACHE writes to disk.
+
+    Kept for older clients: it runs through the same bounded job queue but
+    waits for the result. New clients should use /api/campus-photo-jobs.
+    The image format is negotiated from the Accept header (see image_output.py).
+    """
+    job = await _submit_photo_job(request, file, campus)
+    while job.status not in (DONE, FAILED):
+        await PHOTO_JOBS.wait(job, PHOTO_JOB_MAX_WAIT_S)
+    if job.status == FAILED:
+        LOGGER.error("Image generation error: %s", job.error, extra={"job_id": job.job_id})
+        raise HTTPException(status_code=500, detail=job.error or "Photo generation failed")
+    body, mime_type = await _photo_variant(job, "full", negotiate_format(request.headers.get("accept")))
+    return _photo_response(job, body, mime_type)
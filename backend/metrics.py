@@ -0,0 +1,223 @@
+"""
+In-process metrics, exposed in Prometheus text format on `GET /metrics`.
+
+Recording is cheap: each metric is a dict of label tuples under one lock,
+and a histogram observation is one bisect plus two additions. The recorded
+metrics are:
+
+- `http_request_duration_seconds{method,route,status}`: every HTTP request.
+  `MetricsMiddleware` records it with the route template
+  (`/api/prerequisites/{campus}/{code}`), not the raw path.
+- `upstream_request_duration_seconds{model,status}`: every Vertex AI call.
+  `observe_upstream()` records it from `generation_profiles.generate_content`
+  and the image model call.
+- `upstream_finish_reasons_total{model,finish_reason}` and
+  `upstream_tokens_total{model,kind}`: taken from the same responses, the
+  latter from `usageMetadata`.
+- `fallbacks_total{path,reason}`: answers served from a fallback path
+  (default skills, the contextual Keala reaction, default majors).
+
+Cache hit ratios and other component counters already exist in the
+components. A `register_collector()` callback reads them only when
+`/metrics` is scraped, so they add nothing to the hot path.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+LOGGER = logging.getLogger(__name__)
+
+# (name, type, help, samples) as rendered by `Registry.render()`
+Family = Tuple[str, str, str, List[Sample]]
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def collect(self) -> Family:
+        with self._lock:
+            values = dict(self._values)
+        samples = [(dict(zip(self.labels, key)), value) for key, value in sorted(values.items())]
+        return self.name, "counter", self.help, samples
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last = above every bucket), sum]
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def collect(self) -> Family:
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        samples: List[Sample] = []
+        for key, (counts, total) in sorted(series.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(({**labels, "le": _format_value(bound)}, cumulative))
+            samples.append(({**labels, "__suffix": "_sum"}, total))
+            samples.append(({**labels, "__suffix": "_count"}, cumulative))
+        return self.name, "histogram", self.help, samples
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[object] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """`collector()` is called on every scrape and returns metric families."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        families: List[Family] = [metric.collect() for metric in self._metrics]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception:  # a broken collector must not break the scrape
+                LOGGER.exception("Metrics collector %s failed", getattr(collector, "__name__", collector))
+        lines: List[str] = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                suffix = labels.pop("__suffix", "_bucket" if kind == "histogram" else "")
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"),
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "upstream_request_duration_seconds", "Vertex AI request latency by model and HTTP status.", ("model", "status"),
+    buckets=UPSTREAM_BUCKETS,
+)
+UPSTREAM_FINISH_REASONS = REGISTRY.counter(
+    "upstream_finish_reasons_total", "Vertex AI candidates by finishReason.", ("model", "finish_reason"),
+)
+UPSTREAM_TOKENS = REGISTRY.counter(
+    "upstream_tokens_total", "Tokens reported in Vertex AI usageMetadata.", ("model", "kind"),
+)
+FALLBACKS = REGISTRY.counter(
+    "fallbacks_total", "Responses served from a fallback path instead of the model.", ("path", "reason"),
+)
+
+_TOKEN_FIELDS = (("promptTokenCount", "prompt"), ("candidatesTokenCount", "response"), ("thoughtsTokenCount", "thoughts"))
+
+
+def observe_upstream(model: str, seconds: float, status: str, data: Optional[dict] = None) -> None:
+    """Record one Vertex call: latency, and finishReason/usage when the JSON body is known."""
+    UPSTREAM_LATENCY.observe(seconds, model, status)
+    if not isinstance(data, dict):
+        return
+    candidates = data.get("candidates") or [{}]
+    UPSTREAM_FINISH_REASONS.inc(model, str(candidates[0].get("finishReason", "UNKNOWN")))
+    usage = data.get("usageMetadata") or {}
+    for field, kind in _TOKEN_FIELDS:
+        if usage.get(field):
+            UPSTREAM_TOKENS.inc(model, kind, amount=float(usage[field]))
+
+
+def count_fallback(path: str, reason: str = "") -> None:
+    FALLBACKS.inc(path, reason)
+
+
+def family(name: str, kind: str, help: str, samples: List[Sample]) -> Family:
+    """Helper for collectors."""
+    return name, kind, help, samples
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording `http_request_duration_seconds` for every HTTP request."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # FastAPI puts the matched route in the scope; unmatched paths share one label.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route, str(status))
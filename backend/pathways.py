@@ -0,0 +1,230 @@
+"""
+Degree pathway data (`UH-courses/<campus>_degree_pathways.json`).
+
+Pathway files are parsed once and cached until the file's mtime changes
+(with shared segments enabled, parsed once for all worker processes and
+decoded one program at a time; see shared_segment.py). `build_path()`
+turns the best matching program into the nodes and edges the pathway
+view renders. Edges are real prerequisites from
+`prerequisite_graph` (transitively reduced among the program's courses); a
+program whose courses share no prerequisites falls back to chaining the
+courses in semester order, as does `edge_mode="sequential"`. Everything here
+is synchronous and CPU-bound, so the API runs it on `executors.CPU_POOL`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from prerequisite_graph import NodeId, PrerequisiteGraph, get_prerequisite_graph
+from shared_segment import attach_or_build, shared_segments_enabled
+
+
+UH_COURSES_DIR = Path(__file__).resolve().parents[1] / "UH-courses"
+
+_cache: Dict[str, Tuple[int, List[Dict]]] = {}  # campus -> (mtime_ns, programs)
+_cache_lock = threading.Lock()
+
+
+def pathway_file(campus: str) -> Path:
+    return UH_COURSES_DIR / f"{campus}_degree_pathways.json"
+
+
+def _read_pathway_file(path: Path) -> List[Dict]:
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _pathway_files() -> Dict[str, Path]:
+    return {path.name[: -len("_degree_pathways.json")]: path for path in sorted(UH_COURSES_DIR.glob("*_degree_pathways.json"))}
+
+
+def _build_pathway_segment():
+    programs = {campus: _read_pathway_file(path) for campus, path in _pathway_files().items()}
+    names = {campus: [p.get("program_name", "") for p in items] for campus, items in programs.items()}
+    return programs, {"names": names}
+
+
+def _pathway_segment():
+    digest = hashlib.sha1()
+    for campus, path in _pathway_files().items():
+        stat = path.stat()
+        digest.update(f"{campus}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return attach_or_build("pathways", digest.hexdigest()[:16], _build_pathway_segment, code_files=[__file__])
+
+
+def load_pathways(campus: str) -> Optional[Sequence[Dict]]:
+    """Parsed pathway programs for `campus`, or None when there is no file."""
+    if shared_segments_enabled():
+        segment = _pathway_segment()
+        return segment.sequence(campus) if campus in segment else None
+    path = pathway_file(campus)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(campus)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    programs = _read_pathway_file(path)
+    with _cache_lock:
+        _cache[campus] = (mtime, programs)
+    return programs
+
+
+def _normalize(value: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '', value.lower())
+
+
+def program_names(campus: str) -> List[str]:
+    """Program names of `campus`, in file order, without decoding every program."""
+    if shared_segments_enabled():
+        segment = _pathway_segment()
+        return segment.meta["names"].get(campus, [])
+    return [p.get("program_name", "") for p in load_pathways(campus) or []]
+
+
+def find_program(pathways: Sequence[Dict], major: str, names: Optional[Sequence[str]] = None) -> Optional[Dict]:
+    """Longest substring match between the major and a program name.
+
+    `names` (the programs' names, in order) saves reading every program.
+    """
+    if names is None:
+        names = [p.get("program_name", "") for p in pathways]
+    major_normalized = _normalize(major)
+    matching_program = None
+    best_match_score = 0
+
+    for index, name in enumerate(names):
+        program_name_normalized = _normalize(name)
+
+        if major_normalized in program_name_normalized:
+            match_score = len(major_normalized)
+        elif program_name_normalized in major_normalized:
+            match_score = len(program_name_normalized)
+        else:
+            continue
+        if match_score > best_match_score:
+            best_match_score = match_score
+            matching_program = index
+
+    return pathways[matching_program] if matching_program is not None else None
+
+
+EDGE_MODES = ("prerequisites", "sequential")
+
+
+def prerequisite_edges(nodes: List[Dict], campus: str, graph: PrerequisiteGraph) -> List[Dict]:
+    """Edges between path nodes whose courses are prerequisites of one another.
+
+    Only the transitive reduction is kept: A -> C is dropped when the path
+    already has A -> B -> C.
+    """
+    node_for: Dict[NodeId, str] = {}
+    for node in nodes:
+        course = graph.resolve(campus, node["name"])
+        if course is not None:
+            node["course_code"] = course[1]
+            node_for.setdefault(course, node["id"])
+    ancestors_of = {course: graph.requires_all.get(course, frozenset()) for course in node_for}
+    edges = []
+    for target, target_id in node_for.items():
+        ancestors = ancestors_of[target]
+        sources = [course for course in node_for if course != target and course in ancestors]
+        for source in sources:
+            implied = any(source in ancestors_of[other] for other in sources if other != source)
+            if not implied:
+                edges.append({
+                    "id": f"{node_for[source]}-{target_id}",
+                    "source": node_for[source],
+                    "target": target_id,
+                    "kind": "prerequisite",
+                })
+    return edges
+
+
+NODE_COLUMNS = ("id", "name", "credits", "semester", "year", "course_code", "prerequisites")
+
+
+def columnar_nodes(nodes: List[Dict]) -> Dict:
+    """Nodes as one array per field (`format: "columnar"`), for clients that opt in.
+
+    Repeated keys are sent once, and `position` is split into `x`/`y`, which
+    makes a path of a few hundred nodes much smaller before compression.
+    """
+    columns: Dict[str, List] = {column: [node.get(column) for node in nodes] for column in NODE_COLUMNS}
+    columns["x"] = [node.get("position", {}).get("x", 0) for node in nodes]
+    columns["y"] = [node.get("position", {}).get("y", 0) for node in nodes]
+    return {"format": "columnar", "length": len(nodes), "columns": columns}
+
+
+def build_path(major: str, campus: Optional[str] = "manoa", edge_mode: str = "prerequisites") -> Dict:
+    """Nodes/edges payload for `/api/generate-path`."""
+    campus_lower = (campus or "manoa").lower()
+    pathways = load_pathways(campus_lower)
+    if pathways is None:
+        return {"path": [], "edges": [], "error": f"Pathway file not found for campus: {campus_lower}"}
+
+    matching_program = find_program(pathways, major, program_names(campus_lower))
+    if not matching_program:
+        return {"path": [], "edges": [], "error": f"No pathway found for major: {major}"}
+
+    nodes = []
+    edges = []
+    node_id_counter = 0
+    previous_node_id = None
+
+    years = matching_program.get("years", [])
+    for year_idx, year in enumerate(years):
+        semesters = year.get("semesters", [])
+        for sem_idx, semester in enumerate(semesters):
+            courses = semester.get("courses", [])
+            for course_idx, course in enumerate(courses):
+                course_name = course.get("name", f"Course {node_id_counter}")
+                course_credits = course.get("credits", 3)
+
+                node_id = f"node-{node_id_counter}"
+                node_id_counter += 1
+
+                nodes.append({
+                    "id": node_id,
+                    "name": course_name,
+                    "credits": course_credits,
+                    "semester": semester.get("semester_name", "Semester"),
+                    "year": year.get("year_number", year_idx + 1),
+                    "position": {
+                        "x": sem_idx * 260,
+                        "y": year_idx * 280 + course_idx * 110
+                    }
+                })
+
+                if previous_node_id:
+                    edges.append({
+                        "id": f"{previous_node_id}-{node_id}",
+                        "source": previous_node_id,
+                        "target": node_id
+                    })
+
+                previous_node_id = node_id
+
+    if edge_mode == "prerequisites":
+        prerequisites = prerequisite_edges(nodes, campus_lower, get_prerequisite_graph())
+        if prerequisites:
+            edges = prerequisites
+            for node in nodes:
+                node["prerequisites"] = [e["source"] for e in edges if e["target"] == node["id"]]
+        else:
+            edge_mode = "sequential"
+
+    return {
+        "path": nodes,
+        "edges": edges,
+        "edge_mode": edge_mode,
+        "program_name": matching_program.get("program_name", ""),
+        "total_credits": matching_program.get("total_credits", 0)
+    }
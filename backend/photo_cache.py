@@ -0,0 +1,220 @@
+"""
+Optional on-disk cache for generated campus photos, matched by perceptual hash.
+
+`/api/generate-campus-photo` works entirely in memory; nothing touches the
+disk unless `PHOTO_CACHE_DIR` is set. When it is, every generated image is
+stored under:
+
+- a namespace: campus id + background version + prompt version, so a new
+  background or prompt never serves old generations, and
+- a difference hash (dHash) of the normalized person photo (EXIF-rotated,
+  downscaled; see `image_generation.prepare_person_image`).
+
+A lookup returns the closest stored photo in the same namespace whose hash is
+within `max_distance` bits (Hamming distance), so re-uploads and recompressed
+or slightly resized copies of the same selfie reuse the earlier result. The
+hash is `hash_size`² bits (256 by default); the longer hash keeps distinct
+faces on similar plain backgrounds apart at the default threshold.
+
+The directory is bounded by `max_bytes`: least recently used files (by mtime,
+refreshed on every hit) are deleted first. File names carry the namespace and
+hash, so the index is rebuilt from the directory on startup. Files are
+written to a temporary name and renamed into place.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+_MIME_EXT = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}
+_EXT_MIME = {ext: mime for mime, ext in _MIME_EXT.items()}
+_NAME_RE = re.compile(r"^([0-9a-f]{12})-([0-9a-f]+)(\.\w+)$")
+
+
+def dhash(image_bytes: bytes, hash_size: int = 16) -> int:
+    """Difference hash: 1 bit per horizontally adjacent pixel pair of a tiny grayscale copy."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft("L", (hash_size * 4, hash_size * 4))  # cheap JPEG downscale on decode
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = small.tobytes()
+    value = 0
+    width = hash_size + 1
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@dataclass
+class _IndexEntry:
+    phash: int
+    path: str
+    mime_type: str
+
+
+class DiskPhotoCache:
+    """Size-bounded LRU of generated images, looked up by near-duplicate input hash."""
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        max_bytes: int = 200 * 1024 * 1024,
+        max_distance: int = 10,
+        hash_size: int = 16,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[_IndexEntry]] = {}
+        self._hits = 0
+        self._near_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._distances: Dict[int, int] = {}
+        self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                match = _NAME_RE.match(entry.name)
+                if match and match.group(3) in _EXT_MIME:
+                    namespace, hex_hash, ext = match.groups()
+                    self._index.setdefault(namespace, []).append(
+                        _IndexEntry(int(hex_hash, 16), entry.path, _EXT_MIME[ext])
+                    )
+
+    def namespace(self, campus: str, background_version: str, prompt_version: str) -> str:
+        key = f"{campus}:{background_version}:{prompt_version}:{self.hash_size}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+    def hash_photo(self, person_jpeg: bytes) -> int:
+        return dhash(person_jpeg, self.hash_size)
+
+    def get(self, namespace: str, phash: int) -> Optional[Tuple[bytes, str]]:
+        """Closest cached image within `max_distance`, or None."""
+        with self._lock:
+            best: Optional[_IndexEntry] = None
+            best_distance = self.max_distance + 1
+            for entry in self._index.get(namespace, ()):
+                distance = hamming(entry.phash, phash)
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+                    if distance == 0:
+                        break
+            if best is None:
+                self._misses += 1
+                return None
+        try:
+            with open(best.path, "rb") as f:
+                data = f.read()
+            os.utime(best.path)  # mark as recently used
+        except OSError:
+            with self._lock:
+                self._drop(namespace, best.path)
+                self._misses += 1
+            return None
+        with self._lock:
+            if best_distance == 0:
+                self._hits += 1
+            else:
+                self._near_hits += 1
+            self._distances[best_distance] = self._distances.get(best_distance, 0) + 1
+        return data, best.mime_type
+
+    def put(self, namespace: str, phash: int, data: bytes, mime_type: str) -> None:
+        if len(data) > self.max_bytes:
+            return
+        ext = _MIME_EXT.get(mime_type, ".png")
+        hex_width = (self.hash_size * self.hash_size + 3) // 4
+        path = os.path.join(self.directory, f"{namespace}-{phash:0{hex_width}x}{ext}")
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        with self._lock:
+            entries = self._index.setdefault(namespace, [])
+            if not any(entry.path == path for entry in entries):
+                entries.append(_IndexEntry(phash, path, _EXT_MIME[ext]))
+        self._enforce_quota()
+
+    def _drop(self, namespace: str, path: str) -> None:
+        entries = self._index.get(namespace, [])
+        self._index[namespace] = [entry for entry in entries if entry.path != path]
+
+    def _files(self):
+        files = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        return files
+
+    def _enforce_quota(self) -> None:
+        with self._lock:
+            files = self._files()
+            total = sum(size for _, size, _, _ in files)
+            for _, size, path, name in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self._evictions += 1
+                self._drop(name[:12], path)
+
+    def stats(self) -> Dict[str, object]:
+        files = self._files()
+        with self._lock:
+            lookups = self._hits + self._near_hits + self._misses
+            return {
+                "directory": self.directory,
+                "files": len(files),
+                "bytes": sum(size for _, size, _, _ in files),
+                "max_bytes": self.max_bytes,
+                "max_distance": self.max_distance,
+                "hash_bits": self.hash_size * self.hash_size,
+                "hits": self._hits,
+                "near_hits": self._near_hits,
+                "misses": self._misses,
+                "hit_ratio": round((self._hits + self._near_hits) / lookups, 4) if lookups else 0.0,
+                "hit_distances": dict(sorted(self._distances.items())),
+                "evictions": self._evictions,
+            }
+
+
+def photo_cache_from_env() -> Optional[DiskPhotoCache]:
+    directory = os.environ.get("PHOTO_CACHE_DIR", "").strip()
+    if not directory:
+        return None
+    return DiskPhotoCache(
+        directory,
+        max_bytes=int(os.environ.get("PHOTO_CACHE_MAX_BYTES", str(200 * 1024 * 1024))),
+        max_distance=int(os.environ.get("PHOTO_CACHE_MAX_DISTANCE", "10")),
+        hash_size=int(os.environ.get("PHOTO_CACHE_HASH_SIZE", "16")),
+    )
@@ -0,0 +1,262 @@
+"""
+Background jobs for campus photo generation.
+
+A `gemini-2.5-flash-image` call takes tens of seconds. Instead of holding the
+HTTP request open for all of it, `/api/campus-photo-jobs` submits a job and
+returns its id at once; the client then polls the status endpoint (or follows
+the SSE stream) and fetches the image from the result endpoint.
+
+`PhotoJobQueue`:
+
+- runs jobs on its own bounded thread pool (`max_workers`), never the default
+  executor; at most `max_queued` jobs wait behind the running ones,
+- fails a job that runs past `deadline_s` (the worker's HTTP call carries the
+  same timeout, so its thread is freed soon after),
+- limits each client to `max_per_client` unfinished jobs,
+- keeps finished jobs for `retention_s`, and at most `max_finished` of them,
+  dropping the oldest first.
+
+A job can also pre-compute `variants` (e.g. a preview encoding) on the worker
+right after the image is generated; the result endpoint adds more on demand.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+
+Variants = Dict[Tuple[str, str], Tuple[bytes, str]]  # (variant, format) -> (bytes, mime)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+_FINISHED = (DONE, FAILED)
+
+
+class JobRejected(Exception):
+    """Submission refused; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class PhotoJob:
+    job_id: str
+    client_id: str
+    created_at: float
+    status: str = QUEUED
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[bytes] = None
+    mime_type: Optional[str] = None
+    error: Optional[str] = None
+    # Extra response headers for the result (e.g. X-Campus-Background).
+    headers: Dict[str, str] = field(default_factory=dict)
+    variants: Variants = field(default_factory=dict)
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def public(self) -> Dict[str, object]:
+        info: Dict[str, object] = {"job_id": self.job_id, "status": self.status}
+        if self.started_at is not None:
+            info["queued_s"] = round(self.started_at - self.created_at, 3)
+        if self.finished_at is not None and self.started_at is not None:
+            info["run_s"] = round(self.finished_at - self.started_at, 3)
+        if self.error:
+            info["error"] = self.error
+        return info
+
+    def _notify(self) -> None:
+        # Wake everyone waiting on this state, then arm a fresh event for the next one.
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class PhotoJobQueue:
+    def __init__(
+        self,
+        *,
+        max_workers: int = 2,
+        max_queued: int = 16,
+        deadline_s: float = 90.0,
+        max_per_client: int = 2,
+        retention_s: float = 10 * 60,
+        max_finished: int = 64,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max(0, max_queued)
+        self.deadline_s = deadline_s
+        self.max_per_client = max(1, max_per_client)
+        self.retention_s = retention_s
+        self.max_finished = max(1, max_finished)
+        self._clock = clock
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._jobs: "OrderedDict[str, PhotoJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._counters = {"submitted": 0, "done": 0, "failed": 0, "timed_out": 0, "rejected": 0, "evicted": 0}
+        self._run_times: List[float] = []
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        # Created on first use, and again after `shutdown()` if the app restarts.
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="photo-job")
+        return self._pool
+
+    # ----- submission -----
+
+    def _unfinished(self, client_id: Optional[str] = None) -> int:
+        return sum(
+            1 for job in self._jobs.values()
+            if job.status not in _FINISHED and (client_id is None or job.client_id == client_id)
+        )
+
+    def _new_job(self, client_id: str) -> PhotoJob:
+        self._evict()
+        if self._unfinished(client_id) >= self.max_per_client:
+            self._counters["rejected"] += 1
+            raise JobRejected(429, f"At most {self.max_per_client} photo jobs per client at a time")
+        if self._unfinished() >= self.max_workers + self.max_queued:
+            self._counters["rejected"] += 1
+            raise JobRejected(503, "Photo generation is busy, please try again shortly")
+        job = PhotoJob(job_id=uuid.uuid4().hex, client_id=client_id, created_at=self._clock())
+        self._jobs[job.job_id] = job
+        self._counters["submitted"] += 1
+        return job
+
+    def submit(
+        self,
+        client_id: str,
+        fn: Callable[[], Tuple[bytes, str]],
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        make_variants: Optional[Callable[[bytes], Variants]] = None,
+    ) -> PhotoJob:
+        """Queue blocking `fn() -> (image bytes, mime type)`; raises JobRejected.
+
+        `make_variants(image bytes)` runs on the same worker afterwards.
+        """
+        job = self._new_job(client_id)
+        job.headers = dict(headers or {})
+        self._tasks[job.job_id] = asyncio.get_running_loop().create_task(self._run(job, fn, make_variants))
+        return job
+
+    def submit_done(self, client_id: str, result: bytes, mime_type: str, *, headers: Optional[Dict[str, str]] = None) -> PhotoJob:
+        """Record an already-available result (e.g. a cache hit) as a finished job."""
+        job = self._new_job(client_id)
+        job.headers = dict(headers or {})
+        job.started_at = job.created_at
+        self._finish(job, DONE, result=result, mime_type=mime_type)
+        return job
+
+    @staticmethod
+    def _execute(fn: Callable[[], Tuple[bytes, str]], make_variants: Optional[Callable[[bytes], Variants]]):
+        result, mime_type = fn()
+        return result, mime_type, (make_variants(result) if make_variants else {})
+
+    async def _run(self, job: PhotoJob, fn: Callable[[], Tuple[bytes, str]], make_variants=None) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        try:
+            async with self._slots:
+                job.status = RUNNING
+                job.started_at = self._clock()
+                job._notify()
+                loop = asyncio.get_running_loop()
+                try:
+                    result, mime_type, variants = await asyncio.wait_for(
+                        # Copying the context keeps the request id on the worker's log records.
+                        loop.run_in_executor(self._get_pool(), contextvars.copy_context().run, self._execute, fn, make_variants),
+                        timeout=self.deadline_s,
+                    )
+                except asyncio.TimeoutError:
+                    self._counters["timed_out"] += 1
+                    self._finish(job, FAILED, error=f"Generation exceeded {self.deadline_s:.0f}s deadline")
+                    return
+                except Exception as e:  # noqa: BLE001 - surfaced to the client as the job error
+                    LOGGER.warning("Photo job %s failed: %s", job.job_id, e)
+                    self._finish(job, FAILED, error=str(e))
+                    return
+                job.variants.update(variants)
+                self._finish(job, DONE, result=result, mime_type=mime_type)
+        finally:
+            self._tasks.pop(job.job_id, None)
+
+    def _finish(self, job: PhotoJob, status: str, *, result: Optional[bytes] = None, mime_type: Optional[str] = None, error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.mime_type = mime_type
+        job.error = error
+        job.finished_at = self._clock()
+        self._counters["done" if status == DONE else "failed"] += 1
+        if job.started_at is not None:
+            self._run_times = (self._run_times + [job.finished_at - job.started_at])[-200:]
+        job._notify()
+
+    # ----- lookup -----
+
+    def get(self, job_id: str) -> Optional[PhotoJob]:
+        self._evict()
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: PhotoJob, timeout: float) -> PhotoJob:
+        """Return once `job` changes state (or after `timeout` seconds)."""
+        if job.status in _FINISHED:
+            return job
+        try:
+            await asyncio.wait_for(job.changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    # ----- retention -----
+
+    def _evict(self) -> None:
+        now = self._clock()
+        finished = [job for job in self._jobs.values() if job.status in _FINISHED]
+        expired = {
+            job.job_id for job in finished
+            if self.retention_s > 0 and now - (job.finished_at or now) > self.retention_s
+        }
+        overflow = len(finished) - len(expired) - self.max_finished
+        if overflow > 0:
+            live = sorted((job for job in finished if job.job_id not in expired), key=lambda j: j.finished_at or 0.0)
+            expired.update(job.job_id for job in live[:overflow])
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._counters["evicted"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        runs = sorted(self._run_times)
+        return {
+            "jobs": len(self._jobs),
+            "queued": sum(1 for job in self._jobs.values() if job.status == QUEUED),
+            "running": sum(1 for job in self._jobs.values() if job.status == RUNNING),
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "deadline_s": self.deadline_s,
+            "max_per_client": self.max_per_client,
+            **self._counters,
+            "p50_run_s": round(runs[len(runs) // 2], 3) if runs else None,
+            "p95_run_s": round(runs[int(0.95 * (len(runs) - 1))], 3) if runs else None,
+        }
+
+    def shutdown(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        pool, self._pool, self._slots = self._pool, None, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,631 @@
+"""
+Prerequisite graph across every campus catalog.
+
+The `metadata` column of `UH-courses/<campus>_courses.csv` carries the
+prerequisites as free text, and every campus words it differently:
+
+- Manoa:     "Prerequisites: CINE 310 , CINE 350 , and one of CINE 312 , ... or CINE 374 .; Grade Option: ..."
+- Hilo:      "prerequisites: C or better in Soc 100 or WS 151"
+- Kapiolani: "Prereq: A grade of C or higher in ENG 100 or ESL 100., Coreq: -"
+- Leeward:   "Prerequisites: ENG 100 with a grade of C or betterANDHSER 140 ...ORinstructor approval."
+- Maui:      "Prerequisites: BIOL 171/171L, CHEM 151 or 161/161L, or consent"
+
+`parse_prerequisites()` cuts out the prerequisite clause, drops grade and
+"(or concurrent)" qualifiers, and turns the rest into an AND/OR expression
+over course codes:
+
+    ("course", code) | ("all", (expr, ...)) | ("any", (expr, ...), waivable)
+
+"or consent"/"or placement"-style alternatives are not courses; they only
+mark the group (or the whole requirement) as waivable.
+
+`build_prerequisite_graph()` resolves every code to a catalog course (same
+campus first, then Manoa, then any campus) and precomputes, once per catalog
+version:
+
+- direct prerequisites and the courses each one unlocks,
+- the transitive closures of both (`requires_all` / `unlocks_all`),
+- topological levels (0 = no prerequisites; cycles share a level),
+- the cheapest chain of courses that satisfies each course's requirement
+  (AND = sum, OR = min over the alternatives).
+
+Building takes a couple of seconds, so the API builds the graph in
+`executors.HEAVY_POOL` and installs it (see `ensure_prerequisite_graph` in
+main.py). `load_prerequisite_graph()` stores the built graph in a shared
+segment, so other worker processes map it instead of building their own
+copy. Lookups are then mapping reads that decode one entry each.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple
+
+import course_catalog
+from course_catalog import (
+    CourseCatalog,
+    CourseKey,
+    format_course_code,
+    load_course_catalog,
+    normalize_course_code,
+    courses_version,
+)
+from shared_segment import attach_or_build, shared_segments_enabled
+
+
+NodeId = Tuple[str, str]  # (campus, "PREFIX NUMBER"); campus "" = not in any catalog
+Expr = tuple
+
+# ------------- Parsing -------------
+
+# The clause ends at the next "; Key:" field (capitalized or snake_case key),
+# Kapiolani's ", Coreq:", or a line break.
+_CLAUSE_RE = re.compile(
+    r"(?i:\bpre(?:requisites?|req)(?:\s+or\s+co-?requisites?)?)\s*:\s*(.*?)"
+    r"(?=;\s*(?:[A-Z][A-Za-z /()'-]{0,40}|[a-z]+(?:_[a-z]+)+)\s*:|,\s*(?i:coreq)\s*:|\n|$)",
+    re.S,
+)
+_GLUED_RE = re.compile(r"(?<=[a-z0-9.])(AND|OR)(?=[A-Za-z0-9])")
+_INNER_GROUP_RE = re.compile(r"[(\[]([^()\[\]]*)[)\]]")
+_PLACEHOLDER_RE = re.compile(r"§(\d+)")
+_QUALIFIER_RES = [
+    re.compile(r"[\"“”‘’`]"),
+    re.compile(r"\b(?:with\s+)?(?:a\s+)?(?:minimum\s+)?grade\s+(?:of\s+)?[A-D][+-]?\s+or\s+(?:better|higher)\b", re.I),
+    re.compile(r"\b[A-D][+-]?\s+or\s+(?:better|higher)\b"),
+    re.compile(r"\bor\s+(?:better|higher|above)\b", re.I),
+    re.compile(r"\bor\s+concurrent(?:ly)?(?:\s+enrollment)?(?:\s+in)?\b", re.I),
+]
+_WAIVER_WORDS = re.compile(
+    r"consent|approval|permission|equivalen|placement|qualif|eligib|standing|experience|"
+    r"recommend|acceptance|admission|instructor|department|program|major",
+    re.I,
+)
+_NON_COURSE_ITEM = re.compile(r"placement|qualif|eligib", re.I)
+_TRAILING_WAIVER_RE = re.compile(r"(?:,\s*|\s+)or\s+([^,;]*)$", re.I)
+_ONE_OF_RE = re.compile(r"\b(?:one|any)\s+(?:course\s+)?(?:of|from)(?:\s+the\s+following)?\s*:?", re.I)
+_CONNECTOR_RE = re.compile(r"\s*,\s*(and|or)\b\s*|\s*(,)\s*|\s+(and/or|and|or)\b\s*", re.I)
+_SENTENCE_RE = re.compile(r";|\.(?=\s|$)")
+_CODE_RE = re.compile(r"\b([A-Za-z]{2,5})\s*(\d{2,3}[A-Za-z]{0,2})\b")
+_BARE_NUMBER_RE = re.compile(r"^(?:and\s+|or\s+)?(\d{2,3}[A-Za-z]{0,2})\b")
+_SLASH_NUMBER_RE = re.compile(r"/\s*(\d{2,3}[A-Za-z]{0,2})\b")
+
+
+def extract_prerequisite_clause(metadata: str) -> Optional[str]:
+    match = _CLAUSE_RE.search(metadata or "")
+    if not match:
+        return None
+    clause = match.group(1).strip(" .;,")
+    if not clause or clause in {"-", "None", "none", "N/A"}:
+        return None
+    return clause
+
+
+def _clean(clause: str) -> str:
+    text = _GLUED_RE.sub(lambda m: f" {m.group(1).lower()} ", clause)
+    for pattern in _QUALIFIER_RES:
+        text = pattern.sub(" ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class _ItemParser:
+    """Turns one item of text ("BIOL 171/171L", "205", "consent") into an expression."""
+
+    def __init__(self, prefixes: Set[str]) -> None:
+        self.prefixes = prefixes
+        self.last_prefix: Optional[str] = None
+        # Parsed "( ... )" groups, referenced from the text as "§<index>".
+        self.groups: List[Optional[Expr]] = []
+
+    def _prefix(self, word: str) -> Optional[str]:
+        upper = word.upper()
+        if upper not in self.prefixes:
+            return None
+        # Two-letter lowercase words ("as 12", "be 18") are English, not prefixes.
+        if len(word) < 3 and word != upper:
+            return None
+        return upper
+
+    def parse(self, item: str) -> Optional[Expr]:
+        """Expression for the courses in `item`; None when it names no course."""
+        item = item.strip(" .:")
+        placeholder = _PLACEHOLDER_RE.search(item)
+        if placeholder:
+            return self.groups[int(placeholder.group(1))]
+        if not item or _NON_COURSE_ITEM.search(item):
+            return None
+        codes: List[CourseKey] = []
+
+        def add_with_slashes(prefix: str, number: str, tail: str) -> None:
+            codes.append((prefix, number.upper()))
+            for slash in _SLASH_NUMBER_RE.finditer(tail):
+                if tail[: slash.start()].strip(" /0-9A-Za-z"):
+                    break
+                codes.append((prefix, slash.group(1).upper()))
+
+        bare = _BARE_NUMBER_RE.match(item)
+        if bare and self.last_prefix:
+            add_with_slashes(self.last_prefix, bare.group(1), item[bare.end():])
+        for match in _CODE_RE.finditer(item):
+            prefix = self._prefix(match.group(1))
+            if prefix is None:
+                continue
+            self.last_prefix = prefix
+            add_with_slashes(prefix, match.group(2), item[match.end():])
+        if not codes:
+            return None
+        unique = list(dict.fromkeys(codes))
+        if len(unique) == 1:
+            return ("course", unique[0])
+        # "BIOL 171/171L": lecture and lab go together; other lists are alternatives.
+        base = {re.sub(r"[A-Z]+$", "", number) for _, number in unique}
+        if len({p for p, _ in unique}) == 1 and len(base) == 1:
+            return ("all", tuple(("course", code) for code in unique))
+        return ("any", tuple(("course", code) for code in unique), False)
+
+
+def _combine(kind: str, children: List[Expr], waivable: bool = False) -> Expr:
+    """("all"|"any") node over `children`, merging nested nodes of the same kind."""
+    flat: List[Expr] = []
+    for child in children:
+        if child[0] == kind and (kind == "all" or not child[2]):
+            flat.extend(child[1])
+        else:
+            flat.append(child)
+    flat = list(dict.fromkeys(flat))
+    if len(flat) == 1 and not waivable:
+        return flat[0]
+    return ("all", tuple(flat)) if kind == "all" else ("any", tuple(flat), waivable)
+
+
+def _group(items: List[Optional[Expr]], connectors: List[str]) -> Optional[Expr]:
+    """Combine items joined by "and"/"or" connectors; "or" binds tighter."""
+    groups: List[List[Optional[Expr]]] = [[items[0]]]
+    for connector, item in zip(connectors, items[1:]):
+        if connector == "or":
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+    clauses: List[Expr] = []
+    for alternatives in groups:
+        courses = [expr for expr in alternatives if expr is not None]
+        if not courses:
+            continue
+        clauses.append(_combine("any", courses, waivable=len(courses) < len(alternatives)))
+    if not clauses:
+        return None
+    return _combine("all", clauses)
+
+
+def _resolve_commas(connectors: List[str]) -> List[str]:
+    """A bare comma in a list ending ", or X" means "or" ("A, B, or C"); otherwise "and"."""
+    resolved = list(connectors)
+    following = "and"
+    for index in range(len(resolved) - 1, -1, -1):
+        connector = resolved[index]
+        if connector == ",":
+            resolved[index] = following
+        elif connector.startswith(","):
+            following = resolved[index] = connector[1:]
+        else:
+            following = "and"
+    return resolved
+
+
+def _split(segment: str) -> Tuple[List[str], List[str]]:
+    items: List[str] = []
+    connectors: List[str] = []
+    position = 0
+    for match in _CONNECTOR_RE.finditer(segment):
+        items.append(segment[position:match.start()])
+        if match.group(1):
+            connectors.append("," + match.group(1).lower())
+        else:
+            word = (match.group(2) or match.group(3)).lower()
+            connectors.append("or" if word == "and/or" else word)
+        position = match.end()
+    items.append(segment[position:])
+    # Drop empty items left by leading/trailing connectors ("..., and one of").
+    while len(items) > 1 and not items[-1].strip(" .:"):
+        items.pop()
+        connectors.pop()
+    while len(items) > 1 and not items[0].strip(" .:"):
+        items.pop(0)
+        connectors.pop(0)
+    return items, connectors
+
+
+def _parse_text(text: str, parser: _ItemParser) -> Optional[Expr]:
+    """Parse cleaned text; bracketed groups that name courses become sub-expressions."""
+    while True:
+        group = _INNER_GROUP_RE.search(text)
+        if group is None:
+            break
+        replacement = " "
+        inner = group.group(1)
+        if _PLACEHOLDER_RE.search(inner) or any(parser._prefix(m.group(1)) for m in _CODE_RE.finditer(inner)):
+            parser.groups.append(_parse_text(inner, parser))
+            replacement = f" §{len(parser.groups) - 1} "
+        # Groups without courses are qualifiers: "(or concurrent)", "(Alpha)".
+        text = text[: group.start()] + replacement + text[group.end():]
+    clauses = [expr for expr in (_parse_segment(s, parser) for s in _SENTENCE_RE.split(text)) if expr is not None]
+    return _combine("all", clauses) if clauses else None
+
+
+def _parse_segment(segment: str, parser: _ItemParser) -> Optional[Expr]:
+    one_of = _ONE_OF_RE.search(segment)
+    if one_of:
+        head = _parse_segment(segment[: one_of.start()], parser) if segment[: one_of.start()].strip(" ,") else None
+        items, _ = _split(segment[one_of.end():])
+        choices = [parser.parse(item) for item in items]
+        tail = _group(choices, ["or"] * (len(choices) - 1))
+        parts = [expr for expr in (head, tail) if expr is not None]
+        return _combine("all", parts) if parts else None
+    items, connectors = _split(segment)
+    return _group([parser.parse(item) for item in items], _resolve_commas(connectors))
+
+
+def parse_prerequisites(metadata: str, prefixes: Set[str]) -> Tuple[Optional[Expr], bool]:
+    """(expression, waivable) for a course's metadata text.
+
+    `prefixes` is the set of known course prefixes; other "WORD 123" pairs
+    ("score of 3", "Grade 12") are ignored.
+    """
+    clause = extract_prerequisite_clause(metadata)
+    if clause is None:
+        return None, False
+    text = _clean(clause)
+    waivable = False
+    trailing = _TRAILING_WAIVER_RE.search(text)
+    if trailing and _WAIVER_WORDS.search(trailing.group(1)) and not _CODE_RE.search(trailing.group(1)):
+        waivable = True
+        text = text[: trailing.start()]
+    return _parse_text(text, _ItemParser(prefixes)), waivable
+
+
+def expression_courses(expr: Optional[Expr]) -> Iterable:
+    if expr is None:
+        return
+    if expr[0] == "course":
+        yield expr[1]
+    else:
+        for child in expr[1]:
+            yield from expression_courses(child)
+
+
+def _map_expression(expr: Expr, fn) -> Expr:
+    if expr[0] == "course":
+        return ("course", fn(expr[1]))
+    if expr[0] == "all":
+        return ("all", tuple(_map_expression(child, fn) for child in expr[1]))
+    return ("any", tuple(_map_expression(child, fn) for child in expr[1]), expr[2])
+
+
+# ------------- Graph -------------
+
+@dataclass
+class PrerequisiteGraph:
+    """Precomputed prerequisite relations; picklable so it can be built in another process.
+
+    The mappings are dicts, or `SharedMapping`s over a segment (see
+    `load_prerequisite_graph`); `waivable` then maps each waivable node to True.
+    """
+
+    version: str
+    titles: Mapping[NodeId, str]
+    expressions: Mapping[NodeId, Expr]
+    waivable: Iterable[NodeId]  # supports `in`
+    requires: Mapping[NodeId, Tuple[NodeId, ...]]
+    unlocks: Mapping[NodeId, Tuple[NodeId, ...]]
+    requires_all: Mapping[NodeId, FrozenSet[NodeId]]
+    unlocks_all: Mapping[NodeId, FrozenSet[NodeId]]
+    level: Mapping[NodeId, int]
+    chain_cost: Mapping[NodeId, int]
+    chain_choice: Mapping[NodeId, Tuple[NodeId, ...]]
+    campuses_by_code: Mapping[str, Tuple[str, ...]]
+    build_seconds: float = 0.0
+    edge_count: int = 0
+    max_level: int = 0
+
+    def resolve(self, campus: str, name: str) -> Optional[NodeId]:
+        """Node for a course name at `campus` (falls back like prerequisite references do)."""
+        key = normalize_course_code(name)
+        if key is None:
+            return None
+        code = format_course_code(key)
+        campuses = self.campuses_by_code.get(code, ())
+        for candidate in (campus, "manoa"):
+            if candidate in campuses:
+                return candidate, code
+        return (campuses[0], code) if campuses else None
+
+    def sort_nodes(self, nodes: Iterable[NodeId]) -> List[NodeId]:
+        return sorted(nodes, key=lambda node: (self.level.get(node, 0), node[1], node[0]))
+
+    def chain(self, node: NodeId) -> List[NodeId]:
+        """Cheapest set of courses to take before `node`, in a valid order."""
+        seen: Set[NodeId] = set()
+        stack = list(self.chain_choice.get(node, ()))
+        while stack:
+            current = stack.pop()
+            if current in seen or current == node:
+                continue
+            seen.add(current)
+            stack.extend(self.chain_choice.get(current, ()))
+        return self.sort_nodes(seen)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "courses": len(self.titles),
+            "with_prerequisites": len(self.expressions),
+            "edges": self.edge_count,
+            "max_level": self.max_level,
+            "build_seconds": round(self.build_seconds, 3),
+        }
+
+
+def _strongly_connected(nodes: Iterable[NodeId], edges: Dict[NodeId, Tuple[NodeId, ...]]) -> List[List[NodeId]]:
+    """Tarjan's SCCs, iteratively. Every edge target's component comes before its source's."""
+    index: Dict[NodeId, int] = {}
+    low: Dict[NodeId, int] = {}
+    on_stack: Set[NodeId] = set()
+    stack: List[NodeId] = []
+    components: List[List[NodeId]] = []
+    counter = 0
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(edges.get(root, ())))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for succ in successors:
+                if succ not in index:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(edges.get(succ, ()))))
+                    advanced = True
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], index[succ])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def _cheapest(expr: Expr, cost: Dict[NodeId, int]) -> Tuple[int, Tuple[NodeId, ...]]:
+    """(number of courses, chosen direct prerequisites) for the cheapest way to satisfy `expr`."""
+    kind = expr[0]
+    if kind == "course":
+        return cost.get(expr[1], 1), (expr[1],)
+    options = [_cheapest(child, cost) for child in expr[1]]
+    if kind == "any":
+        return min(options, key=lambda option: option[0])
+    chosen: Tuple[NodeId, ...] = ()
+    for _, nodes in options:
+        chosen += nodes
+    return sum(option[0] for option in options), tuple(dict.fromkeys(chosen))
+
+
+def build_prerequisite_graph(catalog: Optional[CourseCatalog] = None) -> PrerequisiteGraph:
+    """Parse every course's prerequisites and precompute the graph. CPU heavy; meant for `HEAVY_POOL`."""
+    started = time.perf_counter()
+    catalog = catalog or load_course_catalog()
+    prefixes = catalog.prefixes()
+    titles: Dict[NodeId, str] = {}
+    owners: Dict[CourseKey, List[str]] = {}
+    for record in catalog.records():
+        titles[(record.campus, record.code)] = record.title
+        owners.setdefault(record.key, []).append(record.campus)
+
+    def resolver(campus: str):
+        def resolve(key: CourseKey) -> NodeId:
+            code = format_course_code(key)
+            campuses = owners.get(key, ())
+            if campus in campuses:
+                return campus, code
+            if "manoa" in campuses:
+                return "manoa", code
+            if campuses:
+                return sorted(campuses)[0], code
+            titles.setdefault(("", code), "")
+            return "", code
+        return resolve
+
+    expressions: Dict[NodeId, Expr] = {}
+    waivable: Set[NodeId] = set()
+    for record in catalog.records():
+        expr, record_waivable = parse_prerequisites(record.metadata, prefixes)
+        node = (record.campus, record.code)
+        if record_waivable:
+            waivable.add(node)
+        if expr is None:
+            continue
+        resolved = _map_expression(expr, resolver(record.campus))
+        if node in set(expression_courses(resolved)):
+            resolved = _drop_self(resolved, node)
+            if resolved is None:
+                continue
+        expressions[node] = resolved
+
+    requires = {node: tuple(dict.fromkeys(expression_courses(expr))) for node, expr in expressions.items()}
+    unlocks_lists: Dict[NodeId, List[NodeId]] = {}
+    for node, prereqs in requires.items():
+        for prereq in prereqs:
+            unlocks_lists.setdefault(prereq, []).append(node)
+    unlocks = {node: tuple(sorted(targets)) for node, targets in unlocks_lists.items()}
+
+    components = _strongly_connected(titles, requires)
+    component_of = {member: i for i, component in enumerate(components) for member in component}
+
+    # Prerequisites first: every requirement's component precedes its dependants'.
+    requires_all: Dict[NodeId, FrozenSet[NodeId]] = {}
+    level: Dict[NodeId, int] = {}
+    cost: Dict[NodeId, int] = {}
+    choice: Dict[NodeId, Tuple[NodeId, ...]] = {}
+    for i, component in enumerate(components):
+        ancestors: Set[NodeId] = set()
+        component_level = 0
+        for member in component:
+            for prereq in requires.get(member, ()):
+                ancestors.add(prereq)
+                ancestors.update(requires_all.get(prereq, ()))
+                if component_of[prereq] != i:
+                    component_level = max(component_level, level[prereq] + 1)
+        frozen = frozenset(ancestors)
+        for member in component:
+            requires_all[member] = frozen
+            level[member] = component_level
+        for member in component:
+            expr = expressions.get(member)
+            if expr is None:
+                cost[member], choice[member] = 1, ()
+            else:
+                # Members of the same cycle are not priced yet and count as 1.
+                needed, chosen = _cheapest(expr, cost)
+                cost[member], choice[member] = needed + 1, chosen
+
+    unlocks_all: Dict[NodeId, FrozenSet[NodeId]] = {}
+    for i in range(len(components) - 1, -1, -1):
+        component = components[i]
+        descendants: Set[NodeId] = set()
+        for member in component:
+            for target in unlocks.get(member, ()):
+                descendants.add(target)
+                descendants.update(unlocks_all.get(target, ()))
+        frozen = frozenset(descendants)
+        for member in component:
+            unlocks_all[member] = frozen
+
+    return PrerequisiteGraph(
+        version=catalog.version,
+        titles=titles,
+        expressions=expressions,
+        waivable=frozenset(waivable),
+        requires=requires,
+        unlocks=unlocks,
+        requires_all={node: nodes for node, nodes in requires_all.items() if nodes},
+        unlocks_all={node: nodes for node, nodes in unlocks_all.items() if nodes},
+        level=level,
+        chain_cost=cost,
+        chain_choice={node: nodes for node, nodes in choice.items() if nodes},
+        campuses_by_code={format_course_code(key): tuple(sorted(c)) for key, c in owners.items()},
+        build_seconds=time.perf_counter() - started,
+        edge_count=sum(len(v) for v in requires.values()),
+        max_level=max(level.values(), default=0),
+    )
+
+
+_MAPPING_FIELDS = (
+    "titles", "expressions", "requires", "unlocks", "requires_all", "unlocks_all",
+    "level", "chain_cost", "chain_choice", "campuses_by_code",
+)
+
+
+def _graph_segment(graph: PrerequisiteGraph):
+    sections = {name: getattr(graph, name) for name in _MAPPING_FIELDS}
+    sections["waivable"] = dict.fromkeys(graph.waivable, True)
+    meta = {
+        "version": graph.version,
+        "build_seconds": graph.build_seconds,
+        "edge_count": graph.edge_count,
+        "max_level": graph.max_level,
+    }
+    return sections, meta
+
+
+def load_prerequisite_graph() -> PrerequisiteGraph:
+    """The graph for the current course files, from the shared segment when enabled."""
+    if not shared_segments_enabled():
+        return build_prerequisite_graph()
+    segment = attach_or_build(
+        "prerequisites",
+        courses_version(),
+        lambda: _graph_segment(build_prerequisite_graph()),
+        code_files=[__file__, course_catalog.__file__],
+    )
+    return PrerequisiteGraph(
+        **segment.meta,
+        waivable=segment.mapping("waivable"),
+        **{name: segment.mapping(name) for name in _MAPPING_FIELDS},
+    )
+
+
+def _drop_self(expr: Expr, node: NodeId) -> Optional[Expr]:
+    """Remove references to the course itself (e.g. "repeat of ICS 499")."""
+    if expr[0] == "course":
+        return None if expr[1] == node else expr
+    children = tuple(child for child in (_drop_self(c, node) for c in expr[1]) if child is not None)
+    if not children:
+        return None
+    return _combine(expr[0], list(children), waivable=bool(expr[2:] and expr[2]))
+
+
+def expression_to_json(expr: Optional[Expr]) -> Optional[Dict[str, object]]:
+    if expr is None:
+        return None
+    if expr[0] == "course":
+        campus, code = expr[1]
+        return {"course": code, "campus": campus or None}
+    key = "all_of" if expr[0] == "all" else "one_of"
+    result: Dict[str, object] = {key: [expression_to_json(child) for child in expr[1]]}
+    if expr[0] == "any" and expr[2]:
+        result["waivable"] = True
+    return result
+
+
+# ------------- Active graph -------------
+
+_graph: Optional[PrerequisiteGraph] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_CHECK_INTERVAL = 5.0  # seconds between source-file stat sweeps
+
+
+def install_prerequisite_graph(graph: PrerequisiteGraph) -> None:
+    global _graph, _checked_at
+    with _lock:
+        _graph = graph
+        _checked_at = time.monotonic()
+
+
+def prerequisite_graph_is_stale() -> bool:
+    global _checked_at
+    with _lock:
+        graph = _graph
+        if graph is None:
+            return True
+        now = time.monotonic()
+        if now - _checked_at < _CHECK_INTERVAL:
+            return False
+        _checked_at = now
+    return courses_version() != graph.version
+
+
+def get_prerequisite_graph() -> PrerequisiteGraph:
+    """Return the active graph, rebuilding it in-process if it is stale."""
+    if prerequisite_graph_is_stale():
+        install_prerequisite_graph(load_prerequisite_graph())
+    assert _graph is not None
+    return _graph
@@ -0,0 +1,193 @@
+"""
+Micro-batching for Keala's short section reactions (`/api/nathan-reaction`).
+
+Every completed section used to fire its own Gemini call for a single
+12-20 word sentence. `ReactionBatcher` collects the requests that arrive within
+a short window, hands them to a backend as one multi-item prompt, and resolves
+each waiting request with its own answer. Items the backend does not answer
+resolve to `None`, so the caller can use its contextual fallback.
+
+Backends are plain callables `(items) -> {item_index: text}` and run in a worker
+thread, so blocking HTTP clients are fine. `StubReactionBackend` answers
+locally and is meant for tests and offline demos.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReactionItem:
+    latest_section: str
+    latest_answer: str
+    answers_snapshot: str = ""
+    next_section: Optional[str] = None
+
+
+ReactionBackend = Callable[[Sequence[ReactionItem]], Dict[int, str]]
+
+
+class ReactionBatcher:
+    """Collects reaction requests and dispatches them in batches.
+
+    A batch opens with the first request and waits `window_ms`; while new
+    requests keep arriving it waits again, up to `max_wait_ms` in total. A
+    batch is sent immediately once it holds `max_batch` items.
+    """
+
+    def __init__(
+        self,
+        backend: ReactionBackend,
+        *,
+        window_ms: float = 10.0,
+        max_wait_ms: float = 40.0,
+        max_batch: int = 16,
+    ) -> None:
+        self.backend = backend
+        self.window = max(window_ms, 0.0) / 1000.0
+        self.max_wait = max(max_wait_ms, window_ms, 0.0) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[ReactionItem, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._full = asyncio.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "items": 0, "missing": 0, "errors": 0, "largest_batch": 0}
+
+    async def submit(self, item: ReactionItem) -> Optional[str]:
+        """Queue one item and wait for its reaction (or `None` if unanswered)."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._full.clear()
+            self._flush_task = loop.create_task(self._collect_and_flush())
+        return await future
+
+    async def _collect_and_flush(self) -> None:
+        started = time.monotonic()
+        seen = 0
+        while len(self._pending) < self.max_batch:
+            elapsed = time.monotonic() - started
+            remaining = self.max_wait - elapsed
+            if remaining <= 0 or (seen and len(self._pending) == seen):
+                break
+            seen = len(self._pending)
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=min(self.window, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+        batch = self._pending[: self.max_batch]
+        self._pending = self._pending[self.max_batch :]
+        self._full.clear()
+        if self._pending:
+            # Overflow from a full batch starts the next window right away.
+            self._flush_task = asyncio.get_running_loop().create_task(self._collect_and_flush())
+        await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[Tuple[ReactionItem, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        answers: Dict[int, str] = {}
+        failed = False
+        try:
+            answers = await asyncio.to_thread(self.backend, items) or {}
+        except Exception as err:  # noqa: BLE001
+            LOGGER.warning("Keala reaction batch error: %s", err)
+            failed = True
+
+        missing = 0
+        for idx, (_, future) in enumerate(batch):
+            text = (answers.get(idx) or "").strip()
+            if len(text) < 5:
+                text = ""
+                missing += 1
+            if not future.done():
+                future.set_result(text or None)
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["missing"] += missing
+            self._stats["errors"] += int(failed)
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            snapshot: Dict[str, float] = dict(self._stats)
+        batches = snapshot["batches"] or 1
+        snapshot["mean_batch_size"] = round(snapshot["items"] / batches, 2)
+        return snapshot
+
+
+def build_batch_prompt(items: Sequence[ReactionItem]) -> str:
+    """One prompt covering every item, asking for id-tagged JSON answers."""
+    lines = [
+        "You are Keala, a friendly University of Hawaii guide.",
+        f"Below are {len(items)} independent student updates, each with an id.",
+        "For EACH update write ONE crisp sentence between 12 and 20 words (no emojis).",
+        "Cite up to two concrete ideas from that student's latest answer (summarize lists instead of copying them) and keep it encouraging, specific, and conversational.",
+        "If a next section is given, close that sentence with a quick nudge toward it.",
+        'Return ONLY JSON: {"reactions":[{"id":1,"text":"..."}]} with one entry per id.',
+        "",
+    ]
+    for idx, item in enumerate(items, start=1):
+        lines.append(f"[{idx}] Section: {item.latest_section}")
+        lines.append(f"    Latest answer: {item.latest_answer}")
+        if item.answers_snapshot:
+            lines.append(f"    Other responses: {item.answers_snapshot}")
+        if item.next_section:
+            lines.append(f"    Next section: {item.next_section}")
+    return "\n".join(lines)
+
+
+def parse_batch_answers(parsed: object, count: int) -> Dict[int, str]:
+    """Map the model's `{"reactions": [{"id", "text"}]}` JSON back to item indexes."""
+    entries = parsed.get("reactions") if isinstance(parsed, dict) else parsed
+    answers: Dict[int, str] = {}
+    if not isinstance(entries, list):
+        return answers
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            idx = int(entry.get("id")) - 1
+        except (TypeError, ValueError):
+            continue
+        text = str(entry.get("text") or "").strip()
+        if 0 <= idx < count and text:
+            answers[idx] = text
+    return answers
+
+
+class StubReactionBackend:
+    """Local backend that answers without calling Vertex.
+
+    `drop_every=n` leaves every n-th item unanswered to exercise the fallback.
+    `calls` records the batch sizes it has seen.
+    """
+
+    def __init__(self, *, drop_every: int = 0, delay_ms: float = 0.0) -> None:
+        self.drop_every = drop_every
+        self.delay = delay_ms / 1000.0
+        self.calls: List[int] = []
+
+    def __call__(self, items: Sequence[ReactionItem]) -> Dict[int, str]:
+        self.calls.append(len(items))
+        if self.delay:
+            time.sleep(self.delay)
+        answers: Dict[int, str] = {}
+        for idx, item in enumerate(items):
+            if self.drop_every and (idx + 1) % self.drop_every == 0:
+                continue
+            nudge = f" Head to {item.next_section} next." if item.next_section else ""
+            answers[idx] = f"Nice work on your {item.latest_section} answer, keep building on it.{nudge}"
+        return answers
@@ -0,0 +1,293 @@
+"""
+On-demand profiling of single requests.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_ADMIN_TOKEN>`,
+or at random with probability `PROFILE_SAMPLE_RATE`. A profile has two parts:
+
+- a statistical profile: a sampler thread reads the stacks of the threads
+  working on the request every `PROFILE_INTERVAL_MS` and keeps them in folded
+  form (`frame;frame;frame count`). `flamegraph.pl`, speedscope and inferno
+  all read that format,
+- a span breakdown: `span(name)` blocks placed around the interesting phases
+  (Vertex calls, catalog loading, campus matching, serialization) and around
+  every `CPU_POOL` job run for the request.
+
+The event loop thread is sampled for the whole request. Other requests on the
+loop at the same time show up in its samples too. A worker thread is sampled
+only while it is inside a span for this request. The last `PROFILE_BUFFER`
+profiles are kept in memory. Profiled responses carry `X-Profile-Id`, and
+`/api/admin/profiles` serves the stored profiles (see main.py). Those
+endpoints also need the token, so with only a sample rate configured the
+stored profiles cannot be read.
+
+When neither setting is present, main.py never installs the middleware. Then
+`span()` costs one ContextVar lookup and no sampler thread exists.
+"""
+from __future__ import annotations
+
+import contextvars
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, List, Optional, Set
+
+ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "").strip()
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+INTERVAL_SECONDS = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+BUFFER_SIZE = int(os.environ.get("PROFILE_BUFFER", "20"))
+MAX_STACK_DEPTH = 64
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+# The admin endpoints take the same token header; reading profiles must not record new ones.
+UNPROFILED_PREFIXES = ("/api/admin/",)
+_PROFILE_HEADER_BYTES = PROFILE_HEADER.encode()
+
+_ACTIVE: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("request_profile", default=None)
+_NULL_SPAN = nullcontext()
+
+
+def profiling_enabled() -> bool:
+    return bool(ADMIN_TOKEN) or SAMPLE_RATE > 0
+
+
+def token_matches(value: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and hmac.compare_digest((value or "").encode(), ADMIN_TOKEN.encode())
+
+
+@dataclass
+class Span:
+    name: str
+    thread: str
+    start: float  # seconds since the request started
+    seconds: float
+
+
+@dataclass(eq=False)
+class RequestProfile:
+    id: str
+    method: str
+    path: str
+    trigger: str  # "header" or "sample"
+    started_at: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    route: Optional[str] = None
+    status: Optional[int] = None
+    seconds: Optional[float] = None
+    samples: int = 0
+    spans: List[Span] = field(default_factory=list)
+    stacks: Counter = field(default_factory=Counter)
+    # thread ident -> number of open spans (the loop thread is pinned with 1)
+    threads: Dict[int, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def enter_thread(self) -> None:
+        ident = threading.get_ident()
+        with self.lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+
+    def leave_thread(self) -> None:
+        ident = threading.get_ident()
+        with self.lock:
+            remaining = self.threads.get(ident, 1) - 1
+            if remaining:
+                self.threads[ident] = remaining
+            else:
+                self.threads.pop(ident, None)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        self.enter_thread()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self.leave_thread()
+            with self.lock:
+                self.spans.append(Span(name, threading.current_thread().name, started - self.started, finished - started))
+
+    def folded(self) -> str:
+        """Collapsed stacks, one `frame;frame;frame count` line per distinct stack."""
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": round(self.started_at, 3),
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "samples": self.samples,
+        }
+
+    def to_dict(self) -> Dict[str, object]:
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        totals: Dict[str, float] = {}
+        for span in spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.seconds
+        return {
+            **self.summary(),
+            "interval_seconds": INTERVAL_SECONDS,
+            "span_totals": {name: round(seconds, 4) for name, seconds in sorted(totals.items(), key=lambda kv: -kv[1])},
+            "spans": [
+                {"name": span.name, "thread": span.thread, "start": round(span.start, 4), "seconds": round(span.seconds, 4)}
+                for span in spans
+            ],
+        }
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _ACTIVE.get()
+
+
+def span(name: str):
+    """Context manager timing `name` for the active profile; a no-op otherwise."""
+    profile = _ACTIVE.get()
+    if profile is None:
+        return _NULL_SPAN
+    return profile.span(name)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _fold(frame, thread_name: str) -> str:
+    labels: List[str] = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class Profiler:
+    """Keeps the active profiles, the sampler thread and the bounded history."""
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE, interval: float = INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._recent: Deque[RequestProfile] = deque(maxlen=max(1, buffer_size))
+        self._active: Set[RequestProfile] = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self, method: str, path: str, trigger: str) -> RequestProfile:
+        profile = RequestProfile(id=f"{int(time.time())}-{next(self._ids)}", method=method, path=path, trigger=trigger)
+        profile.enter_thread()
+        with self._lock:
+            self._active.add(profile)
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+        self._wake.set()
+        return profile
+
+    def finish(self, profile: RequestProfile) -> None:
+        profile.seconds = time.perf_counter() - profile.started
+        with self._lock:
+            self._active.discard(profile)
+            self._recent.append(profile)
+
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._wake.clear()  # under the lock, so a concurrent start() still wakes us
+            if not active:
+                if not self._wake.wait(timeout=30):
+                    with self._lock:
+                        if not self._active:
+                            self._sampler = None
+                            return
+                continue
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for profile in active:
+                with profile.lock:
+                    idents = [ident for ident in profile.threads if ident != me]
+                stacks = [_fold(frames[ident], names.get(ident, str(ident))) for ident in idents if ident in frames]
+                with profile.lock:
+                    profile.samples += 1
+                    profile.stacks.update(stacks)
+            del frames
+            time.sleep(self.interval)
+
+    def recent(self) -> List[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return next((profile for profile in self.recent() if profile.id == profile_id), None)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": profiling_enabled(),
+                "sample_rate": SAMPLE_RATE,
+                "stored": len(self._recent),
+                "buffer_size": self._recent.maxlen,
+                "active": len(self._active),
+            }
+
+
+PROFILER = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware starting a profile for header-requested or sampled HTTP requests."""
+
+    def __init__(self, app, profiler: Profiler = PROFILER) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    def _trigger(self, scope) -> Optional[str]:
+        if ADMIN_TOKEN:
+            for name, value in scope["headers"]:
+                if name == _PROFILE_HEADER_BYTES:
+                    return "header" if token_matches(value.decode("latin-1")) else None
+        if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        trigger = None
+        if scope["type"] == "http" and not scope["path"].startswith(UNPROFILED_PREFIXES):
+            trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.start(scope["method"], scope["path"], trigger)
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER, profile.id.encode())]}
+            await send(message)
+
+        token = _ACTIVE.set(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _ACTIVE.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None)
+            profile.leave_thread()
+            self.profiler.finish(profile)
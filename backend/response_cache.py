@@ -0,0 +1,156 @@
+"""
+HTTP response caching for deterministic JSON endpoints.
+
+`/api/generate-path` is a pure function of (major, campus, options, catalog
+version), and the campus-matching half of `/api/map-insights` depends only
+on the recommended majors, the student's inputs and the catalog version.
+`ResponseCache.respond()` wraps such handlers:
+
+- the cache key is a SHA-1 of the route and the normalized request payload,
+- the strong ETag is `"<catalog version>-<key>"`, so any catalog change
+  produces new tags. On GET and HEAD, a matching `If-None-Match` answers
+  `304 Not Modified` and `Cache-Control` is set per route,
+- browsers never cache POST responses, so the POST forms of these routes
+  use this as a server-side cache only: they get no validators and
+  `If-None-Match` is ignored (GET /api/generate-path is the cacheable form),
+- the serialized body is kept in a bounded LRU (entries and bytes), so a
+  repeated request skips both the handler and JSON encoding; compressed
+  variants are memoized next to it (see `response_encoding`).
+
+Responses the handler marks as failures (an `"error"` key) are never cached.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+from request_profiler import span
+from response_encoding import dumps, encoded_response, strip_encoding_suffix
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = strip_encoding_suffix(candidate.strip().removeprefix("W/"))
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def _conditional(request: Request) -> bool:
+    # RFC 9110 13.1.2: If-None-Match on other methods means 412, not 304, and
+    # POST responses are not cached by browsers anyway.
+    return request.method in ("GET", "HEAD")
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether a GET/HEAD request's `If-None-Match` lets us answer 304."""
+    return _conditional(request) and etag_matches(request.headers.get("if-none-match"), etag)
+
+
+def validator_headers(request: Request, etag: str, cache_control: str) -> Dict[str, str]:
+    """ETag and Cache-Control for GET/HEAD; nothing for methods browsers don't cache."""
+    return {"ETag": etag, "Cache-Control": cache_control} if _conditional(request) else {}
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    # encoding -> compressed body, filled on first use
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+
+class ResponseCache:
+    """LRU of serialized responses, bounded by entry count and total bytes."""
+
+    def __init__(self, *, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "not_modified": 0, "uncacheable": 0, "evictions": 0}
+
+    @staticmethod
+    def key(route: str, payload: Any) -> str:
+        normalized = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha1(f"{route}\n{normalized}".encode("utf-8")).hexdigest()[:20]
+
+    def _get(self, key: str, etag: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.etag != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key: str, entry: CachedResponse) -> None:
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.body)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self._counters["evictions"] += 1
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    async def respond(
+        self,
+        request: Request,
+        *,
+        route: str,
+        payload: Any,
+        version: str,
+        produce: Callable[[], Awaitable[Dict[str, Any]]],
+        cache_control: str,
+    ) -> Response:
+        """Serve `produce()` for `payload`, from cache or with a 304 when possible."""
+        key = self.key(route, payload)
+        etag = f'"{version}-{key}"'
+        headers = validator_headers(request, etag, cache_control)
+        if not_modified(request, etag):
+            self._count("not_modified")
+            return Response(status_code=304, headers=headers)
+        entry = self._get(key, etag)
+        if entry is not None:
+            self._count("hits")
+            return encoded_response(request, entry.body, headers=headers, variants=entry.variants)
+        self._count("misses")
+        result = await produce()
+        with span("serialize"):
+            body = dumps(result)
+        if isinstance(result, dict) and result.get("error"):
+            self._count("uncacheable")
+            return encoded_response(request, body, headers={"Cache-Control": "no-store"})
+        entry = CachedResponse(body=body, etag=etag)
+        self._put(key, entry)
+        return encoded_response(request, body, headers=headers, variants=entry.variants)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"] + self._counters["not_modified"]
+            served = self._counters["hits"] + self._counters["not_modified"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                **self._counters,
+                "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            }
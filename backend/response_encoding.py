@@ -0,0 +1,138 @@
+"""
+Fast JSON encoding and compression for the large catalog responses.
+
+`/api/generate-path` (hundreds of nodes with nested positions), the
+`allCampuses` list of `/api/map-insights` and the catalog endpoints are
+serialized here instead of by FastAPI's default encoder:
+
+- `dumps()` uses orjson when it is installed and the standard library
+  otherwise (same bytes up to float formatting),
+- `encoded_response()` compresses bodies of at least `COMPRESS_MIN_BYTES`
+  with brotli (when the `brotli` package is installed) or gzip, following
+  the client's `Accept-Encoding`, and can memoize the compressed variants
+  (see `response_cache.CachedResponse`).
+
+Both optional packages are listed in requirements.txt; the module works
+without them. `benchmark_responses.py` measures the effect.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from typing import Any, Dict, Mapping, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from request_profiler import span
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+
+COMPRESS_MIN_BYTES = int(os.environ.get("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("RESPONSE_BROTLI_QUALITY", "5"))
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with `dumps()`."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def parse_q_values(header: Optional[str]) -> Dict[str, float]:
+    """Token -> q value from an `Accept`-style header ("gzip;q=0.5, br" or "image/webp,*/*;q=0.8")."""
+    accepted: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[parts[0].lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """"br" or "gzip" if the client accepts it (and we can produce it), else None."""
+    accepted = parse_q_values(accept_encoding)
+    if brotli is not None and accepted.get("br", 0.0) > 0:
+        return "br"
+    if accepted.get("gzip", 0.0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output byte-identical for identical bodies.
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def strip_encoding_suffix(etag: str) -> str:
+    """`"abc-gzip"` -> `"abc"`, so a tag from a compressed response revalidates its body."""
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[: -len(suffix)] + '"'
+    return etag
+
+
+def encoded_response(
+    request: Request,
+    body: bytes,
+    *,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+    variants: Optional[Dict[str, bytes]] = None,
+) -> Response:
+    """JSON `body`, compressed when large enough and accepted by the client.
+
+    `variants` (encoding -> compressed bytes) is read and filled so a cached
+    body is compressed only once per encoding.
+    """
+    response_headers = dict(headers or {})
+    response_headers["Vary"] = "Accept-Encoding"
+    encoding = negotiate_encoding(request.headers.get("accept-encoding")) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding is not None:
+        compressed = variants.get(encoding) if variants is not None else None
+        if compressed is None:
+            with span(f"compress:{encoding}"):
+                compressed = compress(body, encoding)
+            if variants is not None:
+                variants[encoding] = compressed
+        if len(compressed) < len(body):
+            body = compressed
+            response_headers["Content-Encoding"] = encoding
+            etag = response_headers.get("ETag")
+            if etag and etag.endswith('"'):
+                # A strong ETag names one representation; see `strip_encoding_suffix`.
+                response_headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=response_headers)
+
+
+def fast_json(request: Request, payload: Any, *, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> Response:
+    """`dumps()` + `encoded_response()` for handlers that build their payload per request."""
+    return encoded_response(request, dumps(payload), status_code=status_code, headers=headers)
@@ -0,0 +1,380 @@
+"""
+Read-only, mmap-backed data segments shared by every worker process.
+
+With several uvicorn workers each process used to parse the course catalogs,
+the pathway files and the prerequisite graph and keep its own copy (about
+35 MB per worker). A segment stores such data once, in a file under
+`SHARED_SEGMENT_DIR` (a private directory in tmpfs `/dev/shm` by default):
+
+- `attach_or_build(name, version, build)` maps `<name>-<version>.seg` when it
+  exists. Otherwise one process builds and writes it under an flock while
+  the others wait, and then every process maps the same file.
+- `SharedMapping` and `SharedSequence` read the segment in place. Keys are
+  found through a crc32 hash table of entry offsets, and values are
+  unpickled only when accessed. The pages stay shared, so resident memory
+  per added worker is close to zero.
+- Anything holding a segment pickles as the file's path. A catalog built in
+  `HEAVY_POOL` therefore reaches the parent without copying the data.
+
+When a newer version is written, older ones are unlinked. Processes that
+still map an old file keep valid pages until they switch. Set
+`SHARED_SEGMENTS=0` to turn this off; the builders then return plain dicts
+as before. Sharing is also off on platforms without `fcntl`.
+
+    python shared_segment.py    # build every segment ahead of the workers
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import zlib
+from functools import lru_cache
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: no cross-process build lock, so no sharing
+    fcntl = None
+
+
+MAGIC = b"UHSEG001"
+_HEADER = struct.Struct("<8sQQ")  # magic, table-of-contents offset, length
+_MAPPING_ENTRY = struct.Struct("<IIII")  # key offset, key length, value offset, value length
+_SEQUENCE_ENTRY = struct.Struct("<II")  # value offset, value length
+_SLOT = struct.Struct("<I")  # entry index + 1; 0 = empty
+
+Sections = Dict[str, Any]  # section name -> Mapping or Sequence of picklable values
+
+
+def shared_segments_enabled() -> bool:
+    return fcntl is not None and os.environ.get("SHARED_SEGMENTS", "1") != "0"
+
+
+def segment_dir() -> Path:
+    """Directory for segment files, created private to this user."""
+    configured = os.environ.get("SHARED_SEGMENT_DIR")
+    if configured:
+        path = Path(configured)
+    else:
+        base = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+        path = base / f"uh-pathfinder-{os.getuid()}"
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    stat = path.stat()
+    # Segments hold pickles, so only read them from a directory nobody else can write.
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+        raise PermissionError(f"Shared segment directory {path} must be owned by this user and not group/world writable")
+    return path
+
+
+@lru_cache(maxsize=None)
+def source_digest(*files: str) -> str:
+    """Hash of source files' contents, so segments are rebuilt when the building code changes."""
+    digest = hashlib.sha1()
+    for file in files:
+        digest.update(Path(file).read_bytes())
+    return digest.hexdigest()[:8]
+
+
+# ------------- Encoding -------------
+
+# Mapping keys are str or flat tuples of str (course keys, graph node ids).
+_TUPLE_MARK, _TUPLE_SEP = "\x1e", "\x1f"
+
+
+def _encode_key(key: Any) -> bytes:
+    if isinstance(key, tuple):
+        return (_TUPLE_MARK + _TUPLE_SEP.join(key)).encode("utf-8")
+    return key.encode("utf-8")
+
+
+def _decode_key(raw: bytes) -> Any:
+    text = raw.decode("utf-8")
+    if text.startswith(_TUPLE_MARK):
+        return tuple(text[1:].split(_TUPLE_SEP))
+    return text
+
+
+def _slot_count(count: int) -> int:
+    # Power of two, at most half full, so probes stay short.
+    slots = 1
+    while slots < 2 * count:
+        slots *= 2
+    return slots
+
+
+def write_segment(path: Path, sections: Sections, meta: Optional[Dict[str, Any]] = None) -> None:
+    """Write `sections` (each a Mapping or a Sequence) and JSON `meta` to `path`."""
+    toc: Dict[str, Any] = {"meta": meta or {}, "sections": {}}
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, 0, 0))
+        for name, data in sections.items():
+            if isinstance(data, Mapping):
+                entries = sorted((_encode_key(k), pickle.dumps(v, pickle.HIGHEST_PROTOCOL)) for k, v in data.items())
+                kind, entry_struct = "mapping", _MAPPING_ENTRY
+            else:
+                entries = [(b"", pickle.dumps(v, pickle.HIGHEST_PROTOCOL)) for v in data]
+                kind, entry_struct = "sequence", _SEQUENCE_ENTRY
+            table_offset = f.tell()
+            section = {"kind": kind, "offset": table_offset, "count": len(entries)}
+            position = table_offset + entry_struct.size * len(entries)
+            slots = b""
+            if kind == "mapping":
+                section["slots_offset"], section["slots"] = position, _slot_count(len(entries))
+                slots = _slot_table([key for key, _ in entries], section["slots"])
+                position += len(slots)
+            table = bytearray()
+            for key, value in entries:
+                if kind == "mapping":
+                    table += _MAPPING_ENTRY.pack(position, len(key), position + len(key), len(value))
+                else:
+                    table += _SEQUENCE_ENTRY.pack(position, len(value))
+                position += len(key) + len(value)
+            f.write(table)
+            f.write(slots)
+            for key, value in entries:
+                f.write(key)
+                f.write(value)
+            toc["sections"][name] = section
+        toc_bytes = json.dumps(toc).encode("utf-8")
+        toc_offset = f.tell()
+        f.write(toc_bytes)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, toc_offset, len(toc_bytes)))
+
+
+def _slot_table(keys, slot_count: int) -> bytes:
+    slots = [0] * slot_count
+    mask = slot_count - 1
+    for index, key in enumerate(keys):
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = index + 1
+    return struct.pack(f"<{slot_count}I", *slots)
+
+
+# ------------- Reading -------------
+
+class Segment:
+    """A mapped segment file. Create with `attach()`."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, toc_offset, toc_length = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared segment")
+        toc = json.loads(self._mm[toc_offset:toc_offset + toc_length])
+        self.meta: Dict[str, Any] = toc["meta"]
+        self._sections: Dict[str, Dict[str, Any]] = toc["sections"]
+
+    def __reduce__(self):
+        return attach, (str(self.path),)
+
+    def sections(self) -> Iterable[str]:
+        return list(self._sections)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._sections
+
+    def mapping(self, name: str) -> "SharedMapping":
+        section = self._sections[name]
+        if section["kind"] != "mapping":
+            raise TypeError(f"Section {name} is a {section['kind']}")
+        return SharedMapping(self, name, section["offset"], section["count"], section["slots_offset"], section["slots"])
+
+    def sequence(self, name: str) -> "SharedSequence":
+        section = self._sections[name]
+        if section["kind"] != "sequence":
+            raise TypeError(f"Section {name} is a {section['kind']}")
+        return SharedSequence(self, name, section["offset"], section["count"])
+
+    def size(self) -> int:
+        return len(self._mm)
+
+
+class SharedMapping(Mapping):
+    """Read-only mapping over a segment section; values are unpickled on access."""
+
+    def __init__(self, segment: Segment, name: str, offset: int, count: int, slots_offset: int, slots: int) -> None:
+        self._segment = segment
+        self._mm = segment._mm
+        self._name = name
+        self._offset = offset
+        self._count = count
+        self._slots_offset = slots_offset
+        self._mask = slots - 1
+
+    def __reduce__(self):
+        return _attach_section, (str(self._segment.path), self._name)
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int]:
+        return _MAPPING_ENTRY.unpack_from(self._mm, self._offset + index * _MAPPING_ENTRY.size)
+
+    def _find(self, key: Any) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            target = _encode_key(key)
+        except (AttributeError, TypeError):  # not a str / tuple-of-str key
+            return None
+        mm = self._mm
+        slot = zlib.crc32(target) & self._mask
+        while True:
+            index = _SLOT.unpack_from(mm, self._slots_offset + slot * _SLOT.size)[0]
+            if not index:
+                return None
+            entry = self._entry(index - 1)
+            if entry[1] == len(target) and mm[entry[0]:entry[0] + entry[1]] == target:
+                return entry
+            slot = (slot + 1) & self._mask
+
+    def _value(self, entry: Tuple[int, int, int, int]) -> Any:
+        return pickle.loads(self._mm[entry[2]:entry[2] + entry[3]])
+
+    def __getitem__(self, key: Any) -> Any:
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+        return self._value(entry)
+
+    def __contains__(self, key: object) -> bool:
+        return self._find(key) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Any]:
+        mm = self._mm
+        for index in range(self._count):
+            entry = self._entry(index)
+            yield _decode_key(mm[entry[0]:entry[0] + entry[1]])
+
+    # One pass over the table instead of a lookup per key.
+    def values(self) -> Iterator[Any]:  # type: ignore[override]
+        for index in range(self._count):
+            yield self._value(self._entry(index))
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:  # type: ignore[override]
+        mm = self._mm
+        for index in range(self._count):
+            entry = self._entry(index)
+            yield _decode_key(mm[entry[0]:entry[0] + entry[1]]), self._value(entry)
+
+
+class SharedSequence(Sequence):
+    """Read-only sequence over a segment section; items are unpickled on access."""
+
+    def __init__(self, segment: Segment, name: str, offset: int, count: int) -> None:
+        self._segment = segment
+        self._mm = segment._mm
+        self._name = name
+        self._offset = offset
+        self._count = count
+
+    def __reduce__(self):
+        return _attach_section, (str(self._segment.path), self._name)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        offset, length = _SEQUENCE_ENTRY.unpack_from(self._mm, self._offset + index * _SEQUENCE_ENTRY.size)
+        return pickle.loads(self._mm[offset:offset + length])
+
+
+# ------------- Attaching -------------
+
+_attached: Dict[str, Segment] = {}
+_attached_lock = threading.Lock()
+
+
+def attach(path: str) -> Segment:
+    """The mapped segment at `path`; each file is mapped once per process."""
+    with _attached_lock:
+        segment = _attached.get(str(path))
+        if segment is None:
+            segment = Segment(Path(path))
+            name = segment.path.name.rsplit("-", 1)[0]
+            # Forget older versions of the same segment; objects still using them keep their map.
+            for other in [p for p in _attached if Path(p).name.rsplit("-", 1)[0] == name]:
+                del _attached[other]
+            _attached[str(path)] = segment
+        return segment
+
+
+def _attach_section(path: str, name: str):
+    segment = attach(path)
+    return segment.mapping(name) if segment._sections[name]["kind"] == "mapping" else segment.sequence(name)
+
+
+def attach_or_build(
+    name: str,
+    version: str,
+    build: Callable[[], Tuple[Sections, Dict[str, Any]]],
+    *,
+    code_files: Iterable[str] = (),
+) -> Segment:
+    """Map segment `name` at `version`, building it first if no process has yet.
+
+    `build()` returns `(sections, meta)`. This module and `code_files` are
+    hashed into the file name, so a change to the format or the building
+    code also forces a rebuild.
+    """
+    directory = segment_dir()
+    tag = f"{version}.{source_digest(__file__, *code_files)}"
+    path = directory / f"{name}-{tag}.seg"
+    if str(path) in _attached or path.exists():
+        return attach(str(path))
+    with open(directory / f"{name}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not path.exists():
+                sections, meta = build()
+                partial = directory / f".{name}-{tag}.{os.getpid()}.tmp"
+                write_segment(partial, sections, meta)
+                os.replace(partial, path)
+                for old in directory.glob(f"{name}-*.seg"):
+                    if old != path:
+                        old.unlink(missing_ok=True)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return attach(str(path))
+
+
+def segment_stats() -> Dict[str, object]:
+    """Segments mapped by this process, for `/api/metrics`."""
+    with _attached_lock:
+        segments = list(_attached.values())
+    return {
+        "enabled": shared_segments_enabled(),
+        "segments": {segment.path.name: segment.size() for segment in segments},
+    }
+
+
+if __name__ == "__main__":
+    from course_catalog import load_course_catalog
+    from freshman_courses import pathway_campuses
+    from pathways import load_pathways
+    from prerequisite_graph import load_prerequisite_graph
+    from shared_segment import segment_stats  # the module instance the loaders used, not __main__
+
+    load_course_catalog()
+    load_prerequisite_graph()
+    for campus in pathway_campuses():
+        load_pathways(campus)
+    for file, size in segment_stats()["segments"].items():
+        print(f"{file}: {size / 1e6:.1f} MB")
@@ -0,0 +1,184 @@
+"""
+Streaming speech recognition for the `/ws/speech-to-text` WebSocket.
+
+The browser sends audio frames while the student is still talking; a
+recognizer turns them into events that are pushed straight back:
+
+    {"type": "interim", "transcript": "...", "confidence": 0.0}
+    {"type": "final",   "transcript": "...", "confidence": 0.93, "all_results": [...]}
+
+Recognizers share one small interface (`push()` audio, `finish()` to flush)
+and report events through an async `emit` callback:
+
+- `RestIncrementalRecognizer` re-recognizes the audio received so far with the
+  same REST `speech:recognize` call as `transcribe_audio` whenever enough new
+  audio has arrived, so interim text shows up while the student speaks, then
+  runs one final pass over the whole clip when the stream ends. Every interim
+  pass is a billed recognition of the whole buffer, which is why main.py only
+  enables it with `SPEECH_STREAMING_BACKEND=rest`. The final pass can be
+  handed to `final_transcribe` (main.py uses the upload path's preprocessing
+  and transcript cache).
+- `FakeStreamingRecognizer` reveals a fixed script as bytes arrive, for
+  offline tests and demos.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from chat_to_voice_attachment import SpeechToTextConfig, SpeechToTextError, transcribe_audio
+
+
+LOGGER = logging.getLogger(__name__)
+
+Emit = Callable[[Dict[str, object]], Awaitable[None]]
+
+
+class StreamingRecognizer(ABC):
+    """Base class: collect audio frames, emit interim/final transcript events."""
+
+    def __init__(self, config: SpeechToTextConfig, emit: Emit, *, max_bytes: int = 10 * 1024 * 1024) -> None:
+        self.config = config
+        self.emit = emit
+        self.max_bytes = max_bytes
+        self.audio = bytearray()
+
+    async def push(self, chunk: bytes) -> None:
+        if len(self.audio) + len(chunk) > self.max_bytes:
+            raise SpeechToTextError(f"Audio stream exceeds {self.max_bytes} bytes")
+        self.audio += chunk
+        await self.on_audio()
+
+    async def on_audio(self) -> None:
+        """Called after each pushed chunk; recognizers without interim results ignore it."""
+
+    @abstractmethod
+    async def finish(self) -> None:
+        """Emit the final event for the audio pushed so far."""
+
+    async def close(self) -> None:
+        pass
+
+
+class RestIncrementalRecognizer(StreamingRecognizer):
+    """Interim results from periodic REST recognition of the buffered audio.
+
+    At most one recognition runs at a time; new audio that arrives meanwhile is
+    picked up by the next pass. Works for WEBM_OPUS because MediaRecorder
+    timeslices concatenate into a valid stream.
+    """
+
+    def __init__(
+        self,
+        config: SpeechToTextConfig,
+        emit: Emit,
+        *,
+        token_fetcher: Callable[[], str],
+        interim_every_bytes: int = 24 * 1024,
+        max_bytes: int = 10 * 1024 * 1024,
+        final_transcribe: Optional[Callable[[bytes], Awaitable[Dict[str, Any]]]] = None,
+    ) -> None:
+        super().__init__(config, emit, max_bytes=max_bytes)
+        self.token_fetcher = token_fetcher
+        self.final_transcribe = final_transcribe
+        self.interim_every_bytes = interim_every_bytes
+        self._recognized_bytes = 0
+        self._task: Optional[asyncio.Task] = None
+        self._token: Optional[str] = None
+
+    async def _recognize(self, size: int) -> dict:
+        if self._token is None:
+            self._token = await asyncio.to_thread(self.token_fetcher)
+        snapshot = bytes(self.audio[:size])
+        return await asyncio.to_thread(transcribe_audio, self._token, snapshot, config=self.config)
+
+    async def _interim(self, size: int) -> None:
+        try:
+            result = await self._recognize(size)
+        except SpeechToTextError:
+            return  # interim passes are best effort; the final pass reports errors
+        except Exception:
+            # Nothing awaits this task, so anything else would be lost as
+            # "Task exception was never retrieved".
+            LOGGER.warning("Interim speech recognition failed", exc_info=True)
+            return
+        self._recognized_bytes = size
+        if not result.get("transcript"):
+            return
+        try:
+            await self.emit({
+                "type": "interim",
+                "transcript": result["transcript"],
+                "confidence": result.get("confidence", 0.0),
+            })
+        except Exception:  # the socket closed mid-stream; the receive loop sees the disconnect
+            LOGGER.info("Could not send interim transcript", exc_info=True)
+
+    async def on_audio(self) -> None:
+        pending = len(self.audio) - self._recognized_bytes
+        if pending >= self.interim_every_bytes and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._interim(len(self.audio)))
+
+    async def finish(self) -> None:
+        await self.close()
+        if not self.audio:
+            await self.emit({"type": "final", "transcript": "", "confidence": 0.0, "all_results": []})
+            return
+        if self.final_transcribe is not None:
+            result = await self.final_transcribe(bytes(self.audio))
+        else:
+            result = await self._recognize(len(self.audio))
+        await self.emit({
+            "type": "final",
+            "transcript": result.get("transcript", ""),
+            "confidence": result.get("confidence", 0.0),
+            "all_results": result.get("all_results", []),
+        })
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):  # noqa: BLE001
+                pass
+
+
+class FakeStreamingRecognizer(StreamingRecognizer):
+    """Offline recognizer: reveals `script` one word per `bytes_per_word` bytes."""
+
+    def __init__(
+        self,
+        config: SpeechToTextConfig,
+        emit: Emit,
+        *,
+        script: str = "this is a fake streaming transcript",
+        bytes_per_word: int = 3200,
+        max_bytes: int = 10 * 1024 * 1024,
+    ) -> None:
+        super().__init__(config, emit, max_bytes=max_bytes)
+        self.words: List[str] = script.split()
+        self.bytes_per_word = max(1, bytes_per_word)
+        self._revealed = 0
+
+    async def on_audio(self) -> None:
+        revealed = min(len(self.words), len(self.audio) // self.bytes_per_word)
+        if revealed > self._revealed:
+            self._revealed = revealed
+            await self.emit({
+                "type": "interim",
+                "transcript": " ".join(self.words[:revealed]),
+                "confidence": 0.0,
+            })
+
+    async def finish(self) -> None:
+        transcript = " ".join(self.words) if self.audio else ""
+        confidence = 0.9 if transcript else 0.0
+        await self.emit({
+            "type": "final",
+            "transcript": transcript,
+            "confidence": confidence,
+            "all_results": [{"transcript": transcript, "confidence": confidence}] if transcript else [],
+        })
@@ -0,0 +1,202 @@
+"""
+Asynchronous, structured logging for the API process.
+
+Modules log through `logging.getLogger(__name__)`, as chat_to_voice_attachment
+already did. `configure_logging()` (called at the top of main.py) routes every
+record through a queue, so request handlers never block on stdout:
+
+- the root logger has one `QueueHandler`. It formats the message in the
+  calling thread and then enqueues the record without blocking. When the
+  queue (`LOG_QUEUE_SIZE`) is full, the record is dropped and counted
+  instead of stalling the worker,
+- a `QueueListener` thread writes the records to stdout. The format is one
+  JSON object per line by default, or `LOG_FORMAT=text` for local runs,
+- `LOG_LEVEL` sets the default level. `LOG_LEVELS` overrides it per module,
+  e.g. `campus_selector=DEBUG,generation_profiles=WARNING`,
+- `log_payload()` is for verbose dumps such as raw model responses. It logs
+  at DEBUG, only for a `LOG_PAYLOAD_SAMPLE_RATE` share of calls, and
+  truncates to `LOG_PAYLOAD_MAX_CHARS`,
+- `RequestIdMiddleware` takes the client's `X-Request-ID` or makes one. It
+  echoes it on the response and stores it in a ContextVar, so every record
+  logged while serving the request carries `request_id`. Worker threads
+  get it too (asyncio.to_thread, CPU_POOL and photo jobs copy the context).
+
+Extra fields passed with `extra={...}` become top-level JSON keys.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.05"))
+PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+_REQUEST_ID: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+def current_request_id() -> Optional[str]:
+    return _REQUEST_ID.get()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message here, since its args may change after the call
+        # returns. Tracebacks are formatted on the listener thread. This is the
+        # root's only handler, so the record is updated in place, not copied.
+        record.msg, record.args = record.getMessage(), None
+        record.request_id = _REQUEST_ID.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s%(request_tag)s: %(message)s", datefmt="%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        request_id = getattr(record, "request_id", None)
+        record.request_tag = f" [{request_id}]" if request_id else ""
+        return super().format(record)
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging() -> None:
+    """Install the queue handler and start the listener thread; safe to call twice."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE))
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener (lifespan exit)."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def logging_stats() -> Dict[str, object]:
+    return {
+        "format": LOG_FORMAT,
+        "level": logging.getLevelName(logging.getLogger().level),
+        "queued": _queue_handler.queue.qsize() if _queue_handler is not None else 0,
+        "dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+        "payload_sample_rate": PAYLOAD_SAMPLE_RATE,
+    }
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, **fields: Any) -> None:
+    """DEBUG-log a (sampled, truncated) verbose payload such as a raw model response."""
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= PAYLOAD_SAMPLE_RATE:
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False, default=str)
+    if len(text) > PAYLOAD_MAX_CHARS:
+        fields["payload_chars"] = len(text)
+        text = text[:PAYLOAD_MAX_CHARS] + "…"
+    logger.debug(message, extra={**fields, "payload": text})
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding a request id to the context and echoing it as `X-Request-ID`."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1").strip()
+                request_id = candidate if _REQUEST_ID_PATTERN.match(candidate) else None
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (REQUEST_ID_HEADER, request_id.encode())]}
+            await send(message)
+
+        token = _REQUEST_ID.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _REQUEST_ID.reset(token)
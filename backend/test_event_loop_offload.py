@@ -0,0 +1,69 @@
+"""TEST CODE: check that `/` health checks stay fast while heavy requests run.
+
+Run only after the FastAPI server is started on http://127.0.0.1:8000.
+Fires a burst of /api/map-insights and /api/generate-path requests in the
+background and times plain GET / calls at the same time. With the CPU work
+offloaded to executors.CPU_POOL / HEAVY_POOL the health checks should stay
+well under the threshold below.
+"""
+
+from __future__ import annotations
+import threading
+import time
+import requests
+
+BASE = "http://127.0.0.1:8000"
+HEALTH_P95_LIMIT_S = 0.25
+
+
+def heavy_worker(stop: threading.Event):
+    payload_insights = {
+        "why_uh": "I want to stay near family on Oahu and study sustainable tech.",
+        "interests": ["renewable energy", "software", "community service"],
+        "skills": ["public speaking", "problem solving", "basic Python"],
+        "top_n": 3,
+    }
+    payload_path = {"major": "Animation", "campus": "manoa"}
+    while not stop.is_set():
+        try:
+            requests.post(f"{BASE}/api/map-insights", json=payload_insights, timeout=60)
+            requests.post(f"{BASE}/api/generate-path", json=payload_path, timeout=60)
+        except Exception as e:
+            print(f"   heavy request failed: {e}")
+
+
+def time_health_checks(count: int = 40) -> list[float]:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        requests.get(f"{BASE}/", timeout=10)
+        timings.append(time.perf_counter() - started)
+        time.sleep(0.05)
+    return timings
+
+
+if __name__ == "__main__":
+    # TEST CODE: not for production use.
+    print("Timing / while heavy requests run...\n")
+    stop = threading.Event()
+    workers = [threading.Thread(target=heavy_worker, args=(stop,), daemon=True) for _ in range(4)]
+    for w in workers:
+        w.start()
+    time.sleep(0.5)  # let the heavy requests get going
+    try:
+        timings = sorted(time_health_checks())
+    finally:
+        stop.set()
+
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"   health checks: n={len(timings)} median={timings[len(timings) // 2] * 1000:.1f}ms p95={p95 * 1000:.1f}ms max={timings[-1] * 1000:.1f}ms")
+    if p95 <= HEALTH_P95_LIMIT_S:
+        print(f"   ✓ / stayed fast (p95 <= {HEALTH_P95_LIMIT_S * 1000:.0f}ms)")
+    else:
+        print(f"   ✗ / was slow under load (p95 > {HEALTH_P95_LIMIT_S * 1000:.0f}ms)")
+
+    try:
+        metrics = requests.get(f"{BASE}/api/metrics", timeout=10).json()
+        print(f"   executor stats: {metrics.get('executors')}")
+    except Exception as e:
+        print(f"   could not read /api/metrics: {e}")
@@ -0,0 +1,103 @@
+"""TEST CODE: check parse_prerequisites() on the wordings from its docstring.
+
+Runs offline (no server, no catalog files needed):
+
+    python test_prerequisite_graph.py
+
+Each case is real metadata text from one campus catalog and the expression
+the parser should produce. The ICS 311 case covers a bracketed group ORed
+with a parenthesized group, followed by a waivable "; or consent".
+"""
+
+import sys
+
+from prerequisite_graph import expression_courses, parse_prerequisites
+
+PREFIXES = {"BIOL", "CHEM", "CINE", "ECE", "ENG", "ESL", "HSER", "ICS", "MATH", "SOC", "WS"}
+
+
+def course(prefix, number):
+    return ("course", (prefix, number))
+
+
+def all_of(*children):
+    return ("all", children)
+
+
+def any_of(*children, waivable=False):
+    return ("any", children, waivable)
+
+
+CASES = [
+    (
+        "Manoa",
+        "Prerequisites: CINE 310 , CINE 350 , and one of CINE 312 , CINE 313 or CINE 374 .; Grade Option: A-F only.",
+        all_of(course("CINE", "310"), course("CINE", "350"), any_of(course("CINE", "312"), course("CINE", "313"), course("CINE", "374"))),
+        False,
+    ),
+    (
+        "Hilo",
+        "prerequisites: C or better in Soc 100 or WS 151",
+        any_of(course("SOC", "100"), course("WS", "151")),
+        False,
+    ),
+    (
+        "Kapiolani",
+        "Prereq: A grade of C or higher in ENG 100 or ESL 100., Coreq: -",
+        any_of(course("ENG", "100"), course("ESL", "100")),
+        False,
+    ),
+    (
+        "Leeward",
+        "Prerequisites: ENG 100 with a grade of C or betterANDHSER 140 or HSER 110ORinstructor approval.",
+        all_of(course("ENG", "100"), any_of(course("HSER", "140"), course("HSER", "110"), waivable=True)),
+        False,
+    ),
+    (
+        "Maui",
+        "Prerequisites: BIOL 171/171L, CHEM 151 or 161/161L, or consent",
+        all_of(
+            course("BIOL", "171"),
+            course("BIOL", "171L"),
+            any_of(course("CHEM", "151"), all_of(course("CHEM", "161"), course("CHEM", "161L"))),
+        ),
+        True,
+    ),
+    (
+        "ICS 311",
+        "Prerequisites: ICS 211 , and [( ICS 241 or ECE 362 ) and ( MATH 216 or MATH 242 or MATH 252A )]"
+        " or ( MATH 301 and MATH 372 ); or consent.",
+        all_of(
+            course("ICS", "211"),
+            any_of(
+                all_of(
+                    any_of(course("ICS", "241"), course("ECE", "362")),
+                    any_of(course("MATH", "216"), course("MATH", "242"), course("MATH", "252A")),
+                ),
+                all_of(course("MATH", "301"), course("MATH", "372")),
+            ),
+        ),
+        True,
+    ),
+    ("no clause", "Grade Option: A-F only.; Repeatable: Up to 6 credits.", None, False),
+    ("none", "Prerequisites: None", None, False),
+]
+
+
+if __name__ == "__main__":
+    # TEST CODE: not for production use.
+    print("Parsing prerequisite wordings...\n")
+    failures = 0
+    for label, metadata, expected, expected_waivable in CASES:
+        expr, waivable = parse_prerequisites(metadata, PREFIXES)
+        if expr == expected and waivable == expected_waivable:
+            courses = sorted(" ".join(code) for code in expression_courses(expr))
+            print(f"   ✓ {label}: {', '.join(courses) or '(no courses)'}{' (waivable)' if waivable else ''}")
+        else:
+            failures += 1
+            print(f"   ✗ {label}")
+            print(f"      expected: {expected!r} waivable={expected_waivable}")
+            print(f"      got:      {expr!r} waivable={waivable}")
+
+    print(f"\n{len(CASES) - failures}/{len(CASES)} cases passed")
+    sys.exit(1 if failures else 0)
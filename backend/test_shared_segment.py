@@ -0,0 +1,92 @@
+"""TEST CODE: write a shared segment, map it back and compare.
+
+Runs offline in a private temporary directory:
+
+    python test_shared_segment.py
+
+Covers `write_segment()` / `attach()` (str and tuple keys, missing keys,
+sequence indexing and slicing, metadata), pickling a mapping as its file
+path, and `attach_or_build()` building once and dropping older versions.
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+
+import shared_segment
+from shared_segment import attach, attach_or_build, write_segment
+
+failures = 0
+
+
+def check(label, ok, detail=""):
+    global failures
+    if ok:
+        print(f"   ✓ {label}")
+    else:
+        failures += 1
+        print(f"   ✗ {label}{': ' + detail if detail else ''}")
+
+
+MAPPING = {
+    "ICS 111": {"title": "Introduction to Computer Science I", "credits": 4},
+    ("manoa", "ICS 311"): ("ICS 211", "ICS 241"),
+    "Hawaiian ʻōlelo": ["HAW 101", "HAW 102"],
+}
+SEQUENCE = [{"major": "Computer Science", "years": 4}, None, "BIOL 171/171L", 42]
+
+
+def round_trip(directory: Path) -> None:
+    path = directory / "courses-v1.seg"
+    write_segment(path, {"courses": MAPPING, "programs": SEQUENCE}, {"version": "v1"})
+    segment = attach(str(path))
+    courses, programs = segment.mapping("courses"), segment.sequence("programs")
+
+    check("metadata", segment.meta == {"version": "v1"}, repr(segment.meta))
+    check("sections", sorted(segment.sections()) == ["courses", "programs"], repr(segment.sections()))
+    check("mapping equals source", dict(courses.items()) == MAPPING, repr(dict(courses.items())))
+    check("tuple key lookup", courses[("manoa", "ICS 311")] == ("ICS 211", "ICS 241"))
+    check("missing key", "ICS 999" not in courses and courses.get("ICS 999") is None)
+    check("sequence equals source", list(programs) == SEQUENCE, repr(list(programs)))
+    check("sequence indexing", programs[-1] == 42 and list(programs[1:3]) == SEQUENCE[1:3])
+    check("attach maps each file once", attach(str(path)) is segment)
+
+    restored = pickle.loads(pickle.dumps(courses))
+    check("mapping pickles as its path", len(pickle.dumps(courses)) < 200 and dict(restored.items()) == MAPPING)
+
+
+def build_once(directory: Path) -> None:
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"items": {"a": len(builds)}}, {"built": len(builds)}
+
+    first = attach_or_build("example", "v1", build)
+    again = attach_or_build("example", "v1", build)
+    check("attach_or_build builds once", len(builds) == 1 and again is first and first.mapping("items")["a"] == 1)
+
+    newer = attach_or_build("example", "v2", build)
+    files = sorted(p.name for p in directory.glob("example-*.seg"))
+    check("new version replaces the old file", len(builds) == 2 and len(files) == 1 and files[0].startswith("example-v2."), repr(files))
+    check("old mapping stays readable", first.mapping("items")["a"] == 1 and newer.mapping("items")["a"] == 2)
+
+
+if __name__ == "__main__":
+    # TEST CODE: not for production use.
+    if not shared_segment.shared_segments_enabled():
+        print("Shared segments are disabled here (SHARED_SEGMENTS=0 or no fcntl); nothing to test.")
+        sys.exit(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp) / "segments"
+        os.environ["SHARED_SEGMENT_DIR"] = str(directory)
+        directory.mkdir(mode=0o700)
+        print("Segment round trip...\n")
+        round_trip(directory)
+        print("\nattach_or_build...\n")
+        build_once(directory)
+
+    print(f"\n{'All checks passed' if not failures else f'{failures} check(s) failed'}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,184 @@
+"""
+Content-addressed cache for Speech-to-Text results.
+
+Flaky mobile clients retry uploads and the demo kiosks replay the same clips,
+so byte-identical audio reaches `transcribe_audio` again and again. Each entry
+is keyed by the SHA-256 of the audio plus every `SpeechToTextConfig` field, so
+the same bytes recognized with another encoding, rate or language are a miss.
+
+`TranscriptCache.wrap(transcribe_audio)` returns a drop-in replacement with the
+same signature. The cache is bounded by entry count (LRU), an approximate byte
+budget and a TTL. Identical requests that arrive while the first one is still
+at Google wait for its result instead of making their own call. Errors are
+never cached.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import astuple, dataclass
+from typing import Callable, Dict, Optional, Union
+
+from chat_to_voice_attachment import SpeechToTextConfig
+
+
+AudioBytes = Union[bytes, bytearray, memoryview]
+TranscribeFn = Callable[..., dict]
+# A token, or a zero-argument function returning one (only called on a miss).
+TokenSource = Union[str, Callable[[], str]]
+
+
+def transcript_cache_key(audio: AudioBytes, config: Optional[SpeechToTextConfig]) -> str:
+    cfg = config or SpeechToTextConfig()
+    digest = hashlib.sha256(audio).hexdigest()
+    fields = "|".join(str(value) for value in astuple(cfg))
+    return f"{digest}:{fields}"
+
+
+@dataclass
+class _Entry:
+    result: dict
+    size: int
+    stored_at: float
+
+
+class TranscriptCache:
+    """LRU + TTL + byte-budget cache of transcription results."""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 256,
+        max_bytes: int = 2 * 1024 * 1024,
+        ttl_seconds: float = 60 * 60,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = {"lru": 0, "ttl": 0, "memory": 0}
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._lookup(key)
+            return dict(entry.result) if entry else None
+
+    def put(self, key: str, result: dict) -> None:
+        size = len(key) + len(json.dumps(result, ensure_ascii=False))
+        with self._lock:
+            self._store(key, result, size)
+
+    def transcribe(self, fn: TranscribeFn, token: TokenSource, audio: AudioBytes, *, config: Optional[SpeechToTextConfig] = None) -> dict:
+        """Return the cached result for (audio, config) or call `fn` once for it.
+
+        `token` may be a callable so cache hits skip the OAuth refresh too.
+        """
+        key = transcript_cache_key(audio, config)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._hits += 1
+                return dict(entry.result)
+            pending = self._inflight.get(key)
+            if pending is None:
+                self._misses += 1
+                owner = Future()
+                self._inflight[key] = owner
+            else:
+                self._coalesced += 1
+        if pending is not None:
+            return dict(pending.result())
+
+        try:
+            result = fn(token() if callable(token) else token, audio, config=config)
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            owner.set_exception(exc)
+            raise
+        self.put(key, result)
+        with self._lock:
+            self._inflight.pop(key, None)
+        owner.set_result(result)
+        return dict(result)
+
+    def wrap(self, fn: TranscribeFn) -> TranscribeFn:
+        """`fn` with caching, keeping the `transcribe_audio` signature."""
+
+        def cached(token: TokenSource, audio: AudioBytes, *, config: Optional[SpeechToTextConfig] = None) -> dict:
+            return self.transcribe(fn, token, audio, config=config)
+
+        cached.__name__ = getattr(fn, "__name__", "cached_transcribe")
+        cached.__doc__ = fn.__doc__
+        return cached
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    # ----- internals (call with the lock held) -----
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl_seconds > 0 and self._clock() - entry.stored_at > self.ttl_seconds:
+            self._remove(key, reason="ttl")
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, result: dict, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key).size
+        self._entries[key] = _Entry(result=dict(result), size=size, stored_at=self._clock())
+        self._total_bytes += size
+        self._expire()
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)), reason="lru")
+        while self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)), reason="memory")
+
+    def _expire(self) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        cutoff = self._clock() - self.ttl_seconds
+        # Hits reorder entries (LRU) without refreshing stored_at, so scan them all.
+        for key in [k for k, e in self._entries.items() if e.stored_at < cutoff]:
+            self._remove(key, reason="ttl")
+
+    def _remove(self, key: str, *, reason: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size
+        self._evictions[reason] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "entries": len(self._entries),
+                "approx_bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "hit_ratio": round((self._hits + self._coalesced) / lookups, 4) if lookups else 0.0,
+                "evictions": dict(self._evictions),
+            }
@@ -0,0 +1,98 @@
+"""
+Startup warm-up state for the FastAPI lifespan (see `main.lifespan`).
+
+Without a warm-up, the first request after a deploy pays for the campus
+catalog scan, the prerequisite graph, the pathway JSON parse and the first
+OAuth token refresh. The lifespan runs those builds as named steps before the
+app reports ready:
+
+- `Warmup.step(name, coro)` times one step and records its outcome,
+- required steps gate readiness (`/api/ready` answers 503 until they finish),
+  optional ones (e.g. campus photo backgrounds) keep warming afterwards,
+- a failed step is recorded but does not block startup; the lazy `ensure_*`
+  path still rebuilds on demand.
+
+`IMPORT_STARTED` is taken when this module is first imported (near the top of
+main.py), so `cold_start_seconds` covers module import plus warm-up.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Dict, Optional, Sequence
+
+IMPORT_STARTED = time.perf_counter()
+
+LOGGER = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+@dataclass
+class WarmupStep:
+    name: str
+    required: bool
+    status: str = PENDING
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class Warmup:
+    def __init__(self) -> None:
+        self._steps: Dict[str, WarmupStep] = {}
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+
+    def begin(self, names: Sequence[str], optional: Sequence[str] = ()) -> None:
+        """Register the steps for this run; called once the app module is imported."""
+        self.started_at = time.perf_counter()
+        self.ready_at = None
+        self._steps = {name: WarmupStep(name, required=True) for name in names}
+        self._steps.update({name: WarmupStep(name, required=False) for name in optional})
+
+    async def step(self, name: str, work: Awaitable[object]) -> bool:
+        """Await `work` as step `name`; True when it succeeded."""
+        step = self._steps[name]
+        step.status = RUNNING
+        started = time.perf_counter()
+        try:
+            await work
+        except Exception as err:
+            step.status, step.error = FAILED, f"{type(err).__name__}: {err}"
+            LOGGER.warning("Warm-up step %s failed: %s", name, step.error)
+            return False
+        else:
+            step.status = DONE
+            return True
+        finally:
+            step.seconds = round(time.perf_counter() - started, 4)
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.perf_counter()
+        LOGGER.info("Warm-up finished in %.2fs (%.2fs since import)",
+                    self.ready_at - (self.started_at or self.ready_at), self.ready_at - IMPORT_STARTED)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def stats(self) -> Dict[str, object]:
+        def since(mark: Optional[float], origin: Optional[float]) -> Optional[float]:
+            return round(mark - origin, 4) if mark is not None and origin is not None else None
+
+        return {
+            "ready": self.ready,
+            "import_seconds": since(self.started_at, IMPORT_STARTED),
+            "warmup_seconds": since(self.ready_at, self.started_at),
+            "cold_start_seconds": since(self.ready_at, IMPORT_STARTED),
+            "steps": {
+                step.name: {
+                    "status": step.status,
+                    "required": step.required,
+                    "seconds": step.seconds,
+                    **({"error": step.error} if step.error else {}),
+                }
+                for step in self._steps.values()
+            },
+        }
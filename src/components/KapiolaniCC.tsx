@@ -98,11 +98,7 @@ export default function KapiolaniCC({ insights, answers, onSaveMajor, onGenerate
     
     try {
       const majorLabel = recommendedMap[major] || config[major]?.majorName || major;
-      const resp = await fetch('/api/generate-path', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ major: majorLabel, campus: 'kapiolani' })
-      });
+      const resp = await fetch(`/api/generate-path?${new URLSearchParams({ major: majorLabel, campus: 'kapiolani' })}`);
       const json = await resp.json();
       
       if (json?.path && Array.isArray(json.path) && json.path.length > 0) {
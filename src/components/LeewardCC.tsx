@@ -99,11 +99,7 @@ export default function UHManoa({ insights, answers, onSaveMajor, onGeneratePath
     
     try {
       const majorLabel = recommendedMap[major] || config[major]?.majorName || major;
-      const resp = await fetch('/api/generate-path', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ major: majorLabel, campus: 'leeward' })
-      });
+      const resp = await fetch(`/api/generate-path?${new URLSearchParams({ major: majorLabel, campus: 'leeward' })}`);
       const json = await resp.json();
       
       if (json?.path && Array.isArray(json.path) && json.path.length > 0) {
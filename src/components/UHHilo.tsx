@@ -100,11 +100,7 @@ export default function UHHilo({ insights, answers, onSaveMajor, onGeneratePath,
     
     try {
       const majorLabel = recommendedMap[major] || config[major]?.majorName || major;
-      const resp = await fetch(buildApiUrl('/api/generate-path'), {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ major: majorLabel, campus: 'hilo' })
-      });
+      const resp = await fetch(buildApiUrl(`/api/generate-path?${new URLSearchParams({ major: majorLabel, campus: 'hilo' })}`));
       const json = await resp.json();
       
       if (json?.path && Array.isArray(json.path) && json.path.length > 0) {
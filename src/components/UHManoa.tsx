@@ -5,6 +5,8 @@ import PathwaySection from '../sections/PathwaySection';
 import { buildApiUrl } from '../config';
 import ManoaGoogleMap from './ManoaGoogleMap';
 import { buildingCoordinates } from '../data/manoaBuildingGeo';
+import { expandPathNodes } from '../utils/pathUtils';
+import { primeCourseCards } from '../utils/courseUtils';
 
 type ItineraryStep = {
   id: string;
@@ -128,11 +130,31 @@ export default function UHManoa({ insights, answers, onSaveMajor, onGeneratePath
       const formData = new FormData();
       formData.append('file', file);
 
-      const response = await fetch(buildApiUrl('/api/generate-campus-photo'), {
+      // Submit a job, long-poll its status, then fetch the finished image.
+      const submit = await fetch(buildApiUrl('/api/campus-photo-jobs?campus=manoa'), {
         method: 'POST',
         body: formData,
       });
+      if (!submit.ok) throw new Error('Generation failed');
 
+      let job = await submit.json();
+      while (job.status === 'queued' || job.status === 'running') {
+        const statusResponse = await fetch(buildApiUrl(`${job.status_url}?wait=20`));
+        if (!statusResponse.ok) throw new Error('Generation failed');
+        job = await statusResponse.json();
+      }
+      if (job.status !== 'done') throw new Error(job.error ?? 'Generation failed');
+
+      // Let the server pick AVIF/WebP when supported; show the small preview
+      // first, then swap in the full image.
+      const imageHeaders = { Accept: 'image/avif,image/webp,image/jpeg;q=0.8' };
+      const preview = await fetch(buildApiUrl(job.preview_url), { headers: imageHeaders });
+      if (preview.ok) {
+        setGeneratedImage(URL.createObjectURL(await preview.blob()));
+        setIsGenerating(false);
+      }
+
+      const response = await fetch(buildApiUrl(job.result_url), { headers: imageHeaders });
       if (!response.ok) throw new Error('Generation failed');
 
       const blob = await response.blob();
@@ -236,20 +258,17 @@ export default function UHManoa({ insights, answers, onSaveMajor, onGeneratePath
     try {
       const majorLabel = recommendedMap[major] || config[major]?.majorName || major;
       console.log('[UHManoa] Requesting path for:', majorLabel, 'campus: manoa');
-      const resp = await fetch(buildApiUrl('/api/generate-path'), {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ major: majorLabel, campus: 'manoa' })
-      });
+      const resp = await fetch(buildApiUrl(`/api/generate-path?${new URLSearchParams({ major: majorLabel, campus: 'manoa', node_format: 'columnar', include_cards: 'true' })}`));
       const json = await resp.json();
+      // Cards for the path's courses come with the path, so PathwaySection needs no second request.
+      if (json?.cards) primeCourseCards(json.cards);
+      const path = expandPathNodes(json?.path);
       console.log('[UHManoa] API response:', json);
-      console.log('[UHManoa] json.path exists?', !!json?.path);
-      console.log('[UHManoa] json.path is array?', Array.isArray(json?.path));
-      console.log('[UHManoa] json.path.length:', json?.path?.length);
+      console.log('[UHManoa] path.length:', path.length);
       
-      if (json?.path && Array.isArray(json.path) && json.path.length > 0) {
-        console.log('[UHManoa] Got path with', json.path.length, 'nodes');
-        if (typeof onGeneratePath === 'function') onGeneratePath(json.path);
+      if (path.length > 0) {
+        console.log('[UHManoa] Got path with', path.length, 'nodes');
+        if (typeof onGeneratePath === 'function') onGeneratePath(path);
       } else {
         console.warn('[UHManoa] No path returned, using fallback');
         const fallback = [
@@ -100,11 +100,7 @@ export default function UHMaui({ insights, answers, onSaveMajor, onGeneratePath,
     
     try {
       const majorLabel = recommendedMap[major] || config[major]?.majorName || major;
-      const resp = await fetch(buildApiUrl('/api/generate-path'), {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ major: majorLabel, campus: 'maui' })
-      });
+      const resp = await fetch(buildApiUrl(`/api/generate-path?${new URLSearchParams({ major: majorLabel, campus: 'maui' })}`));
       const json = await resp.json();
       
       if (json?.path && Array.isArray(json.path) && json.path.length > 0) {
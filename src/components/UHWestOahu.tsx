@@ -99,11 +99,7 @@ export default function UHWestOahu({ insights, answers, onSaveMajor, onGenerateP
 
     try {
       const majorLabel = recommendedMap[major] || config[major]?.majorName || major;
-      const resp = await fetch(buildApiUrl('/api/generate-path'), {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ major: majorLabel, campus: 'westoahu' }),
-      });
+      const resp = await fetch(buildApiUrl(`/api/generate-path?${new URLSearchParams({ major: majorLabel, campus: 'westoahu' })}`));
       const json = await resp.json();
       
       if (json?.path && Array.isArray(json.path) && json.path.length > 0) {
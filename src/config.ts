@@ -2,6 +2,11 @@
 // Uses environment variable VITE_API_URL if set, otherwise defaults to localhost
 export const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// Opt-in: streamed speech re-recognizes the buffer for every interim result,
+// so it costs several Speech-to-Text calls per recording (backend needs
+// SPEECH_STREAMING_BACKEND=rest). Off by default; recordings use the upload endpoint.
+export const SPEECH_STREAMING = import.meta.env.VITE_SPEECH_STREAMING === '1';
+
 // Helper function to build API URLs
 export const buildApiUrl = (endpoint: string): string => {
   // Remove leading slash if present to avoid double slashes
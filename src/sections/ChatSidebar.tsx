@@ -9,6 +9,10 @@ export default function ChatSidebar({ answers, insights, isVisible }) {
     const [isLoading, setIsLoading] = useState(false);
     const [isReady, setIsReady] = useState(false);
     const chatMessagesRef = useRef(null);
+    // Server-side chat session: history lives on the backend, and the context
+    // is only resent when it changes (or the server lost the session).
+    const sessionIdRef = useRef('');
+    const sentContextKeyRef = useRef('');
 
     useEffect(() => {
         const raf = requestAnimationFrame(() => setIsReady(true));
@@ -53,31 +57,23 @@ export default function ChatSidebar({ answers, insights, isVisible }) {
                 mapInsights: insights || {}
             };
 
-            if (insights) {
-                context.recommended_majors = insights.majors?.map(m => ({
-                    name: m.name,
-                    campus: m.campus,
-                    reason: m.reason
-                })) || [];
-
-                context.recommended_campuses = insights.campuses?.map(c => ({
-                    name: c.name,
-                    score: c.score,
-                    reason: c.reason
-                })) || [];
+            const contextKey = JSON.stringify(context);
+            const body = { question: userMessage, session_id: sessionIdRef.current };
+            if (contextKey !== sentContextKeyRef.current) {
+                body.context = context;
             }
 
             const response = await fetch(buildApiUrl('/api/ask-question'), {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    question: userMessage,
-                    context,
-                    conversation_history: updatedMessages.slice(-6)
-                })
+                body: JSON.stringify(body)
             });
 
             const data = await response.json();
+            if (data.session_id) {
+                sessionIdRef.current = data.session_id;
+                sentContextKeyRef.current = data.profile ? contextKey : '';
+            }
             setMessages(prev => [...prev, { role: 'assistant', text: data.answer }]);
         } catch (error) {
             setMessages(prev => [...prev, { role: 'assistant', text: 'Sorry, something went wrong.' }]);
@@ -2,7 +2,7 @@
 
 import { type FormEvent, useEffect, useRef, useState } from 'react';
 import './InputTextbox.css';
-import { buildApiUrl } from '../config';
+import { SPEECH_STREAMING, buildApiUrl } from '../config';
 
 interface InputTextboxProps {
   question: string;
@@ -15,9 +15,13 @@ export default function InputTextbox({ question, onSubmit, enableSpeechToText =
   const [isRecording, setIsRecording] = useState(false);
   const [isTranscribing, setIsTranscribing] = useState(false);
   const [speechError, setSpeechError] = useState('');
+  const [interimTranscript, setInterimTranscript] = useState('');
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
   const audioChunksRef = useRef<Blob[]>([]);
   const stopTimerRef = useRef<number | null>(null);
+  const socketRef = useRef<WebSocket | null>(null);
+  const socketReadyRef = useRef(false);
+  const finalTranscriptRef = useRef<((transcript: string | null) => void) | null>(null);
 
   useEffect(() => {
     return () => {
@@ -26,6 +30,8 @@ export default function InputTextbox({ question, onSubmit, enableSpeechToText =
       }
       mediaRecorderRef.current?.stream.getTracks().forEach((track) => track.stop());
       mediaRecorderRef.current = null;
+      socketRef.current?.close();
+      socketRef.current = null;
     };
   }, []);
 
@@ -39,36 +45,73 @@ export default function InputTextbox({ question, onSubmit, enableSpeechToText =
     setValue('');
   };
 
-  const blobToBase64 = (blob: Blob) => {
-    return new Promise<string>((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        const result = reader.result;
-        if (typeof result === 'string') {
-          const base64 = result.split(',')[1];
-          resolve(base64);
-          return;
+  const appendTranscript = (transcript: string) => {
+    setValue((prev) => {
+      if (!prev.trim()) {
+        return transcript;
+      }
+      return `${prev.trim()} ${transcript}`.trim();
+    });
+  };
+
+  // Streams audio over /ws/speech-to-text so interim text shows while the
+  // student talks. Resolves the final transcript, or null if streaming failed
+  // (the caller then falls back to the upload endpoint).
+  const openSpeechSocket = () => {
+    socketReadyRef.current = false;
+    finalTranscriptRef.current = null;
+    let settled = false;
+    let resolveFinal: (transcript: string | null) => void = () => {};
+    const finalTranscript = new Promise<string | null>((resolve) => {
+      resolveFinal = (transcript) => {
+        if (!settled) {
+          settled = true;
+          resolve(transcript);
         }
-        reject(new Error('Unable to encode audio'));
       };
-      reader.onerror = () => reject(reader.error ?? new Error('Failed to read audio blob'));
-      reader.readAsDataURL(blob);
     });
+    finalTranscriptRef.current = resolveFinal;
+
+    try {
+      const url = buildApiUrl('/ws/speech-to-text?encoding=WEBM_OPUS&sample_rate=48000').replace(/^http/, 'ws');
+      const socket = new WebSocket(url);
+      socketRef.current = socket;
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'ready') {
+          socketReadyRef.current = true;
+          // Catch up on anything recorded before the socket was ready.
+          audioChunksRef.current.forEach((chunk) => socket.send(chunk));
+        } else if (message.type === 'interim') {
+          setInterimTranscript(message.transcript ?? '');
+        } else if (message.type === 'final') {
+          resolveFinal(message.transcript ?? '');
+        } else if (message.type === 'error') {
+          console.error('Streaming speech-to-text error', message.detail);
+          resolveFinal(null);
+        }
+      };
+      socket.onerror = () => resolveFinal(null);
+      socket.onclose = () => {
+        socketReadyRef.current = false;
+        resolveFinal(null);
+      };
+    } catch (error) {
+      console.error('Unable to open speech stream', error);
+      resolveFinal(null);
+    }
+    return finalTranscript;
   };
 
   const transcribeAudio = async (audioBlob: Blob) => {
     setIsTranscribing(true);
     setSpeechError('');
     try {
-      const audio_base64 = await blobToBase64(audioBlob);
-      const response = await fetch(buildApiUrl('/api/speech-to-text'), {
+      // Send the recorded bytes as-is (no base64/JSON wrapping).
+      const response = await fetch(buildApiUrl('/api/speech-to-text/upload?encoding=WEBM_OPUS&sample_rate=48000'), {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          audio_base64,
-          encoding: 'WEBM_OPUS',
-          sample_rate: 48000,
-        }),
+        headers: { 'Content-Type': audioBlob.type || 'application/octet-stream' },
+        body: audioBlob,
       });
 
       if (!response.ok) {
@@ -78,12 +121,7 @@ export default function InputTextbox({ question, onSubmit, enableSpeechToText =
 
       const result = await response.json();
       if (result?.transcript) {
-        setValue((prev) => {
-          if (!prev.trim()) {
-            return result.transcript;
-          }
-          return `${prev.trim()} ${result.transcript}`.trim();
-        });
+        appendTranscript(result.transcript);
       }
     } catch (error) {
       console.error('Speech-to-text error', error);
@@ -124,25 +162,55 @@ export default function InputTextbox({ question, onSubmit, enableSpeechToText =
       const recorder = new MediaRecorder(stream, { mimeType });
       mediaRecorderRef.current = recorder;
       audioChunksRef.current = [];
+      setInterimTranscript('');
+      finalTranscriptRef.current = null;
+      const finalTranscript = SPEECH_STREAMING ? openSpeechSocket() : Promise.resolve(null);
 
       recorder.ondataavailable = (event) => {
         if (event.data.size > 0) {
           audioChunksRef.current.push(event.data);
+          if (socketReadyRef.current) {
+            socketRef.current?.send(event.data);
+          }
         }
       };
 
       recorder.onstop = async () => {
         setIsRecording(false);
         stream.getTracks().forEach((track) => track.stop());
+        const socket = socketRef.current;
+        socketRef.current = null;
         if (audioChunksRef.current.length === 0) {
+          socket?.close();
           setSpeechError('No audio captured. Please try again.');
           return;
         }
+
+        setIsTranscribing(true);
+        if (socket && socketReadyRef.current && socket.readyState === WebSocket.OPEN) {
+          socket.send('stop');
+        } else {
+          socket?.close();
+          finalTranscriptRef.current?.(null);
+        }
+        const streamed = await finalTranscript;
+        setInterimTranscript('');
+        socket?.close();
+        if (streamed !== null) {
+          setIsTranscribing(false);
+          if (streamed) {
+            appendTranscript(streamed);
+          }
+          return;
+        }
+
+        // Streaming unavailable: send the whole recording in one request.
         const audioBlob = new Blob(audioChunksRef.current, { type: recorder.mimeType });
         await transcribeAudio(audioBlob);
       };
 
-      recorder.start();
+      // Timeslices let the audio stream to the server while recording (when streaming is enabled).
+      recorder.start(250);
       setIsRecording(true);
       stopTimerRef.current = window.setTimeout(() => {
         stopRecording();
@@ -208,7 +276,9 @@ export default function InputTextbox({ question, onSubmit, enableSpeechToText =
           {speechError
             ? speechError
             : isRecording
-              ? 'Listening… tap stop when you are done.'
+              ? interimTranscript
+                ? `Listening… "${interimTranscript}"`
+                : 'Listening… tap stop when you are done.'
               : isTranscribing
                 ? 'Translating your speech…'
                 : 'Use the mic to dictate your response.'}
@@ -3,7 +3,7 @@ import { useEffect, useMemo, useState } from 'react';
 import ReactFlow, { Background, Controls, MiniMap } from 'reactflow';
 import 'reactflow/dist/style.css';
 import degreePathways from '../../UH-courses/manoa_degree_pathways.json';
-import courseCatalog from '../../UH-courses/json_format/manoa_courses.json';
+import { fetchCourseCards, onCourseCards, shapeCourse, type CourseCard } from '../utils/courseUtils';
 import './PathwaySection.css';
 
 const horizontalSpacing = 260;
@@ -13,26 +13,6 @@ const yearSpacing = 280;
 const normalize = (value?: string | null) =>
   value ? value.toString().toLowerCase().replace(/[^a-z0-9]+/g, '') : '';
 
-const courseLookup = (courseCatalog as Array<Record<string, any>>).reduce(
-  (acc, course) => {
-    const key = `${course.course_prefix || ''} ${course.course_number || ''}`
-      .trim()
-      .toLowerCase();
-    if (key) acc[key] = course;
-    return acc;
-  },
-  {} as Record<string, any>
-);
-
-type CourseCard = {
-  id: string;
-  code: string;
-  name: string;
-  credits: number;
-  location: string;
-  description: string;
-};
-
 type RawProgram = {
   program_name: string;
   years?: Array<{
@@ -59,53 +39,6 @@ type PathwaySectionProps = {
   onPlanDay?: (courses: CourseCard[]) => void;
 };
 
-function shapeCourse(course: any, fallbackId: string): CourseCard {
-  // Extract course code and name from the course.name field (e.g., "ICS 111" or "MATH 215 or 241")
-  const rawName = course?.name || '';
-  const match = rawName.match?.(/([A-Z]{2,4})\s*(\d{3}[A-Z]?)/);
-  
-  const catalogKey = match
-    ? `${match[1]} ${match[2]}`.toLowerCase()
-    : rawName.toLowerCase();
-  const catalogEntry = courseLookup[catalogKey];
-  
-  // Course code is the matched part (e.g., "ICS 111")
-  const courseCode = match?.[0] || course?.course_code || course?.code || rawName || fallbackId;
-  
-  // Course name is either:
-  // 1. Explicit title field from course
-  // 2. The part after the code in the name field
-  // 3. Lookup from catalog
-  // 4. The raw name itself (if it doesn't start with a code)
-  let courseName = '';
-  if (course?.title) {
-    courseName = course.title;
-  } else if (match && rawName) {
-    // Remove the code part and clean up
-    courseName = rawName.replace(match[0], '').replace(/^[\s\-:]+/, '').trim();
-    // If nothing left after removing code, use catalog or raw name
-    if (!courseName) {
-      courseName = catalogEntry?.course_title || rawName;
-    }
-  } else {
-    courseName = catalogEntry?.course_title || rawName || `Course ${fallbackId}`;
-  }
-  
-  // If courseName ended up empty or is just the code again, try catalog
-  if (!courseName || courseName === courseCode) {
-    courseName = catalogEntry?.course_title || 'Course';
-  }
-  
-  return {
-    id: String(course?.id || catalogKey || fallbackId),
-    code: courseCode,
-    name: courseName,
-    credits: course?.credits || Number(catalogEntry?.num_units) || course?.credit || 3,
-    location: course?.location || catalogEntry?.dept_name || 'UH Mānoa',
-    description: course?.description || course?.course_desc || catalogEntry?.course_desc || 'Course details coming soon.',
-  };
-}
-
 export default function PathwaySection({
   nodes = [],
   selectedMajorKey,
@@ -116,6 +49,10 @@ export default function PathwaySection({
   const [searchQuery, setSearchQuery] = useState('');
   const [activeCourse, setActiveCourse] = useState<CourseCard | null>(null);
   const [pulseKey, setPulseKey] = useState(0);
+  // Bumped when catalog cards arrive so the graphs re-shape their courses.
+  const [cardsVersion, setCardsVersion] = useState(0);
+
+  useEffect(() => onCourseCards(() => setCardsVersion((prev) => prev + 1)), []);
 
   console.log('[PathwaySection] Received nodes:', nodes?.length || 0, 'nodes');
   console.log('[PathwaySection] Selected major:', selectedMajorKey, selectedMajorName);
@@ -152,7 +89,17 @@ export default function PathwaySection({
       });
     });
     return flattened;
-  }, [targetProgram]);
+  }, [targetProgram, cardsVersion]);
+
+  useEffect(() => {
+    const names: string[] = nodes.map((node) => node?.name).filter(Boolean);
+    targetProgram?.years?.forEach((year) =>
+      year.semesters?.forEach((semester) =>
+        semester.courses?.forEach((course) => course.name && names.push(course.name))
+      )
+    );
+    fetchCourseCards(names);
+  }, [nodes, targetProgram]);
 
   const datasetGraph = useMemo(() => {
     if (!programCourses.length) return { nodes: [], edges: [] };
@@ -543,6 +490,31 @@ export default function PathwaySection({
     // Add waypoint nodes to the graph
     rfNodes.push(...rainbowPathNodes);
     
+    // Prefer real prerequisite edges when the backend sent them (node.prerequisites
+    // holds the ids of this course's prerequisites within the pathway).
+    const hasPrerequisites = nodes.some((node) => Array.isArray(node.prerequisites) && node.prerequisites.length > 0);
+    if (hasPrerequisites) {
+      const nodeIds = new Set(nodes.map((node) => node.id));
+      nodes.forEach((node) => {
+        (node.prerequisites || []).forEach((sourceId: string) => {
+          if (!nodeIds.has(sourceId)) return;
+          rfEdges.push({
+            id: `${sourceId}-requires-${node.id}`,
+            source: sourceId,
+            target: node.id,
+            animated: false,
+            type: 'smoothstep',
+            style: {
+              stroke: '#6366f1',
+              strokeWidth: 2,
+              opacity: 0.7,
+            },
+          });
+        });
+      });
+      return { nodes: rfNodes, edges: rfEdges };
+    }
+
     // Connect courses sequentially (course to course in chronological order)
     let previousNodeId: string | null = null;
     
@@ -578,7 +550,7 @@ export default function PathwaySection({
     });
 
     return { nodes: rfNodes, edges: rfEdges };
-  }, [nodes, highlightTerm]);
+  }, [nodes, highlightTerm, cardsVersion]);
 
   const graph = nodes.length ? aiGraph : datasetGraph;
   const hasData = graph.nodes.length > 0;
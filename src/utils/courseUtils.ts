@@ -1,6 +1,4 @@
-import courseCatalog from '../../UH-courses/json_format/manoa_courses.json';
-
-type RawCatalogEntry = Record<string, any>;
+import { buildApiUrl } from '../config';
 
 export type CourseCard = {
   id: string;
@@ -11,14 +9,10 @@ export type CourseCard = {
   description: string;
 };
 
-const catalogArray = courseCatalog as RawCatalogEntry[];
-const courseLookup: Record<string, RawCatalogEntry> = catalogArray.reduce((acc, course) => {
-  const key = normalizeCourseCode(
-    `${course.course_prefix || ''} ${course.course_number || ''}`.trim()
-  );
-  if (key) acc[key] = course;
-  return acc;
-}, {} as Record<string, RawCatalogEntry>);
+// Catalog cards fetched from /api/course-cards, keyed by normalizeCourseCode(code).
+// The catalog itself stays on the server instead of shipping in the bundle.
+const courseLookup: Record<string, CourseCard> = {};
+const courseCardListeners = new Set<() => void>();
 
 export function normalize(value?: string | null): string {
   return value ? value.toString().toLowerCase().replace(/[^a-z0-9]+/g, '') : '';
@@ -28,6 +22,57 @@ export function normalizeCourseCode(value?: string | null): string {
   return value ? value.toString().toLowerCase().replace(/\s+/g, '') : '';
 }
 
+function courseKey(value?: string | null): string {
+  const match = value?.match?.(/([A-Za-z]{2,4})\s*(\d{3}[A-Za-z]?)/);
+  return match ? normalizeCourseCode(`${match[1]}${match[2]}`) : normalizeCourseCode(value);
+}
+
+/** Store cards (e.g. the `cards` map from /api/generate-path with include_cards). */
+export function primeCourseCards(cards: Record<string, CourseCard> | CourseCard[]): void {
+  const list = Array.isArray(cards) ? cards : Object.values(cards || {});
+  if (!list.length) return;
+  list.forEach((card) => {
+    courseLookup[normalizeCourseCode(card.code)] = card;
+  });
+  courseCardListeners.forEach((listener) => listener());
+}
+
+/** Called whenever new cards arrive; returns an unsubscribe function. */
+export function onCourseCards(listener: () => void): () => void {
+  courseCardListeners.add(listener);
+  return () => {
+    courseCardListeners.delete(listener);
+  };
+}
+
+// Longer lookups use POST /api/course-cards, which browsers cannot cache.
+const MAX_GET_QUERY_LENGTH = 1800;
+
+/** Fetch catalog cards for course names/codes that are not cached yet. */
+export async function fetchCourseCards(names: string[], campus = 'manoa'): Promise<void> {
+  // Sorted, so the same set of courses always maps to the same cacheable URL.
+  const wanted = Array.from(
+    new Set(names.filter((name) => name && !courseLookup[courseKey(name)]))
+  ).sort();
+  if (!wanted.length) return;
+  try {
+    const query = new URLSearchParams({ codes: wanted.join(','), campus }).toString();
+    const resp =
+      query.length <= MAX_GET_QUERY_LENGTH && !wanted.some((name) => name.includes(','))
+        ? await fetch(buildApiUrl(`/api/course-cards?${query}`))
+        : await fetch(buildApiUrl('/api/course-cards'), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ codes: wanted, campus }),
+          });
+    if (!resp.ok) return;
+    const json = await resp.json();
+    primeCourseCards(json?.cards || {});
+  } catch (e) {
+    console.warn('course-cards request failed', e);
+  }
+}
+
 export function shapeCourse(course: any, fallbackId: string): CourseCard {
   const rawName = course?.name || '';
   const match = rawName.match?.(/([A-Z]{2,4})\s*(\d{3}[A-Z]?)/);
@@ -44,19 +89,19 @@ export function shapeCourse(course: any, fallbackId: string): CourseCard {
   } else if (match && rawName) {
     courseName = rawName.replace(match[0], '').replace(/^[\s\-:]+/, '').trim();
     if (!courseName) {
-      courseName = catalogEntry?.course_title || rawName;
+      courseName = catalogEntry?.name || rawName;
     }
   } else {
-    courseName = catalogEntry?.course_title || rawName || `Course ${fallbackId}`;
+    courseName = catalogEntry?.name || rawName || `Course ${fallbackId}`;
   }
 
   if (!courseName || courseName === courseCode) {
-    courseName = catalogEntry?.course_title || 'Course';
+    courseName = catalogEntry?.name || 'Course';
   }
 
   const credits =
     course?.credits ||
-    Number(catalogEntry?.num_units) ||
+    catalogEntry?.credits ||
     course?.credit ||
     Number(course?.num_units) ||
     3;
@@ -66,15 +111,15 @@ export function shapeCourse(course: any, fallbackId: string): CourseCard {
     code: courseCode,
     name: courseName,
     credits,
-    location: course?.location || catalogEntry?.dept_name || 'UH Mānoa',
+    location: course?.location || catalogEntry?.location || 'UH Mānoa',
     description:
       course?.description ||
       course?.course_desc ||
-      catalogEntry?.course_desc ||
+      catalogEntry?.description ||
       'Course details coming soon.',
   };
 }
 
-export function lookupCourse(codeOrName: string): RawCatalogEntry | undefined {
-  return courseLookup[normalizeCourseCode(codeOrName)];
+export function lookupCourse(codeOrName: string): CourseCard | undefined {
+  return courseLookup[courseKey(codeOrName)];
 }
@@ -0,0 +1,38 @@
+export type PathNode = {
+  id: string;
+  name: string;
+  credits: number;
+  semester?: string;
+  year?: number;
+  course_code?: string;
+  prerequisites?: string[];
+  position: { x: number; y: number };
+};
+
+type ColumnarNodes = {
+  format: 'columnar';
+  length: number;
+  columns: Record<string, any[]>;
+};
+
+/**
+ * Node objects from /api/generate-path, which returns one array per field
+ * (`format: "columnar"`) when the request sets `node_format: 'columnar'`.
+ * Plain node arrays are passed through unchanged.
+ */
+export function expandPathNodes(path: PathNode[] | ColumnarNodes | null | undefined): PathNode[] {
+  if (!path) return [];
+  if (Array.isArray(path)) return path;
+  if (path.format !== 'columnar' || !path.columns) return [];
+
+  const { x = [], y = [], ...fields } = path.columns;
+  const nodes: PathNode[] = [];
+  for (let i = 0; i < path.length; i += 1) {
+    const node: any = { position: { x: x[i] ?? 0, y: y[i] ?? 0 } };
+    Object.entries(fields).forEach(([field, values]) => {
+      if (values?.[i] !== null && values?.[i] !== undefined) node[field] = values[i];
+    });
+    nodes.push(node as PathNode);
+  }
+  return nodes;
+}